@@ -0,0 +1,303 @@
+"""Local HTTP server that imitates the gallery website for benchmarks.
+
+The markup matches the default selectors in config.yaml:
+overview pages list galleries as ``h1.zag_block > a``, gallery pages carry an
+``h1.zag_block`` title ending in ``(NN PICS)``, images in ``div.imgbox img`` and
+the next-page link at ``#post-list > div:nth-child(6) > div > b:nth-child(3) > a``.
+
+Run it standalone with ``python benchmarks/mock_site.py --port 8765`` and
+point GALLERY_OVERVIEW_BASE_URL_INPUT at http://127.0.0.1:8765/babes/.
+"""
+
+import argparse
+import base64
+import hashlib
+import http.server
+import random
+import re
+import sys
+import threading
+import time
+
+# 8x8 baseline JPEG; images are padded with COM segments to the requested size
+TINY_JPEG = base64.b64decode(
+    "/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDABALDA4MChAODQ4SERATGCgaGBYWGDEjJR0oOjM9PDkzODdASFxO"
+    "QERXRTc4UG1RV19iZ2hnPk1xeXBkeFxlZ2P/2wBDARESEhgVGC8aGi9jQjhCY2NjY2NjY2NjY2NjY2NjY2Nj"
+    "Y2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2P/wAARCAAIAAgDASIAAhEBAxEB/8QAHwAAAQUBAQEB"
+    "AQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEGE1FhByJxFDKB"
+    "kaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1"
+    "dnd4eXqDhIWGh4iJipKTlJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl"
+    "5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEBAQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREAAgECBAQDBAcF"
+    "BAQAAQJ3AAECAxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRomJygpKjU2Nzg5"
+    "OkNERUZHSElKU1RVVldYWVpjZGVmZ2hpanN0dXZ3eHl6goOEhYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0"
+    "tba3uLm6wsPExcbHyMnK0tPU1dbX2Nna4uPk5ebn6Onq8vP09fb3+Pn6/9oADAMBAAIRAxEAPwDHooorhPqD"
+    "/9k="
+)
+
+
+def make_jpeg(size, seed):
+    """Returns a valid JPEG of roughly `size` bytes whose content depends on `seed`."""
+    padding = bytearray()
+    remaining = max(0, size - len(TINY_JPEG))
+    filler = hashlib.sha256(seed.encode("utf-8")).digest()
+    while remaining > 4:
+        chunk = min(remaining - 4, 65533)
+        payload = (filler * (chunk // len(filler) + 1))[:chunk]
+        padding += b"\xff\xfe" + (chunk + 2).to_bytes(2, "big") + payload
+        remaining -= chunk + 4
+    return TINY_JPEG[:2] + bytes(padding) + TINY_JPEG[2:]
+
+
+class MockSite:
+    """Synthetic site layout plus request counters, shared by the handler threads."""
+
+    def __init__(
+        self,
+        overview_pages=10,
+        galleries_per_page=10,
+        pages_per_gallery=2,
+        images_per_page=5,
+        image_size=200_000,
+        latency=0.0,
+        error_rate=0.0,
+        duplicate_rate=0.0,
+        seed=0,
+    ):
+        self.overview_pages = overview_pages
+        self.galleries_per_page = galleries_per_page
+        self.pages_per_gallery = pages_per_gallery
+        self.images_per_page = images_per_page
+        self.image_size = image_size
+        self.latency = latency  # Seconds added to every response
+        self.error_rate = error_rate  # Fraction of requests answered with a 503
+        self.duplicate_rate = duplicate_rate  # Fraction of images reposted from a small pool
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._jpeg_cache = {}
+        self.stats = {
+            "overview_pages": 0,
+            "gallery_pages": 0,
+            "images": 0,
+            "image_bytes": 0,
+            "not_modified": 0,
+            "range_requests": 0,
+            "errors_injected": 0,
+            "not_found": 0,
+        }
+
+    @property
+    def total_galleries(self):
+        return self.overview_pages * self.galleries_per_page
+
+    @property
+    def total_images(self):
+        return self.total_galleries * self.pages_per_gallery * self.images_per_page
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def inject_error(self):
+        with self._lock:
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def image(self, name):
+        with self._lock:
+            body = self._jpeg_cache.get(name)
+        if body is None:
+            # Reposts get their content from a shared pool, so the same bytes
+            # show up under different URLs in different galleries
+            bucket = int(hashlib.md5(name.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+            seed = f"repost-{int(bucket * 1000) % 20}" if bucket < self.duplicate_rate else name
+            body = make_jpeg(self.image_size, seed)
+            with self._lock:
+                if len(self._jpeg_cache) < 256:
+                    self._jpeg_cache[name] = body
+        return body
+
+    def overview_html(self, page_num):
+        links = "".join(
+            f'<h1 class="zag_block"><a href="/2024/01/{1 + (page_num - 1) % 28:02d}/gallery-{page_num}-{i}/">'
+            f"Gallery {page_num}-{i} ({self.pages_per_gallery * self.images_per_page} PICS)</a></h1>"
+            for i in range(self.galleries_per_page)
+        )
+        # WordPress-style pagination widget: neighbours plus the last page
+        widget = "".join(
+            f'<a class="page" href="/babes/page/{n}/">{n}</a>'
+            for n in sorted({1, page_num - 1, page_num + 1, self.overview_pages})
+            if 1 <= n <= self.overview_pages and n != page_num
+        )
+        return (
+            f"<html><body><div id='content'>{links}</div>"
+            f"<div class='pagination'>{widget}</div></body></html>"
+        )
+
+    def gallery_html(self, day, page_num, gallery, gallery_page):
+        images = "".join(
+            f'<div class="imgbox"><img src="/img/{page_num}-{gallery}-{gallery_page}-{k}.jpg"></div>'
+            for k in range(self.images_per_page)
+        )
+        next_link = (
+            f'<a href="/2024/01/{day}/gallery-{page_num}-{gallery}/{gallery_page + 1}/">Next</a>'
+            if gallery_page < self.pages_per_gallery
+            else ""
+        )
+        return (
+            f'<html><body><h1 class="zag_block">Gallery {page_num}-{gallery} '
+            f"({self.pages_per_gallery * self.images_per_page} PICS)</h1>{images}"
+            '<div id="post-list"><div></div><div></div><div></div><div></div><div></div>'
+            f"<div><div><b>1</b><b>2</b><b>{next_link}</b></div></div></div></body></html>"
+        )
+
+
+OVERVIEW_PATH = re.compile(r"^/babes/page/(\d+)/$")
+GALLERY_PATH = re.compile(r"^/2024/01/(\d+)/gallery-(\d+)-(\d+)/(?:(\d+)/)?$")
+IMAGE_PATH = re.compile(r"^/img/([\w-]+)\.jpg$")
+
+
+def make_handler(site):
+    class MockSiteHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_body(self, body, content_type="text/html; charset=utf-8", status=200):
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if status == 200 and self.headers.get("If-None-Match") == etag:
+                site.count("not_modified")
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            range_match = re.match(r"bytes=(\d+)-$", self.headers.get("Range", ""))
+            if self.headers.get("If-Range", etag) != etag:
+                range_match = None  # The client holds another version: send it whole
+            if status == 200 and range_match:
+                start = int(range_match.group(1))
+                if start >= len(body):
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(body)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                site.count("range_requests")
+                status, total, body = 206, len(body), body[start:]
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Accept-Ranges", "bytes")
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{total - 1}/{total}")
+            if status == 200:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def do_HEAD(self):
+            self.do_GET()
+
+        def do_GET(self):
+            if site.latency:
+                time.sleep(site.latency)
+            if site.inject_error():
+                site.count("errors_injected")
+                return self.send_body(b"Service Unavailable", "text/plain", 503)
+
+            path = self.path.split("?")[0]
+            match = OVERVIEW_PATH.match(path)
+            if match and 1 <= int(match.group(1)) <= site.overview_pages:
+                site.count("overview_pages")
+                return self.send_body(site.overview_html(int(match.group(1))).encode())
+            match = GALLERY_PATH.match(path)
+            if match:
+                day, page_num, gallery, gallery_page = match.groups()
+                gallery_page = int(gallery_page or 1)
+                if (
+                    1 <= int(page_num) <= site.overview_pages
+                    and int(gallery) < site.galleries_per_page
+                    and gallery_page <= site.pages_per_gallery
+                ):
+                    site.count("gallery_pages")
+                    html = site.gallery_html(day, page_num, gallery, gallery_page)
+                    return self.send_body(html.encode())
+            match = IMAGE_PATH.match(path)
+            if match:
+                body = site.image(match.group(1))
+                site.count("images")
+                site.count("image_bytes", len(body))
+                return self.send_body(body, "image/jpeg")
+            site.count("not_found")
+            self.send_body(b"Not Found", "text/plain", 404)
+
+    return MockSiteHandler
+
+
+class MockSiteServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients drop connections on purpose (e.g. skipping a known body)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_server(site, host="127.0.0.1", port=0):
+    """Serves `site` from a background thread; returns the server (see server_address)."""
+    server = MockSiteServer((host, port), make_handler(site))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_site_arguments(parser):
+    parser.add_argument("--overview-pages", type=int, default=10)
+    parser.add_argument("--galleries-per-page", type=int, default=10)
+    parser.add_argument("--pages-per-gallery", type=int, default=2)
+    parser.add_argument("--images-per-page", type=int, default=5)
+    parser.add_argument("--image-size", type=int, default=200_000, help="bytes per image")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every response"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="fraction of requests answered with 503",
+    )
+    parser.add_argument(
+        "--duplicate-rate",
+        type=float,
+        default=0.0,
+        help="fraction of images whose content is reposted across galleries",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def site_from_args(args):
+    return MockSite(
+        overview_pages=args.overview_pages,
+        galleries_per_page=args.galleries_per_page,
+        pages_per_gallery=args.pages_per_gallery,
+        images_per_page=args.images_per_page,
+        image_size=args.image_size,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        duplicate_rate=args.duplicate_rate,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a synthetic gallery site.")
+    parser.add_argument("--port", type=int, default=8765)
+    add_site_arguments(parser)
+    args = parser.parse_args()
+    server = start_server(site_from_args(args), port=args.port)
+    print(f"Mock gallery site on http://127.0.0.1:{server.server_address[1]}/babes/")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
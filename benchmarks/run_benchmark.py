@@ -0,0 +1,241 @@
+"""Runs the full main.py crawl against the local mock site and records throughput.
+
+Example:
+    python benchmarks/run_benchmark.py --overview-pages 20 --latency 0.02
+
+Every run appends one JSON object to the results file (benchmarks/results.jsonl
+by default) with the site parameters, the git revision and the measurements
+(pages/s, images/s, MB/s, peak RSS, CPU time), so regressions in the download
+path can be compared across versions. After the crawl, the cold start of a
+cron-style run is timed too: a --quick-check that finds nothing new, and the
+import of the crawler that every real run pays before its first request.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import yaml
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+from mock_site import add_site_arguments, site_from_args, start_server
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_SCRIPT = os.path.join(REPO_DIR, "main.py")
+DEFAULT_RESULTS = os.path.join(REPO_DIR, "benchmarks", "results.jsonl")
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_config(work_dir, base_url, overrides):
+    """Writes a config.yaml based on the repo's, pointed at the mock site."""
+    with open(os.path.join(REPO_DIR, "config.yaml"), "r") as config_file:
+        config = yaml.safe_load(config_file) or {}
+    config.update(
+        {
+            "GALLERY_OVERVIEW_BASE_URL_INPUT": base_url,
+            "DOWNLOAD_FOLDER": os.path.join(work_dir, "downloads"),
+        }
+    )
+    config.update(overrides)
+    with open(os.path.join(work_dir, "config.yaml"), "w") as config_file:
+        yaml.safe_dump(config, config_file)
+
+
+def count_files(folder):
+    count = total_bytes = 0
+    for dir_path, _, filenames in os.walk(folder):
+        for filename in filenames:
+            if filename.startswith("."):
+                continue  # Gallery manifests
+            count += 1
+            total_bytes += os.path.getsize(os.path.join(dir_path, filename))
+    return count, total_bytes
+
+
+def child_usage():
+    """Returns (cpu seconds, peak RSS in MB) of finished child processes, or Nones."""
+    if resource is None:
+        return None, None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss_divisor = 1_048_576 if sys.platform == "darwin" else 1024
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss / rss_divisor
+
+
+def run_crawl(work_dir, extra_args, timeout):
+    log_path = os.path.join(work_dir, "crawl.log")
+    cpu_before, _ = child_usage()
+    start = time.perf_counter()
+    with open(log_path, "w") as log_file:
+        try:
+            returncode = subprocess.run(
+                [sys.executable, MAIN_SCRIPT, *extra_args],
+                cwd=work_dir,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                timeout=timeout,
+            ).returncode
+        except subprocess.TimeoutExpired:
+            returncode = None  # Killed after `timeout` seconds
+    wall_time = time.perf_counter() - start
+    cpu_after, peak_rss_mb = child_usage()
+    cpu_time = None if cpu_before is None else cpu_after - cpu_before
+    return returncode, wall_time, cpu_time, peak_rss_mb, log_path
+
+
+def time_process(command, cwd, timeout, repeats=3):
+    """Returns (fastest wall time of repeats fresh processes, exit code of the last)."""
+    fastest = returncode = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        # A blocking wait: wait(timeout) polls in steps of up to 50 ms, too coarse here
+        killer = threading.Timer(timeout, process.kill)
+        killer.start()
+        returncode = process.wait()
+        killer.cancel()
+        elapsed = time.perf_counter() - start
+        fastest = elapsed if fastest is None else min(fastest, elapsed)
+    return fastest, returncode
+
+
+def measure_cold_start(work_dir, timeout):
+    """Times new processes against the finished crawl, the way cron starts them."""
+    quick_check_s, quick_check_returncode = time_process(
+        [sys.executable, MAIN_SCRIPT, "--quick-check"], work_dir, timeout
+    )
+    import_s, _ = time_process(
+        [sys.executable, "-c", "import gallery_downloader.crawler"], REPO_DIR, timeout
+    )
+    return {
+        "quick_check_s": None if quick_check_s is None else round(quick_check_s, 3),
+        "quick_check_returncode": quick_check_returncode,
+        "crawler_import_s": None if import_s is None else round(import_s, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_site_arguments(parser)
+    parser.add_argument(
+        "--config",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="override a config.yaml key for the crawl (YAML value), repeatable",
+    )
+    parser.add_argument("--label", default="", help="free text stored with the result")
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="JSON lines output file")
+    parser.add_argument("--timeout", type=float, default=1800, help="crawl timeout in seconds")
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the work directory (downloads and log)"
+    )
+    args, crawl_args = parser.parse_known_args()
+
+    overrides = {}
+    for item in args.config:
+        key, _, value = item.partition("=")
+        overrides[key] = yaml.safe_load(value)
+
+    site = site_from_args(args)
+    server = start_server(site)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/babes/"
+    work_dir = tempfile.mkdtemp(prefix="gallery-bench-")
+    write_config(work_dir, base_url, overrides)
+
+    print(
+        f"Crawling {site.total_galleries} galleries / {site.total_images} images "
+        f"({site.image_size / 1024:.0f} KB each) from {base_url} in {work_dir}"
+    )
+    returncode, wall_time, cpu_time, peak_rss_mb, log_path = run_crawl(
+        work_dir, crawl_args, args.timeout
+    )
+    crawl_stats = dict(site.stats)  # Before the cold start runs add their requests
+    cold_start = measure_cold_start(work_dir, args.timeout)
+    server.shutdown()
+
+    files_on_disk, bytes_on_disk = count_files(os.path.join(work_dir, "downloads"))
+    html_pages = crawl_stats["overview_pages"] + crawl_stats["gallery_pages"]
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": git_revision(),
+        "label": args.label,
+        "python": platform.python_version(),
+        "site": {
+            "overview_pages": site.overview_pages,
+            "galleries_per_page": site.galleries_per_page,
+            "pages_per_gallery": site.pages_per_gallery,
+            "images_per_page": site.images_per_page,
+            "image_size": site.image_size,
+            "latency": site.latency,
+            "error_rate": site.error_rate,
+            "duplicate_rate": site.duplicate_rate,
+        },
+        "config_overrides": overrides,
+        "crawl_args": crawl_args,
+        "returncode": returncode,
+        "timed_out": returncode is None,
+        "wall_time_s": round(wall_time, 3),
+        "cpu_time_s": None if cpu_time is None else round(cpu_time, 3),
+        "peak_rss_mb": None if peak_rss_mb is None else round(peak_rss_mb, 1),
+        "html_pages": html_pages,
+        "images_served": crawl_stats["images"],
+        "pages_per_s": round(html_pages / wall_time, 2),
+        "images_per_s": round(crawl_stats["images"] / wall_time, 2),
+        "mb_per_s": round(crawl_stats["image_bytes"] / 1_048_576 / wall_time, 2),
+        "files_on_disk": files_on_disk,
+        "mb_on_disk": round(bytes_on_disk / 1_048_576, 2),
+        "expected_images": site.total_images,
+        "cold_start": cold_start,
+        "server_stats": crawl_stats,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, "a") as results_file:
+        results_file.write(json.dumps(result) + "\n")
+
+    print(
+        f"{result['wall_time_s']}s wall, {result['cpu_time_s']}s CPU, peak RSS {result['peak_rss_mb']} MB | "
+        f"{result['pages_per_s']} pages/s, {result['images_per_s']} images/s, {result['mb_per_s']} MB/s | "
+        f"{files_on_disk}/{site.total_images} images on disk (exit code {returncode})"
+    )
+    print(
+        f"Cold start: --quick-check with nothing new {cold_start['quick_check_s']}s "
+        f"(exit code {cold_start['quick_check_returncode']}), crawler import {cold_start['crawler_import_s']}s"
+    )
+    print(f"Result appended to {args.results}")
+    if args.keep:
+        print(f"Work directory kept: {work_dir} (log: {log_path})")
+    else:
+        import shutil
+
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0 if returncode == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""Downloads every image of the galleries on a website (see config.yaml).
+
+The command line lives in gallery_downloader.cli; importing the package
+itself loads nothing else.
+"""
@@ -0,0 +1,158 @@
+import datetime
+import threading
+import time
+from collections import namedtuple
+
+DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+LIMITED_CHUNK_SIZE = 64 * 1024  # Bytes read at once while a limit is active, for a smooth rate
+RATE_CHECK_INTERVAL = 1.0  # Seconds between looking up the schedule window of the current time
+
+# One BANDWIDTH_SCHEDULE entry: days (weekday numbers, Monday = 0), start and
+# end (minutes after midnight; end <= start wraps past midnight), rate (bytes/s, 0 = unlimited)
+BandwidthWindow = namedtuple("BandwidthWindow", "days start end rate")
+
+
+def _parse_minutes(value, number, key):
+    # Unquoted 18:00 is a base-60 integer in YAML, which happens to be the minutes
+    if isinstance(value, int) and not isinstance(value, bool):
+        minutes = value
+    else:
+        try:
+            hours, _, mins = str(value).strip().partition(":")
+            minutes = int(hours) * 60 + int(mins or 0)
+        except ValueError:
+            raise ValueError(
+                f"BANDWIDTH_SCHEDULE entry {number}: {key} '{value}' is not a HH:MM time"
+            ) from None
+    if not 0 <= minutes <= 24 * 60:
+        raise ValueError(f"BANDWIDTH_SCHEDULE entry {number}: {key} '{value}' is out of range")
+    return minutes
+
+
+def parse_schedule(entries):
+    """Returns the BandwidthWindows of a BANDWIDTH_SCHEDULE list.
+
+    Each entry has FROM and TO ("HH:MM"), LIMIT_KBPS and optionally DAYS
+    (names like "mon"; every day when left out). Raises ValueError for
+    malformed entries.
+    """
+    if not entries:
+        return []
+    if not isinstance(entries, list):
+        raise ValueError("BANDWIDTH_SCHEDULE must be a list of time windows")
+    windows = []
+    for number, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"BANDWIDTH_SCHEDULE entry {number} is not a mapping")
+        unknown = set(entry) - {"DAYS", "FROM", "TO", "LIMIT_KBPS"}
+        if unknown:
+            raise ValueError(
+                f"BANDWIDTH_SCHEDULE entry {number} has unknown keys: {', '.join(sorted(unknown))}"
+            )
+        if "FROM" not in entry or "TO" not in entry or "LIMIT_KBPS" not in entry:
+            raise ValueError(f"BANDWIDTH_SCHEDULE entry {number} needs FROM, TO and LIMIT_KBPS")
+        days = set()
+        for day in entry.get("DAYS") or DAY_NAMES:
+            day_key = str(day).strip().lower()[:3]
+            if day_key not in DAY_NAMES:
+                raise ValueError(f"BANDWIDTH_SCHEDULE entry {number}: unknown day '{day}'")
+            days.add(DAY_NAMES.index(day_key))
+        try:
+            rate = max(0, int(float(entry["LIMIT_KBPS"]) * 1024))
+        except (TypeError, ValueError):
+            raise ValueError(
+                f"BANDWIDTH_SCHEDULE entry {number}: LIMIT_KBPS '{entry['LIMIT_KBPS']}' is not a number"
+            ) from None
+        windows.append(
+            BandwidthWindow(
+                frozenset(days),
+                _parse_minutes(entry["FROM"], number, "FROM"),
+                _parse_minutes(entry["TO"], number, "TO"),
+                rate,
+            )
+        )
+    return windows
+
+
+def format_rate(rate):
+    return f"{rate / 1024:.0f} KB/s" if rate else "unlimited"
+
+
+def _window_matches(window, now):
+    minutes = now.hour * 60 + now.minute
+    weekday = now.weekday()
+    if window.start < window.end:
+        return weekday in window.days and window.start <= minutes < window.end
+    # Wraps past midnight: the part after midnight belongs to the previous day's window
+    if minutes >= window.start:
+        return weekday in window.days
+    return minutes < window.end and (weekday - 1) % 7 in window.days
+
+
+class BandwidthLimiter:
+    """Caps the bytes per second of every download stream of the process together.
+
+    A token bucket in bytes: consume() takes the bytes of a chunk just read
+    and, once the bucket is in debt, makes the reading thread sleep until
+    its share has been paid back. Slow reads fill the socket buffers and
+    TCP throttles the sender, so the cap holds for the link, not only for
+    the disk. The rate comes from the first schedule window covering the
+    current local time, or default_rate outside all windows.
+    """
+
+    def __init__(self, default_rate=0, schedule=(), burst_seconds=1.0):
+        self.default_rate = default_rate  # Bytes per second, 0 = unlimited
+        self.schedule = list(schedule)
+        self.burst_seconds = burst_seconds
+        self.bytes = 0
+        self.waited_seconds = 0.0
+        self._rate = None
+        self._rate_checked = 0.0
+        self._tokens = 0.0
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def rate_at(self, now):
+        for window in self.schedule:
+            if _window_matches(window, now):
+                return window.rate
+        return self.default_rate
+
+    def _current_rate(self, monotonic_now):
+        # Called with the lock held
+        if self._rate is None or monotonic_now - self._rate_checked >= RATE_CHECK_INTERVAL:
+            rate = self.rate_at(datetime.datetime.now())
+            if rate != self._rate:
+                self._tokens = min(self._tokens, rate * self.burst_seconds)
+                self._rate = rate
+            self._rate_checked = monotonic_now
+        return self._rate
+
+    def consume(self, nbytes):
+        """Accounts for nbytes just received; sleeps while the budget is overdrawn."""
+        with self._lock:
+            now = time.monotonic()
+            self.bytes += nbytes
+            rate = self._current_rate(now)
+            if rate <= 0:
+                self._last_refill = now
+                return
+            self._tokens = min(
+                rate * self.burst_seconds,
+                self._tokens + (now - self._last_refill) * rate,
+            )
+            self._last_refill = now
+            self._tokens -= nbytes
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+            self.waited_seconds += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def summary(self):
+        with self._lock:
+            rate = self._rate if self._rate is not None else self.default_rate
+        return (
+            f"Bandwidth limiter: {self.bytes / 1_048_576:.1f} MB downloaded, "
+            f"{self.waited_seconds:.1f}s spent waiting (summed over threads); "
+            f"limit at the end: {format_rate(rate)}."
+        )
@@ -0,0 +1,163 @@
+"""Command line of the gallery downloader.
+
+Runs as "python main.py", "python -m gallery_downloader" or the installed
+"gallery-downloader" command. Only the standard library, PyYAML and the
+settings are imported up front; the crawler and its dependencies (requests,
+bs4, lxml) are imported once there is work to do, so --help and a
+--quick-check that finds nothing new return quickly.
+"""
+
+import argparse
+import logging
+import sys
+
+import yaml
+
+from . import settings
+
+log = logging.getLogger("gallery_downloader")
+
+PROFILE_REPORT = "profile_report.txt"  # Written by --profile (plus a .prof file for pstats)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Download all images from a gallery website."
+    )
+    parser.add_argument(
+        "--config",
+        default="config.yaml",
+        metavar="CONFIG_FILE",
+        help="configuration file (default: config.yaml in the current directory)",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=settings.CRAWL_MODES,
+        help="full: walk every overview page, skipping finished galleries; "
+        "incremental: stop at the first overview page whose galleries are all finished; "
+        "resume: continue an interrupted run where it stopped (default: CRAWL_MODE from config)",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=settings.LOG_LEVELS,
+        type=str.upper,
+        help="verbosity of the log output (default: LOG_LEVEL from config)",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=PROFILE_REPORT,
+        metavar="REPORT",
+        help=f"profile the run with cProfile and write a report (default: {PROFILE_REPORT})",
+    )
+    role = parser.add_mutually_exclusive_group()
+    role.add_argument(
+        "--coordinator",
+        action="store_true",
+        help="discover galleries and images, but publish the images as jobs "
+        "to WORK_QUEUE for --worker processes instead of downloading them",
+    )
+    role.add_argument(
+        "--worker",
+        action="store_true",
+        help="download image jobs from WORK_QUEUE until the coordinator is done and no job is left",
+    )
+    role.add_argument(
+        "--verify",
+        action="store_true",
+        help="check every gallery manifest against the files on disk and report drift, without crawling",
+    )
+    role.add_argument(
+        "--plan",
+        metavar="PLAN_FILE",
+        help="walk the overview and gallery pages like a crawl, but only write the "
+        "images still missing to PLAN_FILE (JSONL), with sizes if PLAN_IMAGE_SIZES is on",
+    )
+    parser.add_argument(
+        "--execute-plan",
+        metavar="PLAN_FILE",
+        help="download the images of a --plan file instead of crawling (with --coordinator: publish them)",
+    )
+    parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="with --verify: download missing or changed images again and rewrite the manifests",
+    )
+    parser.add_argument(
+        "--quick-check",
+        action="store_true",
+        help="fetch only overview page 1 of every site and exit unless it links a gallery "
+        "the crawl state does not know as finished; otherwise crawl the sites that have one",
+    )
+    parser.add_argument(
+        "--worker-id",
+        help="name of this worker in the work queue (default: host name and process id)",
+    )
+    return parser
+
+
+def load_config(config_name):
+    """Returns the mapping in config_name, or {} (logged) when it cannot be read."""
+    config = {}  # Initialize config as an empty dictionary
+    try:
+        with open(config_name, "r") as config_file:
+            loaded_config = yaml.safe_load(config_file)
+            if loaded_config:  # Ensure loaded_config is not None
+                config = loaded_config
+    except FileNotFoundError:
+        log.info(f"Configuration file '{config_name}' not found. Using default values.")
+    except yaml.YAMLError as e:
+        log.warning(
+            f"Error loading configuration file '{config_name}': {e}. Using default values."
+        )
+    except Exception as e:
+        log.warning(
+            f"An unexpected error occurred while loading config: {e}. Using default values."
+        )
+    return config
+
+
+def apply_log_level(level):
+    if level == "OFF":
+        logging.disable(logging.CRITICAL)
+    elif level in settings.LOG_LEVELS:
+        logging.getLogger().setLevel(level)
+    else:
+        log.warning(f"Unknown LOG_LEVEL '{level}'. Using 'INFO'.")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.repair and not args.verify:
+        parser.error("--repair needs --verify")
+    if args.execute_plan and (args.worker or args.verify or args.plan):
+        parser.error("--execute-plan cannot be combined with --worker, --verify or --plan")
+    if args.quick_check and (args.worker or args.verify or args.execute_plan):
+        parser.error("--quick-check cannot be combined with --worker, --verify or --execute-plan")
+    logging.basicConfig(stream=sys.stdout, format="%(message)s", level=logging.INFO)
+
+    config = load_config(args.config)
+    values = settings.resolve(config, mode=args.mode, log_level=args.log_level)
+    apply_log_level(values["LOG_LEVEL"])
+
+    site_names = None  # All sites
+    if args.quick_check:
+        from .quick_check import sites_with_new_galleries
+
+        try:
+            site_names = sites_with_new_galleries(config, values)
+        except ValueError as e:
+            log.error(f"ERROR in site configuration: {e}")
+            return 1
+        if site_names is not None and not site_names:
+            log.info("Quick check: nothing new. Exiting.")
+            return 0
+        # Page 1 just changed: a cached copy of it must not hide the new galleries
+        values["HTTP_CACHE_TTL_OVERVIEW"] = 0
+
+    from . import crawler
+
+    crawler.configure(values)
+    crawler.run(args, config, site_names)
+    return 0
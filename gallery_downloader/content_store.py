@@ -0,0 +1,256 @@
+import errno
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl  # Only needed for reflinks (Linux)
+except ImportError:
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+LINK_MODES = ("hardlink", "reflink")
+FICLONE = 0x40049409  # Linux ioctl cloning a whole file (btrfs, XFS, ...)
+HASH_CHUNK_SIZE = 1_048_576
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    added_at REAL NOT NULL,
+    file_sha256 TEXT
+);
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL
+);
+"""
+
+
+class ContentStore:
+    """Content-addressed index of downloaded images for cross-gallery deduplication.
+
+    Maps the SHA-256 of every stored image to one file on disk, plus image
+    URLs and strong ETags to the hash they delivered. A duplicate is linked to
+    the existing file instead of being written again; a known URL or ETag lets
+    the body transfer be skipped altogether. ETags are only unique per resource,
+    so a match from another URL of the host is checked against the announced
+    size and the hash of the linked file before it is trusted.
+
+    sha256 and size always describe the bytes as downloaded. When a conversion
+    replaces the stored file (moved()), file_sha256 is the hash of the file
+    actually on disk. A link takes the stored file's extension when the
+    caller allows it (adopt_extensions: sniffed or converted types).
+    """
+
+    def __init__(self, db_path, link_mode="hardlink"):
+        self.link_mode = link_mode if link_mode in LINK_MODES else "hardlink"
+        self.links_created = 0
+        self.transfers_skipped = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(blobs)")}
+        if "file_sha256" not in columns:  # Database written before conversions were tracked
+            self._conn.execute("ALTER TABLE blobs ADD COLUMN file_sha256 TEXT")
+        self._conn.commit()
+
+    @staticmethod
+    def url_source(url):
+        return f"url:{url}"
+
+    @staticmethod
+    def etag_source(host, etag):
+        """Returns the lookup key for a strong ETag, or None for weak/missing ones."""
+        if not etag or etag.startswith("W/"):
+            return None
+        return f"etag:{host}:{etag}"
+
+    def _stored_path(self, sha256):
+        """Returns (path, size, hash of the file on disk) of a stored blob, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, size, COALESCE(file_sha256, sha256) FROM blobs WHERE sha256 = ?",
+                (sha256,),
+            ).fetchone()
+        return row
+
+    @staticmethod
+    def _link_path(sha256, row, save_path, adopt_extensions):
+        """Returns where to link a stored blob for save_path, or None if it does not fit.
+
+        The link takes the stored file's extension if that one may be adopted;
+        a converted file is not linked under another type's extension.
+        """
+        stored_path, _, stored_file_hash = row
+        stem, extension = os.path.splitext(save_path)
+        stored_extension = os.path.splitext(stored_path)[1]
+        if stored_extension.lower() in adopt_extensions:
+            return f"{stem}{stored_extension}"
+        if stored_file_hash != sha256 and stored_extension.lower() != extension.lower():
+            return None
+        return save_path
+
+    def _source_hash(self, source):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM sources WHERE source = ?", (source,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def link_known_source(self, source, save_path, size=None, verify=False, adopt_extensions=()):
+        """Links save_path to the file a known URL/ETag delivered before.
+
+        Returns the path of the link (see adopt_extensions), or None. With
+        size, the download must have been that many bytes long. With verify,
+        the linked file is hashed again and the link is removed unless it
+        still holds the stored content.
+        """
+        if source is None:
+            return None
+        sha256 = self._source_hash(source)
+        if sha256 is None:
+            return None
+        row = self._stored_path(sha256)
+        if row is None or (size is not None and row[1] != size):
+            return None
+        stored_path, stored_size, stored_file_hash = row
+        link_path = self._link_path(sha256, row, save_path, adopt_extensions)
+        if link_path is None or not self._link(stored_path, link_path):
+            return None
+        if verify and file_sha256(link_path) != stored_file_hash:
+            log.warning(f"          Warning: {stored_path} no longer matches its hash; downloading {save_path}")
+            os.remove(link_path)
+            with self._lock:
+                self.links_created -= 1
+            return None
+        with self._lock:
+            self.transfers_skipped += 1
+            self.bytes_saved += stored_size
+        return link_path
+
+    def add(self, save_path, sha256, size, sources=(), adopt_extensions=()):
+        """Registers a freshly downloaded file; replaces it by a link if it is a duplicate.
+
+        Returns the path now holding the image: save_path, or for a duplicate
+        the link, which may carry the stored file's extension (adopt_extensions).
+        """
+        row = self._stored_path(sha256)
+        final_path = save_path
+        link_path = None
+        if row is not None:
+            link_path = self._link_path(sha256, row, save_path, adopt_extensions)
+        if link_path is not None:
+            if os.path.abspath(row[0]) == os.path.abspath(link_path) and os.path.isfile(row[0]):
+                final_path = link_path  # Downloaded again next to the stored file
+            elif self._replace_with_link(row[0], link_path):
+                final_path = link_path
+                with self._lock:
+                    self.bytes_saved += size
+            if final_path != save_path:
+                os.remove(save_path)
+        with self._lock:
+            if final_path == save_path:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO blobs (sha256, path, size, added_at) VALUES (?, ?, ?, ?)",
+                    (sha256, save_path, size, time.time()),
+                )
+            for source in sources:
+                if source is not None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO sources (source, sha256) VALUES (?, ?)",
+                        (source, sha256),
+                    )
+            self._conn.commit()
+        return final_path
+
+    def moved(self, old_path, new_path):
+        """Points the blob stored at old_path to new_path, which replaced it (a conversion)."""
+        new_hash = file_sha256(new_path)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE blobs SET path = ?, file_sha256 = ? WHERE path = ?",
+                (new_path, new_hash, old_path),
+            )
+            self._conn.commit()
+
+    def discard(self, path):
+        """Forgets the blob stored at path (deleted as corrupt); its sources download again."""
+        with self._lock:
+            self._conn.execute("DELETE FROM blobs WHERE path = ?", (path,))
+            self._conn.commit()
+
+    def _replace_with_link(self, existing_path, save_path):
+        tmp_path = f"{save_path}.link"
+        try:
+            os.remove(tmp_path)  # Leftover of an interrupted run
+        except FileNotFoundError:
+            pass
+        if not self._link(existing_path, tmp_path):
+            return False
+        os.replace(tmp_path, save_path)
+        return True
+
+    def _link(self, existing_path, new_path):
+        """Creates new_path sharing existing_path's data. False if that is impossible."""
+        if not os.path.isfile(existing_path):
+            return False  # Deleted since it was stored; download normally
+        try:
+            if not (
+                self.link_mode == "reflink" and self._reflink(existing_path, new_path)
+            ):
+                os.link(existing_path, new_path)
+        except FileExistsError:
+            return True
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                log.warning(f"          Warning: Could not link {new_path} to {existing_path}: {e}")
+            return False
+        with self._lock:
+            self.links_created += 1
+        return True
+
+    @staticmethod
+    def _reflink(existing_path, new_path):
+        """Copy-on-write clone of a file (Linux). False if unsupported here."""
+        if fcntl is None:
+            return False
+        with open(existing_path, "rb") as src, open(new_path, "xb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return True
+            except OSError:
+                pass
+        os.remove(new_path)
+        return False
+
+    def summary(self):
+        return (
+            f"Deduplication: {self.links_created} links created ({self.link_mode} mode), "
+            f"{self.transfers_skipped} downloads skipped, "
+            f"{self.bytes_saved / 1_048_576:.1f} MB not written again."
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def file_sha256(path):
+    """Returns the SHA-256 of a file's content, or None if it cannot be read."""
+    hasher = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+    except OSError:
+        return None
+    return hasher.hexdigest()
@@ -0,0 +1,201 @@
+import sqlite3
+import threading
+import time
+
+# Gallery statuses stored in the state database
+STATUS_DISCOVERED = "discovered"  # Seen on an overview page, not finished yet
+STATUS_COMPLETE = "complete"  # All images downloaded (or already present)
+STATUS_SKIPPED = "skipped"  # Deliberately not downloaded (e.g. video gallery)
+FINISHED_STATUSES = (STATUS_COMPLETE, STATUS_SKIPPED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    mode TEXT NOT NULL,
+    site TEXT NOT NULL DEFAULT '',
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    last_overview_page INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS galleries (
+    url TEXT PRIMARY KEY,
+    run_id INTEGER,
+    overview_page INTEGER,
+    name TEXT,
+    folder TEXT,
+    expected_count INTEGER,
+    image_count INTEGER,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS images (
+    gallery_url TEXT NOT NULL,
+    image_url TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    downloaded_at REAL NOT NULL,
+    PRIMARY KEY (gallery_url, image_url)
+);
+CREATE INDEX IF NOT EXISTS galleries_run_status ON galleries (run_id, status);
+CREATE TABLE IF NOT EXISTS quick_checks (
+    site TEXT PRIMARY KEY,
+    page_hash TEXT NOT NULL,
+    checked_at REAL NOT NULL
+);
+"""
+
+
+class CrawlState:
+    """Durable crawl state kept in a local SQLite database (WAL mode).
+
+    Records every gallery seen on an overview page, whether it finished, and
+    which file each image URL was saved to, so a later run can skip finished
+    galleries without a single HTTP request. Safe to share between threads.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.run_id = None
+        self.site = ""
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(runs)")}
+        if "site" not in columns:  # Database written before site profiles existed
+            self._conn.execute("ALTER TABLE runs ADD COLUMN site TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # --- Runs ---
+    def start_run(self, mode, site=""):
+        """Registers a new run of site and returns the overview page it should start from.
+
+        Each site profile has its own runs, so several sites can share one database.
+        """
+        self.site = site
+        start_page = 1
+        if mode == "resume":
+            start_page = self.resume_start_page()
+        self.run_id = self._execute(
+            "INSERT INTO runs (mode, site, started_at) VALUES (?, ?, ?)",
+            (mode, site, time.time()),
+        ).lastrowid
+        return start_page
+
+    def finish_run(self):
+        self._execute(
+            "UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), self.run_id)
+        )
+
+    def resume_start_page(self):
+        """Returns the first overview page an interrupted previous run left unfinished."""
+        rows = self._query(
+            "SELECT id, last_overview_page, finished_at FROM runs WHERE site = ? ORDER BY id DESC LIMIT 1",
+            (self.site,),
+        )
+        if not rows or rows[0][2] is not None:
+            return 1  # The last run finished, there is nothing to resume
+        interrupted_run_id, last_overview_page, _ = rows[0]
+        rows = self._query(
+            "SELECT MIN(overview_page) FROM galleries WHERE run_id = ? AND status = ?",
+            (interrupted_run_id, STATUS_DISCOVERED),
+        )
+        first_unfinished_page = rows[0][0]
+        if first_unfinished_page is not None:
+            return first_unfinished_page
+        return max(1, last_overview_page + 1)
+
+    def record_overview_page(self, page_num):
+        self._execute(
+            "UPDATE runs SET last_overview_page = MAX(last_overview_page, ?) WHERE id = ?",
+            (page_num, self.run_id),
+        )
+
+    # --- Galleries ---
+    def finished_gallery_urls(self, urls):
+        """Returns the subset of urls whose gallery is already complete or skipped."""
+        urls = list(urls)
+        if not urls:
+            return set()
+        placeholders = ",".join("?" * len(urls))
+        rows = self._query(
+            f"SELECT url FROM galleries WHERE status IN (?, ?) AND url IN ({placeholders})",
+            (*FINISHED_STATUSES, *urls),
+        )
+        return {row[0] for row in rows}
+
+    def record_discovered(self, url, overview_page):
+        """Marks a gallery as seen by this run, keeping any finished status."""
+        self._execute(
+            "INSERT INTO galleries (url, run_id, overview_page, status, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(url) DO UPDATE SET run_id = excluded.run_id,"
+            " overview_page = excluded.overview_page, updated_at = excluded.updated_at"
+            " WHERE galleries.status NOT IN (?, ?)",
+            (
+                url,
+                self.run_id,
+                overview_page,
+                STATUS_DISCOVERED,
+                time.time(),
+                *FINISHED_STATUSES,
+            ),
+        )
+
+    def record_gallery(
+        self, url, status, name=None, folder=None, expected_count=None, image_count=None
+    ):
+        self._execute(
+            "INSERT INTO galleries (url, run_id, name, folder, expected_count,"
+            " image_count, status, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(url) DO UPDATE SET run_id = excluded.run_id,"
+            " name = COALESCE(excluded.name, galleries.name),"
+            " folder = COALESCE(excluded.folder, galleries.folder),"
+            " expected_count = COALESCE(excluded.expected_count, galleries.expected_count),"
+            " image_count = COALESCE(excluded.image_count, galleries.image_count),"
+            " status = excluded.status, updated_at = excluded.updated_at",
+            (
+                url,
+                self.run_id,
+                name,
+                folder,
+                expected_count,
+                image_count,
+                status,
+                time.time(),
+            ),
+        )
+
+    # --- Images ---
+    def record_image(self, gallery_url, image_url, filename):
+        self._execute(
+            "INSERT OR REPLACE INTO images (gallery_url, image_url, filename, downloaded_at)"
+            " VALUES (?, ?, ?, ?)",
+            (gallery_url, image_url, filename, time.time()),
+        )
+
+    # --- Quick checks ---
+    def quick_check_hash(self, site):
+        """Returns the hash of the overview page 1 a --quick-check last found nothing new on."""
+        rows = self._query("SELECT page_hash FROM quick_checks WHERE site = ?", (site,))
+        return rows[0][0] if rows else None
+
+    def record_quick_check(self, site, page_hash):
+        self._execute(
+            "INSERT OR REPLACE INTO quick_checks (site, page_hash, checked_at) VALUES (?, ?, ?)",
+            (site, page_hash, time.time()),
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,2535 @@
+import datetime
+import functools
+import hashlib
+import heapq
+import logging
+import os
+import queue
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import requests
+from urllib.parse import urljoin, unquote, urlparse
+import re
+import collections
+from .settings import *  # noqa: F401,F403  Defaults of every config key, replaced by configure()
+from .crawl_state import CrawlState, STATUS_COMPLETE, STATUS_SKIPPED
+from .http_cache import HttpCache
+from .http_transport import HttpTransport
+from .dir_index import DirectoryIndex
+from .html_parsers import create_parser
+from .content_store import ContentStore
+from .bandwidth import LIMITED_CHUNK_SIZE, BandwidthLimiter, format_rate, parse_schedule
+from .request_scheduler import RequestScheduler
+from .metrics import Metrics, ThreadProfiler
+from .seen_urls import SeenUrlSet
+from .sites import SITE_KEYS, load_sites
+from .postprocess import CONTENT_TYPE_EXTENSIONS, PostProcessor, sniff_image_extension
+from .manifest import (
+    check_folder,
+    hash_file,
+    image_entry,
+    is_complete,
+    new_manifest,
+    read_manifest,
+    write_manifest,
+)
+from .plan import PlanWriter, read_plan
+from .work_queue import JOB_DONE, JOB_FAILED, JOB_LEASED, JOB_PENDING, open_work_queue
+
+log = logging.getLogger("gallery_downloader")
+
+PARTIAL_SUFFIX = ".part"  # Suffix of images still being downloaded
+VALIDATOR_SUFFIX = ".validator"  # Next to a .part file: the ETag/Last-Modified it was downloaded under
+
+HTTP_CACHE = None  # HttpCache instance, created at startup when enabled
+BOUNDED_HTTP_CACHE_ENTRIES = 10_000  # Most pages the HTTP cache indexes with BOUNDED_MEMORY
+CONTENT_STORE = None  # ContentStore, created at startup when DEDUPLICATE is on
+DIR_INDEXES = []  # One DirectoryIndex per download folder, created at startup when enabled
+# Rate limits, retries and per-host download slots; rebuilt from the config at startup
+SCHEDULER = RequestScheduler(max_concurrency=MAX_DOWNLOADS_PER_HOST)
+METRICS = Metrics(enabled=False)  # Stage timers and counters; enabled at startup
+POSTPROCESSOR = None  # PostProcessor process pool, created at startup when enabled
+BANDWIDTH = None  # BandwidthLimiter, created at startup when a limit or schedule is set
+PROFILER = None  # ThreadProfiler when running with --profile
+
+
+def timed(name):
+    """Decorator recording the duration of every call in METRICS under name."""
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with METRICS.timer(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+# Helper functions (sanitize_filename, extract_and_format_date, etc.) remain the same...
+def sanitize_filename(name):
+    """Sanitizes a string for use as a filename."""
+    if not isinstance(name, str):
+        name = str(name)
+    name = re.sub(r'[<>:"/\\|?*]', "_", name)
+    name = re.sub(r"[\s_]+", "_", name)
+    name = name.strip("_ ")
+    # Avoid making filename just the date if title was only VIDEO skip phrase
+    if name == extract_and_format_date(
+        name
+    ):  # Check if name *only* contains the formatted date
+        return f"{name}_gallery"
+    return name if name else "untitled_gallery"
+
+
+def extract_and_format_date(url_string):
+    """Extracts and formats a date from a URL string."""
+    match = re.search(r"(\d{4})/(\d{2})/(\d{2})", url_string)
+    if match:
+        year, month, day = match.groups()
+        try:
+            if (
+                1990 <= int(year) <= 2099
+                and 1 <= int(month) <= 12
+                and 1 <= int(day) <= 31
+            ):
+                return f"{year}_{month}_{day}"
+        except ValueError:
+            pass
+    return None
+
+
+def extract_count_from_title(title_string):
+    """Extracts image count from a title string like '(XX PICS)'."""
+    if not title_string:
+        return None
+    match = re.search(r"\(\s*(\d+)\s*PICS?\s*\)", title_string, re.IGNORECASE)
+    if match:
+        try:
+            return int(match.group(1))
+        except ValueError:
+            return None
+    return None
+
+
+def modify_gallery_title(original_title, date_str, skip_phrase=None):
+    """Modifies the gallery title, adding date if present and removing video phrase."""
+    if skip_phrase is None:
+        skip_phrase = VIDEO_SKIP_PHRASE
+    # Remove the video phrase before adding date/pics part if present
+    title_no_video = original_title.replace(skip_phrase, "").strip()
+    if not title_no_video:  # Handle case where title was *only* the video phrase
+        return date_str if date_str else "video_gallery"
+
+    if not date_str:
+        return title_no_video  # Return title without video phrase if no date
+
+    pattern = re.compile(r"(\s*\(\s*\d+\s*PICS?\s*\)\s*)$", re.IGNORECASE)
+    match = pattern.search(title_no_video)
+    if match:
+        pics_part = match.group(1)
+        title_before_pics = title_no_video[: match.start()]
+        return f"{title_before_pics.strip()} {date_str}{pics_part}"
+    else:  # Append date if no "(XX PICS)" found after removing video phrase
+        return f"{title_no_video.strip()} {date_str}"
+
+
+def directory_index_for(path):
+    """Returns the DirectoryIndex covering path, or None."""
+    for index in DIR_INDEXES:
+        if index.covers(path):
+            return index
+    return None
+
+
+@timed("fs_check")
+def folder_exists(dir_path):
+    """Checks a folder through the directory index when it covers the path."""
+    index = directory_index_for(dir_path)
+    if index is not None:
+        return index.folder_exists(dir_path)
+    return os.path.isdir(dir_path)
+
+
+@timed("fs_check")
+def file_exists(file_path):
+    """Checks a file through the directory index when it covers the path."""
+    index = directory_index_for(file_path)
+    if index is not None:
+        return index.file_exists(file_path)
+    return os.path.exists(file_path)
+
+
+@timed("fs_check")
+def count_image_files(dir_path):
+    """Counts image files in a directory based on defined extensions."""
+    index = directory_index_for(dir_path)
+    if index is not None:
+        return index.count_images(dir_path)
+    if not os.path.isdir(dir_path):
+        return 0
+    count = 0
+    try:
+        for fname in os.listdir(dir_path):
+            if os.path.isfile(os.path.join(dir_path, fname)):
+                if os.path.splitext(fname)[1].lower() in IMAGE_EXTENSIONS:
+                    count += 1
+    except OSError as e:
+        log.warning(f"      Warning: Could not count files in {dir_path}: {e}")
+        return 0
+    return count
+
+
+def image_url_extension(img_url):
+    """Returns the image extension in an image URL's path, or None if it has none."""
+    filename = unquote(urlparse(img_url).path.split("/")[-1])
+    extension = os.path.splitext(filename)[1].lower()
+    return extension if extension in IMAGE_EXTENSIONS else None
+
+
+def sniffed_save_path(save_path, part_path, content_type):
+    """Returns save_path with the extension of the image type actually received.
+
+    Used for image URLs without an image extension, whose save_path only
+    carries a provisional one. The file's first bytes decide; the
+    Content-Type header is the fallback.
+    """
+    with open(part_path, "rb") as f:
+        head = f.read(32)
+    extension = sniff_image_extension(head) or CONTENT_TYPE_EXTENSIONS.get(
+        content_type.split(";")[0].strip().lower()
+    )
+    if extension is None or extension not in IMAGE_EXTENSIONS:
+        return save_path
+    return f"{os.path.splitext(save_path)[0]}{extension}"
+
+
+def alternative_extensions(img_url):
+    """Returns the extensions an image may be saved under besides its save_path's.
+
+    Those are the sniffed ones (URLs without an image extension) and the
+    CONVERT_IMAGES_TO one.
+    """
+    extensions = set()
+    if image_url_extension(img_url) is None:
+        extensions.update(IMAGE_EXTENSIONS)
+    if CONVERT_IMAGES_TO:
+        extensions.add(f".{CONVERT_IMAGES_TO}")
+    return extensions
+
+
+def saved_image_path(save_path, img_url):
+    """Returns the path an image exists under locally, or None if it is not saved yet.
+
+    Besides save_path, that may be the same name with an alternative_extensions() one.
+    """
+    if file_exists(save_path):
+        return save_path
+    stem = os.path.splitext(save_path)[0]
+    for extension in sorted(alternative_extensions(img_url)):
+        if file_exists(f"{stem}{extension}"):
+            return f"{stem}{extension}"
+    return None
+
+
+def download_image(img_url, save_path, session, limits=None):
+    """Downloads an image using a requests session.
+
+    The body is streamed into "<save_path>.part" and only renamed to save_path
+    once its size matches Content-Length, so an interrupted or truncated
+    download never looks finished. A leftover .part file is resumed with an
+    HTTP Range request when RESUME_PARTIAL_DOWNLOADS is on. The request sends
+    the validator stored next to it as If-Range, so a changed image comes back
+    whole (200) and replaces the stale bytes; a .part without a validator, or
+    a 206 under a different validator, is downloaded again from the start.
+
+    With deduplication on, the body is hashed while it streams, and a body
+    already stored elsewhere (or announced by a known ETag) becomes a link.
+
+    Returns the path the image was saved under, or None if it failed. For a
+    URL without an image extension the extension comes from the content.
+    """
+    part_path = f"{save_path}{PARTIAL_SUFFIX}"
+    validator_path = f"{part_path}{VALIDATOR_SUFFIX}"
+    resume_from = 0
+    validator = None
+    if RESUME_PARTIAL_DOWNLOADS:
+        try:
+            resume_from = os.path.getsize(part_path)
+        except OSError:
+            resume_from = 0
+        if resume_from:
+            validator = read_validator(validator_path)
+            if validator is None:
+                resume_from = 0  # Unknown version of the image: the bytes cannot be trusted
+    headers = {}
+    if resume_from:
+        headers = {"Range": f"bytes={resume_from}-", "If-Range": validator}
+    hasher = hashlib.sha256() if CONTENT_STORE is not None else None
+    write_seconds = 0.0
+    try:
+        log.debug(f"        Attempting download: {img_url}")
+        # Closing the streamed response hands the connection back to the shared
+        # pool even when the status check fails before the body is read
+        with SCHEDULER.get(
+            session,
+            img_url,
+            limits=limits,
+            stream=True,
+            timeout=REQUEST_TIMEOUT,
+            headers=headers,
+        ) as response:
+            if resume_from and (
+                response.status_code == 416
+                or (
+                    response.status_code == 206
+                    and response_validator(response) not in (None, validator)
+                )
+            ):
+                # The server cannot serve the rest, or serves it from another
+                # version of the image: start over
+                remove_partial(part_path)
+                return download_image(img_url, save_path, session, limits)
+            response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
+            if response.status_code != 206:
+                resume_from = 0  # Range ignored or If-Range failed, the full body follows
+            expected_size = get_expected_size(response, resume_from)
+            content_type = response.headers.get("Content-Type", "")
+            if CONTENT_STORE is not None:
+                etag_source = ContentStore.etag_source(
+                    urlparse(img_url).netloc, response.headers.get("ETag")
+                )
+                # The ETag may come from another URL of the host: only trusted
+                # when the sizes match and the linked file still hashes right
+                if not resume_from and expected_size is not None:
+                    linked_path = CONTENT_STORE.link_known_source(
+                        etag_source,
+                        save_path,
+                        size=expected_size,
+                        verify=True,
+                        adopt_extensions=alternative_extensions(img_url),
+                    )
+                    if linked_path is not None:
+                        remove_partial(part_path)  # A stale .part of an older version
+                        return linked_path  # Closing the response skips the body transfer
+                if resume_from:
+                    hash_file_into(part_path, hasher)
+            if not resume_from:
+                write_validator(validator_path, response_validator(response))
+            chunk_size = DOWNLOAD_BUFFER_SIZE
+            if BANDWIDTH is not None:
+                chunk_size = min(chunk_size, LIMITED_CHUNK_SIZE)
+            with open(
+                part_path, "ab" if resume_from else "wb", buffering=DOWNLOAD_BUFFER_SIZE
+            ) as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if BANDWIDTH is not None:
+                        BANDWIDTH.consume(len(chunk))
+                    write_start = time.perf_counter()
+                    f.write(chunk)
+                    write_seconds += time.perf_counter() - write_start
+                    if hasher is not None:
+                        hasher.update(chunk)
+                write_start = time.perf_counter()
+                f.flush()  # Small images never leave the write buffer before this
+                write_seconds += time.perf_counter() - write_start
+        METRICS.observe("write", write_seconds)
+        final_size = os.path.getsize(part_path)
+        METRICS.count("image_bytes", final_size - resume_from)
+        if expected_size is not None and final_size != expected_size:
+            log.warning(
+                f"          INCOMPLETE download {img_url}: got {final_size} of {expected_size} bytes. Kept '{part_path}' to resume."
+            )
+            return None
+        if image_url_extension(img_url) is None:
+            save_path = sniffed_save_path(save_path, part_path, content_type)
+        os.replace(part_path, save_path)
+        remove_file(validator_path)
+        if CONTENT_STORE is not None:
+            save_path = CONTENT_STORE.add(
+                save_path,
+                hasher.hexdigest(),
+                final_size,
+                (ContentStore.url_source(img_url), etag_source),
+                adopt_extensions=alternative_extensions(img_url),
+            )
+        log.debug(f"        SUCCESS: Saved locally to {save_path}")
+        return save_path
+    except requests.exceptions.HTTPError as http_err:
+        log.error(f"          HTTP ERROR downloading {img_url}: {http_err}")
+    except requests.exceptions.RequestException as e:
+        log.error(f"          ERROR downloading {img_url}: {e}")
+    except IOError as e:
+        log.error(f"          ERROR saving file {save_path}: {e}")
+    except Exception as e:
+        log.error(f"          UNEXPECTED ERROR for {img_url}: {e}")
+    return None
+
+
+def response_validator(response):
+    """Returns the response's strong ETag, else its Last-Modified date, else None.
+
+    If-Range only accepts strong validators, so a weak ETag ("W/...") is skipped.
+    """
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+def read_validator(validator_path):
+    """Returns the validator stored next to a .part file, or None."""
+    try:
+        with open(validator_path, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def write_validator(validator_path, validator):
+    """Stores the validator a .part file is downloaded under (removes it if None)."""
+    if validator is None:
+        remove_file(validator_path)
+        return
+    with open(validator_path, "w", encoding="utf-8") as f:
+        f.write(validator)
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_partial(part_path):
+    """Removes a .part file together with its stored validator."""
+    remove_file(part_path)
+    remove_file(f"{part_path}{VALIDATOR_SUFFIX}")
+
+
+def hash_file_into(path, hasher):
+    """Feeds the bytes already in a file (a resumed .part) into a hash object."""
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(DOWNLOAD_BUFFER_SIZE), b""):
+            hasher.update(block)
+
+
+def get_expected_size(response, resume_from):
+    """Returns the full file size announced by the server, or None if unknown."""
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        return None  # Content-Length counts the compressed bytes
+    content_range = response.headers.get("Content-Range", "")
+    match = re.match(r"bytes\s+\d+-\d+/(\d+)", content_range)
+    if response.status_code == 206 and match:
+        return int(match.group(1))
+    content_length = response.headers.get("Content-Length")
+    if content_length and content_length.isdigit():
+        return resume_from + int(content_length)
+    return None
+
+
+def download_image_limited(img_url, save_path, session, limits=None):
+    """Downloads an image once one of its host's (adaptive) download slots is free.
+
+    Returns the path the image was saved under, or None (see download_image).
+    """
+    if CONTENT_STORE is not None:
+        linked_path = CONTENT_STORE.link_known_source(
+            ContentStore.url_source(img_url),
+            save_path,
+            adopt_extensions=alternative_extensions(img_url),
+        )
+        if linked_path is not None:
+            return linked_path  # Same URL already stored in another gallery: no request at all
+    with SCHEDULER.slot(img_url, limits), METRICS.timer("download"):
+        return download_image(img_url, save_path, session, limits)
+
+
+def image_size(img_url, session, limits=None):
+    """Returns the size of an image announced by a HEAD request, or None if unknown."""
+    try:
+        with SCHEDULER.slot(img_url, limits), METRICS.timer("head"):
+            response = SCHEDULER.request(
+                session, "HEAD", img_url, limits=limits, timeout=REQUEST_TIMEOUT
+            )
+    except requests.exceptions.RequestException as e:
+        log.debug(f"          HEAD failed for {img_url}: {e}")
+        return None
+    response.close()
+    if response.status_code != 200:
+        return None
+    return get_expected_size(response, 0)
+
+
+def postprocess_image(saved_path):
+    """Runs the POSTPROCESSOR pool on a downloaded image.
+
+    Returns the path now holding the image (changed by a conversion), or
+    None if it does not decode. The corrupt file is deleted then and the
+    image counts as failed, so the retry at the end of the run downloads it
+    again. The content store
+    follows both: a converted image is stored under its new path, a corrupt
+    one is forgotten.
+    """
+    try:
+        with METRICS.timer("postprocess"):
+            result = POSTPROCESSOR.process(saved_path)
+    except Exception as e:  # Pool process died; keep the file unchecked
+        log.error(f"          ERROR post-processing {saved_path}: {e}")
+        return saved_path
+    index = directory_index_for(saved_path)
+    if not result.ok:
+        log.warning(
+            f"          CORRUPT image '{saved_path}' ({result.error}). Deleted to download it again."
+        )
+        try:
+            os.remove(saved_path)
+        except OSError:
+            pass
+        if index is not None:
+            index.remove_file(saved_path)
+        if CONTENT_STORE is not None:
+            CONTENT_STORE.discard(saved_path)
+        return None
+    if result.path != saved_path:
+        original_kept = os.path.exists(saved_path)
+        if CONTENT_STORE is not None and not original_kept:
+            CONTENT_STORE.moved(saved_path, result.path)
+        if index is not None:
+            if not original_kept:
+                index.remove_file(saved_path)
+            index.add_file(result.path)
+    return result.path
+
+
+def write_gallery_manifest(folder_path, url, name, expected_count, saved_images, complete):
+    """Writes the manifest of a gallery folder; saved_images maps image URL -> path.
+
+    Entries of the previous manifest are kept while their file exists, and
+    unchanged files are not hashed again. complete says the crawl found
+    nothing missing; the manifest only claims it with enough entries.
+    """
+    if not GALLERY_MANIFESTS or not folder_exists(folder_path):
+        return None
+    manifest = new_manifest(url, name, expected_count, read_manifest(folder_path))
+    images = manifest["images"]
+    for img_url, entry in list(images.items()):
+        if img_url not in saved_images and not os.path.exists(
+            os.path.join(folder_path, entry["file"])
+        ):
+            del images[img_url]
+    with METRICS.timer("manifest"):
+        for img_url, path in saved_images.items():
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                images.pop(img_url, None)
+                continue
+            entry = images.get(img_url)
+            if (
+                entry is not None
+                and entry["file"] == os.path.basename(path)
+                and entry["size"] == size
+                and (entry.get("sha256") or not MANIFEST_HASHES)
+            ):
+                continue
+            images[img_url] = image_entry(path, hash_file(path) if MANIFEST_HASHES else None)
+        manifest["complete"] = bool(complete) and len(images) >= (expected_count or 0)
+        try:
+            write_manifest(folder_path, manifest)
+        except OSError as e:
+            log.warning(f"      Warning: Could not write the manifest of '{folder_path}': {e}")
+            return None
+    return manifest
+
+
+def gallery_page_links(page, site):
+    """Returns (image srcs, 'Next Page' href or None) of a parsed gallery page."""
+    with METRICS.timer("select"):
+        return (
+            page.attrs(site.image_selector, "src"),
+            page.first_attr(site.gallery_next_page_selector, "href"),
+        )
+
+
+@timed("parse")
+def parse_page(content, kind, parser):
+    return parser.parse(content, kind)
+
+
+def get_soup(
+    url, session, site, kind, timeout=REQUEST_TIMEOUT, cache_ttl=None, raise_errors=False
+):
+    """Fetches a URL of a site and returns it parsed as an "overview" or "gallery" page.
+
+    Requests go through SCHEDULER, so transient failures are retried before
+    (None, None) is returned. With raise_errors, the final requests exception
+    is re-raised instead, for callers that treat 4xx and 5xx differently.
+
+    Parsing goes through the site's parser backend, which only supports the
+    selectors compiled for that page kind; requests use the site's host limits.
+
+    With the HTTP cache enabled and a cache_ttl given, a fresh cached copy is
+    parsed without any request, and a stale one is revalidated with
+    If-None-Match / If-Modified-Since so a 304 skips the body transfer.
+    """
+    metadata = cached_body = None
+    headers = {}
+    if HTTP_CACHE is not None and cache_ttl is not None:
+        metadata, cached_body = HTTP_CACHE.get(url)
+        if metadata is not None:
+            if HTTP_CACHE.is_fresh(metadata, cache_ttl):
+                HTTP_CACHE.count("hits")
+                return parse_page(cached_body, kind, site.parser), metadata["final_url"]
+            headers = HTTP_CACHE.conditional_headers(metadata)
+    try:
+        with METRICS.timer("fetch"):
+            response = SCHEDULER.get(
+                session, url, limits=site.host_limits, timeout=timeout, headers=headers
+            )
+            content = response.content
+        METRICS.count(f"{kind}_pages_fetched")
+        if response.status_code == 304 and cached_body is not None:
+            HTTP_CACHE.count("revalidations")
+            HTTP_CACHE.refresh(url, metadata)
+            return parse_page(cached_body, kind, site.parser), metadata["final_url"]
+        response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
+        if HTTP_CACHE is not None and cache_ttl is not None:
+            HTTP_CACHE.count("misses")
+            HTTP_CACHE.store(url, response)
+        return parse_page(content, kind, site.parser), response.url
+    except requests.exceptions.RequestException as e:
+        log.error(f"      ERROR fetching {url}: {e}")
+        if raise_errors:
+            raise
+        return None, None
+    except Exception as e:
+        log.error(f"      ERROR parsing {url}: {e}")
+        return None, None
+
+
+def is_missing_page(http_err):
+    """True for a 4xx answer (other than 429), i.e. the page itself does not exist."""
+    status = http_err.response.status_code if http_err.response is not None else 0
+    return 400 <= status < 500 and status != 429
+
+
+def gallery_priority(gallery_url):
+    """Queue priority of a gallery: lower is sooner.
+
+    With DOWNLOAD_PRIORITY "newest", galleries with a later date in their
+    URL come first and undated ones last; otherwise all are equal, so the
+    queues stay in discovery order.
+    """
+    if DOWNLOAD_PRIORITY != "newest":
+        return 0
+    date_str = extract_and_format_date(gallery_url)
+    return -int(date_str.replace("_", "")) if date_str else 0
+
+
+def gallery_group_key(site, gallery_url):
+    """Work queue key of the job group holding a gallery's images."""
+    return f"gallery:{site.name}:{gallery_url}"
+
+
+# --- Crawl Pipeline ---
+STAGE_DONE = object()  # Sentinel telling a stage worker that its input is exhausted
+
+
+class PipelineStage:
+    """A pool of worker threads that feeds items from a bounded queue to a handler.
+
+    When the last worker of a stage exits, the next stage is closed, so shutdown
+    ripples down the pipeline once the overview stage runs out of pages.
+    """
+
+    def __init__(self, name, handler, workers, input_queue=None, next_stage=None):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.input_queue = input_queue  # None: the handler produces its own work
+        self.next_stage = next_stage
+        self.timer_name = f"stage_{name.replace('-', '_')}"  # Time spent per item in METRICS
+        self.done = threading.Event()
+        self._running = self.workers
+        self._lock = threading.Lock()
+
+    def start(self):
+        for worker_num in range(self.workers):
+            threading.Thread(
+                target=self._run, name=f"{self.name}-{worker_num}", daemon=True
+            ).start()
+
+    def close(self):
+        """Signals every worker that no more items will arrive."""
+        for _ in range(self.workers):
+            self.input_queue.put(STAGE_DONE)
+
+    def join(self):
+        self.done.wait()
+
+    def _run(self):
+        try:
+            if PROFILER is not None:
+                PROFILER.run(self._work)
+            else:
+                self._work()
+        finally:
+            with self._lock:
+                self._running -= 1
+                last_worker = self._running == 0
+            if last_worker:
+                if self.next_stage is not None:
+                    self.next_stage.close()
+                self.done.set()
+
+    def _work(self):
+        if self.input_queue is None:
+            self._call(None)
+            return
+        while True:
+            item = self.input_queue.get()
+            if item is STAGE_DONE:
+                break
+            self._call(item)
+            self.input_queue.task_done()
+
+    def _call(self, item):
+        try:
+            with METRICS.timer(self.timer_name):
+                if item is None:
+                    self.handler()
+                else:
+                    self.handler(item)
+        except Exception as stage_err:
+            log.error(f"  ERROR in {self.name} stage: {stage_err}")
+
+
+class FairQueue:
+    """Bounded queue with one lane per site, served round-robin.
+
+    Each lane hands out its items by priority_of(item) (lowest first, ties
+    in arrival order), so newer galleries overtake older ones still waiting.
+    put() blocks only producers whose own lane is full. get() prefers lanes
+    below their fair share of the consumers (consumers / sites with work);
+    other lanes are served only while a consumer is left for every other
+    busy site, so a slow site cannot tie up every worker. Consumers call
+    task_done() after each item. STAGE_DONE is handed out once all lanes
+    are empty, so closing a stage never cuts off queued work.
+    """
+
+    def __init__(self, lane_of, maxsize_per_lane, consumers, priority_of=None):
+        self.lane_of = lane_of  # item -> lane key (the site name)
+        self.priority_of = priority_of  # item -> sort key, or None for FIFO
+        self.maxsize_per_lane = maxsize_per_lane
+        self.consumers = max(1, consumers)
+        self._lanes = collections.OrderedDict()  # lane -> heap of (priority, sequence, item)
+        self._sequence = 0
+        self._in_flight = {}  # lane -> items handed out, not yet task_done()
+        self._next_lane = 0
+        self._done_markers = 0
+        self._condition = threading.Condition()
+        self._local = threading.local()  # Lane of the item a consumer thread holds
+
+    def put(self, item):
+        with self._condition:
+            if item is STAGE_DONE:
+                self._done_markers += 1
+            else:
+                lane = self.lane_of(item)
+                if lane not in self._lanes:
+                    self._lanes[lane] = []
+                    self._in_flight[lane] = 0
+                items = self._lanes[lane]
+                while 0 < self.maxsize_per_lane <= len(items):
+                    self._condition.wait()
+                priority = self.priority_of(item) if self.priority_of is not None else 0
+                self._sequence += 1
+                heapq.heappush(items, (priority, self._sequence, item))
+            self._condition.notify_all()
+
+    def get(self):
+        with self._condition:
+            while True:
+                lane = self._pick_lane()
+                if lane is not None:
+                    self._in_flight[lane] += 1
+                    self._local.lane = lane
+                    item = heapq.heappop(self._lanes[lane])[2]
+                    self._condition.notify_all()
+                    return item
+                if self._done_markers and not any(self._lanes.values()):
+                    self._done_markers -= 1
+                    return STAGE_DONE
+                self._condition.wait()
+
+    def _pick_lane(self):
+        lanes = list(self._lanes)
+        busy = [lane for lane in lanes if self._lanes[lane] or self._in_flight[lane]]
+        if not busy:
+            return None
+        fair_share = -(-self.consumers // len(busy))  # Rounded up
+        hard_cap = self.consumers - (len(busy) - 1)
+        for cap in (fair_share, hard_cap):
+            for offset in range(len(lanes)):
+                lane = lanes[(self._next_lane + offset) % len(lanes)]
+                if self._lanes[lane] and self._in_flight[lane] < cap:
+                    self._next_lane = (self._next_lane + offset + 1) % len(lanes)
+                    return lane
+        return None
+
+    def task_done(self):
+        lane = getattr(self._local, "lane", None)
+        if lane is None:
+            return
+        self._local.lane = None
+        with self._condition:
+            self._in_flight[lane] -= 1
+            self._condition.notify_all()
+
+
+class GalleryJob:
+    """Tracks one gallery while its pages and images move through the pipeline."""
+
+    def __init__(self, url, crawl, session, on_finished=None):
+        self.url = url
+        self.crawl = crawl  # SiteCrawl of the site the gallery belongs to
+        self.session = session
+        self.on_finished = on_finished  # Called with the job once it is fully done
+        self.name = "untitled_gallery"
+        self.folder_path = None
+        self.expected_count = None
+        self.local_file_count = 0
+        self.first_page_links = None  # (image srcs, next page href) of the first page
+        self.first_page_url = None
+        self.images_planned = 0
+        self.images_downloaded = 0
+        self.images_failed = 0
+        self.images_published = 0  # Image jobs handed to the work queue (--coordinator)
+        self.pagination_complete = True  # False if a gallery page could not be fetched
+        self.final_local_count = 0
+        self.claimed_save_paths = set()  # Save paths already handed to a download job
+        self.saved_images = {}  # Image URL -> path of every image on disk, for the manifest
+        self.published_paths = {}  # Image URL -> save path handed to the work queue
+        self.started_at = time.monotonic()
+        self._pending_images = 0
+        self._pagination_done = False
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def add_pending_images(self, count):
+        with self._lock:
+            self._pending_images += count
+            self.images_planned += count
+
+    def add_saved_image(self, img_url, path):
+        with self._lock:
+            self.saved_images[img_url] = path
+
+    def image_finished(self, success):
+        with self._lock:
+            self._pending_images -= 1
+            if success:
+                self.images_downloaded += 1
+            else:
+                self.images_failed += 1
+        self._finish_if_complete()
+
+    def pagination_finished(self):
+        with self._lock:
+            self._pagination_done = True
+        self._finish_if_complete()
+
+    def _finish_if_complete(self):
+        with self._lock:
+            if (
+                self._finished
+                or not self._pagination_done
+                or self._pending_images > 0
+            ):
+                return
+            self._finished = True
+        self.report()
+        self.session.close()
+        if self.on_finished is not None:
+            self.on_finished(self)
+
+    def report(self):
+        """Final logging for a gallery that was not skipped."""
+        final_local_count = self.final_local_count = count_image_files(self.folder_path)
+        seconds = time.monotonic() - self.started_at
+        METRICS.observe("gallery", seconds)
+        METRICS.event(
+            "gallery",
+            url=self.url,
+            name=self.name,
+            seconds=round(seconds, 3),
+            images_planned=self.images_planned,
+            images_downloaded=self.images_downloaded,
+            images_failed=self.images_failed,
+        )
+        if self.crawl.crawler.plan is not None:
+            log.info(
+                f"\n    ---> Planned {self.images_planned} images of gallery '{self.name}'."
+            )
+            return
+        if self.images_published:
+            log.info(
+                f"\n    ---> Published {self.images_published} images of gallery '{self.name}' to the work queue."
+            )
+            return
+        log.info(f"\n    ---> Finished PROCESSING gallery '{self.name}'.")
+        log.info(
+            f"      Downloaded {self.images_downloaded} new images in this run for this gallery."
+        )
+        if folder_exists(self.folder_path):
+            log.info(
+                f"      Folder '{self.folder_path}' now contains {final_local_count} images."
+            )
+            if (
+                self.expected_count is not None
+                and final_local_count < self.expected_count
+            ):
+                log.warning(
+                    f"      WARNING: Final count ({final_local_count}) is less than expected ({self.expected_count})."
+                )
+        elif self.images_downloaded > 0:
+            log.warning(
+                f"      WARNING: Images were downloaded but folder '{self.folder_path}' cannot be confirmed."
+            )
+        else:
+            log.info(f"      No new images downloaded for this gallery.")
+
+
+class SiteCrawl:
+    """The overview walk of one site, feeding its galleries into the shared pipeline.
+
+    Holds everything that is per site: its Site profile, crawl state,
+    overview progress and the gallery URLs already seen.
+    """
+
+    def __init__(self, site, crawler, state=None, mode="full", start_page=1):
+        self.site = site
+        self.crawler = crawler
+        self.state = state  # CrawlState, or None to keep everything in memory
+        self.mode = mode
+        self.overview_session = crawler.transport.new_session()
+        # Galleries we've decided *not* to process again
+        if BOUNDED_MEMORY:
+            self.processed_or_skipped_urls = SeenUrlSet(SEEN_URLS_EXPECTED)
+        else:
+            self.processed_or_skipped_urls = set()
+        self._urls_lock = threading.Lock()
+        self._overview_lock = threading.Lock()
+        self._next_overview_page = start_page
+        self._overview_end_page = None  # First page number known to be past the end
+        self.overview_pages_attempted = 0
+        self.overview_probes = 0  # Requests spent finding the last overview page
+        self._overview_failures = 0  # Consecutive overview pages that failed after retries
+        self.deferred_overview_pages = []  # Retried once the last overview page is reached
+        self._deferred_lock = threading.Lock()
+
+    # --- Overview Discovery ---
+    def overview_page_url(self, page_num):
+        return self.site.overview_page_url(page_num)
+
+    def discover_last_overview_page(self):
+        """Finds the last overview page before the walk starts.
+
+        With the end known, the overview workers can fetch pages concurrently
+        without running past it. Pages 1, 2, 4, 8, ... are probed and the gap
+        between the last page that exists and the first one that does not is
+        binary searched. When configured, the highest number in the pagination
+        widget (self.site.overview_pagination_selector) is where the probing
+        starts: widgets often list only a window of pages, so a page past it
+        must be missing before it counts as the end.
+        Probed pages land in the HTTP cache, so the walk only revalidates them (a 304
+        without a body) instead of downloading them again.
+        """
+        self.overview_probes = 0
+        try:
+            widget_page = None
+            if self.site.overview_pagination_selector:
+                widget_page = self._last_page_from_widget()
+            last_page = self._last_page_by_probing(widget_page)
+        except requests.exceptions.RequestException as e:
+            log.warning(f"Overview discovery failed ({e}). Walking pages in order.")
+            return
+        with self._overview_lock:
+            self._overview_end_page = last_page + 1
+        log.info(
+            f"Overview discovery: last overview page is {last_page} ({self.overview_probes} probe requests)."
+        )
+
+    def _fetch_overview_probe(self, page_num):
+        self.overview_probes += 1
+        url = self.overview_page_url(page_num)
+        try:
+            page, actual_url = get_soup(
+                url,
+                self.overview_session,
+                self.site,
+                "overview",
+                cache_ttl=HTTP_CACHE_TTL_OVERVIEW,
+                raise_errors=True,
+            )
+        except requests.exceptions.HTTPError as http_err:
+            if is_missing_page(http_err):
+                return None, None  # Past the end
+            raise
+        return page, actual_url
+
+    def _overview_page_exists(self, page_num):
+        page, actual_url = self._fetch_overview_probe(page_num)
+        if page is None:
+            return False
+        if urlparse(actual_url).path.rstrip("/") != urlparse(
+            self.overview_page_url(page_num)
+        ).path.rstrip("/"):
+            return False  # Sites often redirect pages past the end to the first/last one
+        return any(href and href.strip() for href in page.attrs(self.site.gallery_link_selector, "href"))
+
+    def _last_page_from_widget(self):
+        page, _ = self._fetch_overview_probe(1)
+        if page is None:
+            return None
+        page_numbers = [
+            int(match.group(1))
+            for href in page.attrs(self.site.overview_pagination_selector, "href")
+            if href
+            for match in [re.search(r"/page/(\d+)/?(?:[?#].*)?$", href)]
+            if match
+        ]
+        if not page_numbers:
+            log.info("Overview discovery: no page numbers in the pagination widget. Probing instead.")
+            return None
+        return max(page_numbers)
+
+    def _last_page_by_probing(self, known_page=None):
+        """Returns the last overview page; known_page is one assumed to exist (from the widget)."""
+        if known_page is None:
+            if not self._overview_page_exists(1):
+                return 0
+            known_page = 1
+        # Steps of 1, 2, 4, ... past the known page: 1, 2, 4, 8, ... without a widget
+        last_existing, step = known_page, 1
+        first_missing = last_existing + step
+        while self._overview_page_exists(first_missing):
+            last_existing, step = first_missing, step * 2
+            first_missing = last_existing + step
+        while first_missing - last_existing > 1:
+            middle = (last_existing + first_missing) // 2
+            if self._overview_page_exists(middle):
+                last_existing = middle
+            else:
+                first_missing = middle
+        return last_existing
+
+    # --- Stage 1: Overview Pagination ---
+    def _claim_overview_page(self):
+        with self._overview_lock:
+            page_num = self._next_overview_page
+            if (
+                self._overview_end_page is not None
+                and page_num >= self._overview_end_page
+            ):
+                return None
+            self._next_overview_page += 1
+            self.overview_pages_attempted += 1
+            return page_num
+
+    def _mark_overview_end(self, page_num):
+        with self._overview_lock:
+            if self._overview_end_page is None or page_num < self._overview_end_page:
+                self._overview_end_page = page_num
+
+    def walk_overview(self):
+        """Walks overview pages until one is missing or has no gallery links.
+
+        Pages that failed with a transient error are retried once the end is reached.
+        """
+        while True:
+            overview_page_num = self._claim_overview_page()
+            if overview_page_num is None:
+                break
+            if not self.process_overview_page(overview_page_num):
+                self._mark_overview_end(overview_page_num)
+                break
+        while True:
+            with self._deferred_lock:
+                if not self.deferred_overview_pages:
+                    return
+                overview_page_num = self.deferred_overview_pages.pop(0)
+            log.info(f"\n  Retrying overview page {overview_page_num}, which failed earlier.")
+            self.process_overview_page(overview_page_num, is_retry=True)
+
+    def _overview_page_failed(self, overview_page_num, is_retry):
+        """Defers a page that failed after all retries. Returns False to stop the walk."""
+        if is_retry:
+            log.warning(f"  Overview page {overview_page_num} failed again. Giving up on it.")
+            return False
+        with self._deferred_lock:
+            self._overview_failures += 1
+            too_many = self._overview_failures >= OVERVIEW_MAX_FAILURES
+            if too_many:
+                self.deferred_overview_pages.clear()  # Retrying a dead site is pointless
+            else:
+                self.deferred_overview_pages.append(overview_page_num)
+        if too_many:
+            log.warning(
+                f"  {OVERVIEW_MAX_FAILURES} overview pages in a row failed. Assuming the site is down; stopping the overview walk."
+            )
+            return False
+        log.warning(
+            f"  Overview page {overview_page_num} failed. Continuing; it is retried after the last overview page."
+        )
+        return True
+
+    def plan_from_link(self, gallery_url, link_text):
+        """Decides from an overview link's text whether a gallery can be skipped unseen.
+
+        The link usually carries the gallery page's title, "(NN PICS)" count
+        included, so the folder name and expected count can be worked out
+        without fetching the gallery. Returns (status, name, folder, expected
+        count, local count) for a gallery that is complete on disk or has the
+        skip phrase, or None when the text leaves any doubt; the gallery stage
+        then decides from the gallery page as usual.
+        """
+        site = self.site
+        title = (link_text or "").strip()
+        if not title:
+            return None
+        if site.skip_phrase and site.skip_phrase in title:
+            return STATUS_SKIPPED, None, None, None, 0
+        expected_count = extract_count_from_title(title)
+        if not expected_count:
+            return None  # Without a count, "complete" cannot be told apart from "partial"
+        name = sanitize_filename(
+            modify_gallery_title(
+                title, extract_and_format_date(gallery_url), site.skip_phrase
+            )
+        )
+        folder_path = os.path.join(site.download_folder, name)
+        if not folder_exists(folder_path):
+            return None  # New, or the link text differs from the page title
+        manifest = read_manifest(folder_path) if GALLERY_MANIFESTS else None
+        if manifest is not None:
+            if not is_complete(manifest, expected_count):
+                return None
+            local_count = len(manifest["images"])
+        else:
+            local_count = count_image_files(folder_path)
+            if local_count < expected_count:
+                return None
+        return STATUS_COMPLETE, name, folder_path, expected_count, local_count
+
+    def _record_planned_skip(self, gallery_url, plan):
+        status, name, folder_path, expected_count, local_count = plan
+        self.state.record_gallery(
+            gallery_url,
+            status,
+            name=name,
+            folder=folder_path,
+            expected_count=expected_count,
+            image_count=local_count,
+        )
+
+    def process_overview_page(self, overview_page_num, is_retry=False):
+        """Queues the new galleries of one overview page. Returns False at the end."""
+        current_overview_page_url = self.overview_page_url(overview_page_num)
+        log.info(
+            f"\n{'='*10} [{self.site.name}] Attempting Overview Page {overview_page_num}: {current_overview_page_url} {'='*10}"
+        )
+
+        try:
+            soup_overview, actual_overview_url = get_soup(
+                current_overview_page_url,
+                self.overview_session,
+                self.site,
+                "overview",
+                cache_ttl=HTTP_CACHE_TTL_OVERVIEW,
+                raise_errors=True,
+            )
+        except requests.exceptions.HTTPError as http_err:
+            if is_missing_page(http_err):
+                log.info(
+                    f"  Overview page {overview_page_num} does not exist (HTTP {http_err.response.status_code}). Assuming end."
+                )
+                return False
+            return self._overview_page_failed(overview_page_num, is_retry)
+        except requests.exceptions.RequestException:
+            # Timeouts, connection errors, open circuit: not a sign of the last page
+            return self._overview_page_failed(overview_page_num, is_retry)
+        with self._deferred_lock:
+            self._overview_failures = 0
+
+        if soup_overview is None:
+            log.info(
+                f"  Failed to fetch or parse overview page {overview_page_num}. Assuming end."
+            )
+            return False
+
+        # Check for redirects that might indicate end of pages
+        expected_path = urlparse(current_overview_page_url).path.rstrip("/")
+        actual_path = urlparse(actual_overview_url).path.rstrip("/")
+        if actual_path != expected_path:
+            # This check is more complex browserless. A simple 301/302 might
+            # automatically redirect to page 1 or the last page.
+            # Let's rely more on finding gallery links.
+            log.info(
+                f"  Redirected from expected URL path ({expected_path} -> {actual_path}). Continuing..."
+            )
+
+        # --- Collect Gallery Links ---
+        with METRICS.timer("select"):
+            gallery_links = soup_overview.links(self.site.gallery_link_selector)
+        soup_overview = None  # Only the links are needed from here on
+        log.info(
+            f"  Found {len(gallery_links)} potential gallery link elements on overview page {overview_page_num}."
+        )
+
+        if not gallery_links:
+            log.info(
+                f"  No gallery links found on overview page {overview_page_num}. Assuming end."
+            )
+            return False  # No links means end of overview pages
+
+        page_gallery_urls = []
+        link_titles = {}  # Gallery URL -> text of its first link
+        for href, link_text in gallery_links:
+            if href and href.strip():
+                full_url = urljoin(actual_overview_url, href.strip())
+                page_gallery_urls.append(full_url)
+                link_titles.setdefault(full_url, link_text)
+
+        finished_urls = set()
+        if self.state is not None:
+            finished_urls = self.state.finished_gallery_urls(page_gallery_urls)
+            if finished_urls:
+                log.info(
+                    f"  {len(finished_urls)} galleries on overview page {overview_page_num} are already finished (crawl state). Skipping them without fetching."
+                )
+
+        planned_skips = {}  # Gallery URL -> plan_from_link() result
+        if PLAN_FROM_OVERVIEW:
+            for full_url, link_text in link_titles.items():
+                if full_url not in finished_urls:
+                    plan = self.plan_from_link(full_url, link_text)
+                    if plan is not None:
+                        planned_skips[full_url] = plan
+            if planned_skips:
+                METRICS.count("galleries_planned_skip", len(planned_skips))
+                log.info(
+                    f"  {len(planned_skips)} galleries on overview page {overview_page_num} are complete on disk (or skipped) by their link title. Skipping them without fetching."
+                )
+
+        if self.state is not None:
+            if (
+                self.mode == "incremental"
+                and page_gallery_urls
+                and finished_urls.union(planned_skips).issuperset(page_gallery_urls)
+            ):
+                log.info(
+                    f"  Every gallery on overview page {overview_page_num} is already finished. Incremental run stops here."
+                )
+                # Recorded so the next incremental run or --quick-check knows them too
+                for full_url, plan in planned_skips.items():
+                    self._record_planned_skip(full_url, plan)
+                return False
+
+        new_gallery_urls = []
+        for full_url in page_gallery_urls:
+            with self._urls_lock:
+                # Marking here also drops duplicates from the same overview page
+                if full_url in self.processed_or_skipped_urls:
+                    continue
+                self.processed_or_skipped_urls.add(full_url)
+            plan = planned_skips.get(full_url)
+            if plan is not None and self.state is not None:
+                self._record_planned_skip(full_url, plan)
+            elif plan is None and full_url not in finished_urls:
+                new_gallery_urls.append(full_url)
+        log.info(
+            f"  Found {len(new_gallery_urls)} new unique gallery links to check/process from overview page {overview_page_num}."
+        )
+
+        if self.state is not None:
+            for gallery_url in new_gallery_urls:
+                self.state.record_discovered(gallery_url, overview_page_num)
+            self.state.record_overview_page(overview_page_num)
+
+        for gallery_url in new_gallery_urls:
+            # Blocks while this site's lane of the gallery stage is full
+            self.crawler.gallery_queue.put((self, gallery_url))
+        return True
+
+
+class Crawler:
+    """Runs the crawl of every site as four stages joined by bounded queues.
+
+    overview pagination -> gallery metadata -> gallery pagination -> image download
+    (-> post-processing in a process pool, with POSTPROCESS_IMAGES)
+
+    HTML discovery runs ahead of the slow image transfers, while the bounded
+    queues block fast producers so memory stays flat on very large sites.
+    All sites share the worker pools; each queue keeps one lane per site and
+    serves the lanes round-robin (see FairQueue), so a slow site cannot
+    starve the others.
+
+    With a work_queue (--coordinator) the images are not downloaded here but
+    published as jobs for QueueWorker processes, one job group per gallery.
+    With a plan (--plan) they are only written to the PlanWriter, after a
+    HEAD request for their size with PLAN_IMAGE_SIZES; execute_plan() later
+    downloads such a plan without discovering anything again.
+    """
+
+    def __init__(self, transport, mode="full", work_queue=None, plan=None):
+        self.transport = transport  # HttpTransport shared by every stage
+        self.mode = mode
+        self.work_queue = work_queue
+        self.plan = plan
+        self.site_crawls = []
+        self.deferred_downloads = []  # (job, img_url, save_path) retried at the end of the run
+        self.deferred_dropped = 0  # Failed images beyond MAX_DEFERRED_DOWNLOADS, not retried
+        self._deferred_lock = threading.Lock()
+        self.published_galleries = {}  # Job group key -> GalleryJob, until the workers finish it
+        self._published_lock = threading.Lock()
+
+        self.overview_queue = queue.Queue()  # One entry per overview worker and site
+        self.gallery_queue = FairQueue(
+            lambda item: item[0].site.name,
+            STAGE_QUEUE_SIZE,
+            GALLERY_WORKERS,
+            lambda item: gallery_priority(item[1]),
+        )
+        self.gallery_page_queue = FairQueue(
+            lambda job: job.crawl.site.name,
+            STAGE_QUEUE_SIZE,
+            GALLERY_PAGE_WORKERS,
+            lambda job: gallery_priority(job.url),
+        )
+        self.image_queue = FairQueue(
+            lambda item: item[0].crawl.site.name,
+            STAGE_QUEUE_SIZE,
+            MAX_CONCURRENT_DOWNLOADS,
+            lambda item: gallery_priority(item[0].url),
+        )
+        self.postprocess_queue = queue.Queue(STAGE_QUEUE_SIZE)
+
+    def add_site(self, site, state=None, start_page=1):
+        site_crawl = SiteCrawl(site, self, state, self.mode, start_page)
+        self.site_crawls.append(site_crawl)
+        return site_crawl
+
+    def _build_stages(self):
+        self.postprocess_stage = None
+        if POSTPROCESSOR is not None:
+            # One thread per pool process, each waiting for its image's result
+            self.postprocess_stage = PipelineStage(
+                "postprocess",
+                self.postprocess_stage_handler,
+                POSTPROCESSOR.processes,
+                self.postprocess_queue,
+            )
+        self.image_stage = PipelineStage(
+            "image",
+            self.plan_size_stage if self.plan is not None else self.download_stage,
+            MAX_CONCURRENT_DOWNLOADS,
+            self.image_queue,
+            self.postprocess_stage,
+        )
+        self.gallery_page_stage = PipelineStage(
+            "gallery-page",
+            self.gallery_page_stage_handler,
+            GALLERY_PAGE_WORKERS,
+            self.gallery_page_queue,
+            self.image_stage,
+        )
+        self.gallery_stage = PipelineStage(
+            "gallery",
+            self.gallery_stage_handler,
+            GALLERY_WORKERS,
+            self.gallery_queue,
+            self.gallery_page_stage,
+        )
+        self.overview_stage = PipelineStage(
+            "overview",
+            SiteCrawl.walk_overview,
+            max(1, OVERVIEW_WORKERS) * len(self.site_crawls),
+            self.overview_queue,
+            self.gallery_stage,
+        )
+        self.stages = [
+            self.overview_stage,
+            self.gallery_stage,
+            self.gallery_page_stage,
+            self.image_stage,
+        ]
+        if self.postprocess_stage is not None:
+            self.stages.append(self.postprocess_stage)
+
+    def run(self):
+        if OVERVIEW_DISCOVERY == "probe":
+            if self.mode == "incremental":
+                log.info("Overview discovery: incremental runs stop early; walking pages in order.")
+            else:
+                for site_crawl in self.site_crawls:
+                    site_crawl.discover_last_overview_page()
+        self._build_stages()
+        for stage in reversed(self.stages):
+            stage.start()
+        for site_crawl in self.site_crawls:
+            for _ in range(max(1, OVERVIEW_WORKERS)):
+                self.overview_queue.put(site_crawl)
+        self.overview_stage.close()
+        for stage in self.stages:
+            stage.join()
+        for site_crawl in self.site_crawls:
+            site_crawl.overview_session.close()
+            if isinstance(site_crawl.processed_or_skipped_urls, SeenUrlSet):
+                site_crawl.processed_or_skipped_urls.close()  # len() stays available
+        if self.work_queue is not None:
+            self.wait_for_workers()
+        self.retry_deferred_downloads()
+
+    # --- Stage 2: Gallery Metadata ---
+    def gallery_stage_handler(self, item):
+        """Fetches a gallery's first page and decides whether it needs processing."""
+        site_crawl, gallery_url = item
+        log.info(f"\n    ---> Checking Gallery: {gallery_url}")
+
+        # Use a new cookie jar for each gallery to simulate isolation/cookie clearing;
+        # the connections underneath come from the shared transport pool
+        job = GalleryJob(
+            gallery_url,
+            site_crawl,
+            self.transport.new_session(),
+            self.record_finished_gallery,
+        )
+        try:
+            skip_status = self.prepare_gallery(job)
+            if skip_status is None:
+                self.gallery_page_queue.put(job)
+                return
+            if skip_status and site_crawl.state is not None:
+                site_crawl.state.record_gallery(
+                    job.url,
+                    skip_status,
+                    name=job.name,
+                    folder=job.folder_path,
+                    expected_count=job.expected_count,
+                    image_count=job.local_file_count,
+                )
+        except Exception as gallery_err:
+            # Catch errors during fetching, parsing, or the checks for a single gallery
+            log.error(f"      ERROR processing gallery '{job.name or gallery_url}': {gallery_err}")
+        job.session.close()
+
+    def prepare_gallery(self, job):
+        """Fills in title, folder and counts, then decides whether to process the gallery.
+
+        Returns None if the gallery needs processing, the crawl-state status to
+        record if it is deliberately skipped, or False if it could not be checked.
+        """
+        # Step 1: Fetch gallery page, get title, determine potential folder name
+        log.debug(f"      Fetching gallery page: {job.url}")
+        site = job.crawl.site
+        soup_gallery, actual_gallery_url = get_soup(
+            job.url, job.session, site, "gallery", cache_ttl=HTTP_CACHE_TTL_GALLERY
+        )
+
+        if soup_gallery is None:
+            log.warning("      Failed to fetch or parse gallery page. Skipping.")
+            return False
+
+        with METRICS.timer("select"):
+            title_text = soup_gallery.first_text(site.gallery_title_selector)
+        original_title = title_text.strip() if title_text is not None else "Untitled"
+        log.debug(f"      Original Title: '{original_title}'")
+
+        # <<< Add Check for VIDEO_SKIP_PHRASE >>>
+        if site.skip_phrase and site.skip_phrase in original_title:
+            log.info(f"      SKIPPING: Title contains '{site.skip_phrase}'.")
+            return STATUS_SKIPPED
+        # <<< End VIDEO Check >>>
+
+        # Proceed with naming and other checks only if not a video
+        job.expected_count = extract_count_from_title(original_title)
+        formatted_date = extract_and_format_date(job.url)
+        modified_title = modify_gallery_title(
+            original_title, formatted_date, site.skip_phrase
+        )
+        job.name = sanitize_filename(modified_title)
+        job.folder_path = os.path.join(site.download_folder, job.name)
+
+        log.debug(f"      Gallery Name (used for folder): '{job.name}'")
+        log.debug(
+            f"      Expected Image Count from Title: {job.expected_count if job.expected_count is not None else 'Unknown'}"
+        )
+        log.debug(f"      Checking Folder Path: '{job.folder_path}'")
+
+        # Step 2: Check folder existence and compare counts
+        gallery_folder_exists = folder_exists(job.folder_path)
+        manifest = None
+        if gallery_folder_exists and GALLERY_MANIFESTS:
+            # A manifest vouches for the images of this gallery only, so
+            # unrelated files in the folder cannot fake completeness
+            manifest = read_manifest(job.folder_path)
+            if job.expected_count and is_complete(manifest, job.expected_count):
+                job.local_file_count = len(manifest["images"])
+                log.info(
+                    f"      SKIPPING download/pagination: Manifest lists all {job.expected_count} images."
+                )
+                return STATUS_COMPLETE
+        if gallery_folder_exists:
+            job.local_file_count = count_image_files(job.folder_path)
+            log.info(
+                f"      Folder exists. Local image file count: {job.local_file_count}"
+            )
+
+        # Decision Point: Skip only if folder exists AND counts match (or exceed)
+        if (
+            gallery_folder_exists
+            and manifest is None
+            and job.expected_count is not None
+            and job.expected_count > 0
+            and job.local_file_count >= job.expected_count
+        ):
+            log.info(
+                f"      SKIPPING download/pagination: Local count ({job.local_file_count}) >= Expected count ({job.expected_count})."
+            )
+            return STATUS_COMPLETE
+        elif manifest is not None:
+            log.info(
+                f"      PROCESSING: Manifest lists {len(manifest['images'])} images of {job.expected_count or 'Unknown'} and does not mark the gallery complete. Will check for missing images."
+            )
+        elif gallery_folder_exists:
+            log.info(
+                f"      PROCESSING: Folder exists but local count ({job.local_file_count}) < expected count ({job.expected_count or 'Unknown'}), or expected count unknown. Will check for missing images."
+            )
+        else:  # Folder doesn't exist
+            log.info(f"      PROCESSING: Folder not found. Proceeding with full download.")
+
+        # Start with the first page we already fetched
+        # Keep only what pagination needs, not the parsed tree, while the job waits in the queue
+        job.first_page_links = gallery_page_links(soup_gallery, site)
+        job.first_page_url = actual_gallery_url
+        return None
+
+    # --- Stage 3: Gallery Pagination ---
+    def gallery_page_stage_handler(self, job):
+        """Walks a gallery's pages and queues every image that is still missing."""
+        try:
+            self.paginate_gallery(job)
+        except Exception as gallery_err:
+            job.pagination_complete = False
+            log.error(f"      ERROR processing gallery '{job.name or job.url}': {gallery_err}")
+        finally:
+            job.pagination_finished()
+
+    def paginate_gallery(self, job):
+        site = job.crawl.site
+        current_page_in_gallery = 1
+        current_gallery_page_url = actual_gallery_url = job.first_page_url
+        image_srcs, next_page_href = job.first_page_links
+        job.first_page_links = None  # The pagination loop owns the page from here
+
+        # Innermost Loop: Handle pagination WITHIN this gallery
+        while True:
+            log.debug(
+                f"\n        Scraping Page {current_page_in_gallery} in gallery '{job.name}'..."
+            )
+            log.debug(f"        Current URL: {current_gallery_page_url}")
+
+            # If this isn't the first page, we need to fetch it now
+            if current_page_in_gallery > 1:
+                soup_gallery, actual_gallery_url = get_soup(
+                    current_gallery_page_url,
+                    job.session,
+                    site,
+                    "gallery",
+                    cache_ttl=HTTP_CACHE_TTL_GALLERY,
+                )
+                if soup_gallery is None:
+                    log.warning(
+                        f"        Failed to fetch or parse gallery page {current_page_in_gallery}. Assuming end of gallery."
+                    )
+                    job.pagination_complete = False
+                    break  # Cannot fetch next page, end gallery processing
+                # Drop the tree before queueing downloads, which may block on a full queue
+                image_srcs, next_page_href = gallery_page_links(soup_gallery, site)
+                soup_gallery = None
+
+            log.debug(f"        Found {len(image_srcs)} image elements on this page.")
+
+            if not image_srcs:
+                log.debug(
+                    f"        No images present on page {current_page_in_gallery} ('{site.image_selector}')."
+                )
+                # Continue to check for next page button, as in original logic
+
+            page_download_jobs = self.plan_page_downloads(
+                job, image_srcs, actual_gallery_url
+            )
+            self.queue_downloads(job, page_download_jobs)
+            log.debug(
+                f"        Queued {len(page_download_jobs)} new images from page {current_page_in_gallery}."
+            )
+
+            # --- Check for GALLERY Next Page ---
+            log.debug(
+                f"        Checking for Gallery 'Next Page' ('{site.gallery_next_page_selector}')"
+            )
+            # None: no 'Next Page' element, "": element without an href
+            if next_page_href is not None:
+                if next_page_href.strip():
+                    current_gallery_page_url = urljoin(
+                        actual_gallery_url, next_page_href.strip()
+                    )
+                    current_page_in_gallery += 1
+                    log.debug(
+                        f"        Gallery 'Next Page' button found. Will attempt to fetch: {current_gallery_page_url}"
+                    )
+                    # The loop will fetch the new URL in the next iteration
+                else:
+                    log.info(
+                        "        Gallery 'Next Page' button found, but href is empty. Assuming end of gallery."
+                    )
+                    break  # No valid href, end gallery processing
+            else:
+                log.debug("        No 'Next Page' button found. Assuming end of gallery.")
+                break  # No next page element, end gallery processing
+            # --- End GALLERY Next Page Check ---
+
+    def plan_page_downloads(self, job, image_srcs, actual_gallery_url):
+        """Returns (img_url, save_path) pairs for the images of a page still missing locally.
+
+        Planning runs sequentially per gallery, so naming stays deterministic even
+        though the downloads themselves run concurrently.
+        """
+        page_download_jobs = []
+        for img_src in image_srcs:
+            if not img_src or not img_src.strip():
+                continue
+            img_src = img_src.strip()
+            # Use the actual URL of the current page for urljoin
+            absolute_img_url = urljoin(actual_gallery_url, img_src)
+
+            try:  # Generate filename
+                filename_part = unquote(absolute_img_url.split("/")[-1].split("?")[0])
+                file_ext_lower = os.path.splitext(filename_part)[1].lower()
+                if file_ext_lower not in IMAGE_EXTENSIONS:
+                    # Provisional .jpg; download_image() sniffs the real type
+                    filename = f"{sanitize_filename(filename_part)}.jpg"
+                else:
+                    filename = sanitize_filename(filename_part)
+                if not filename or filename.startswith("."):
+                    # Fallback if sanitization results in empty or dot file
+                    raise ValueError("Generated invalid filename")
+            except Exception as e:
+                # Fallback filename if URL parsing/sanitization fails
+                file_ext = os.path.splitext(absolute_img_url)[1].lower()
+                if file_ext not in IMAGE_EXTENSIONS:
+                    file_ext = ".jpg"
+                # Count planned jobs rather than finished downloads, so
+                # concurrent downloads can never be handed the same number
+                img_counter = (
+                    job.local_file_count
+                    + job.images_planned
+                    + len(page_download_jobs)
+                    + 1
+                )
+                filename = f"image_{img_counter:04d}{file_ext}"
+                log.warning(
+                    f"          Warning: Could not derive filename from URL ({e}). Using: {filename} for {absolute_img_url}"
+                )
+
+            save_path = os.path.join(job.folder_path, filename)
+
+            # Two URLs resolving to the same filename: the first one
+            # wins, just like the exists-check did when running serially
+            if save_path in job.claimed_save_paths:
+                continue
+            job.claimed_save_paths.add(save_path)
+
+            # Optimization: Skip download if file already exists
+            existing_path = saved_image_path(save_path, absolute_img_url)
+            if existing_path is not None:
+                job.add_saved_image(absolute_img_url, existing_path)
+                continue
+
+            page_download_jobs.append((absolute_img_url, save_path))
+        return page_download_jobs
+
+    def queue_downloads(self, job, page_download_jobs):
+        if not page_download_jobs:
+            return
+        if self.plan is not None:
+            self.plan_downloads(job, page_download_jobs)
+            return
+        # Ensure directory exists BEFORE download attempt
+        if not folder_exists(job.folder_path):
+            try:
+                log.debug(f"        Creating folder: '{job.folder_path}'")
+                os.makedirs(job.folder_path, exist_ok=True)
+                index = directory_index_for(job.folder_path)
+                if index is not None:
+                    index.add_folder(job.folder_path)
+            except OSError as oe:
+                log.error(
+                    f"        ERROR creating directory {job.folder_path}: {oe}. Skipping {len(page_download_jobs)} images on this page."
+                )
+                return
+        if self.work_queue is not None:
+            self.publish_downloads(job, page_download_jobs)
+            return
+        # Count the images as pending before queueing them, so the gallery
+        # cannot be reported as finished while its downloads are in flight
+        job.add_pending_images(len(page_download_jobs))
+        for img_url, save_path in page_download_jobs:
+            self.image_queue.put((job, img_url, save_path))
+
+    def record_finished_gallery(self, job):
+        """Writes a processed gallery's manifest and marks it complete in the crawl state.
+
+        It only counts as complete if nothing is missing. A gallery whose images went to the work queue is only sealed here;
+        wait_for_workers() records it once the workers are done with it.
+        """
+        if self.plan is not None:
+            self.plan_gallery(job)
+            return
+        if job.images_published:
+            self.work_queue.seal_group(
+                gallery_group_key(job.crawl.site, job.url),
+                pagination_complete=job.pagination_complete,
+            )
+            return
+        complete = not job.images_failed and job.pagination_complete
+        manifest = write_gallery_manifest(
+            job.folder_path,
+            job.url,
+            job.name,
+            job.expected_count,
+            job.saved_images,
+            complete,
+        )
+        state = job.crawl.state
+        if state is None:
+            return
+        if manifest is not None:
+            complete = manifest["complete"]
+        elif job.expected_count is not None and job.final_local_count < job.expected_count:
+            complete = False
+        if not complete:
+            return  # Leave it "discovered" so the next run tries again
+        state.record_gallery(
+            job.url,
+            STATUS_COMPLETE,
+            name=job.name,
+            folder=job.folder_path,
+            expected_count=job.expected_count,
+            image_count=job.final_local_count,
+        )
+
+    # --- Plan mode: recording downloads instead of running them ---
+    def plan_downloads(self, job, page_download_jobs):
+        if PLAN_IMAGE_SIZES:
+            # The image stage sends the HEAD requests concurrently
+            job.add_pending_images(len(page_download_jobs))
+            for img_url, save_path in page_download_jobs:
+                self.image_queue.put((job, img_url, save_path))
+            return
+        site = job.crawl.site
+        for img_url, save_path in page_download_jobs:
+            self.plan.add_image(
+                site.name, job.url, img_url, os.path.relpath(save_path, site.download_folder)
+            )
+        job.images_planned += len(page_download_jobs)  # Pages of a gallery are planned by one thread
+
+    def plan_size_stage(self, item):
+        job, img_url, save_path = item
+        site = job.crawl.site
+        size = None
+        try:
+            size = image_size(img_url, job.session, site.host_limits)
+        finally:
+            self.plan.add_image(
+                site.name,
+                job.url,
+                img_url,
+                os.path.relpath(save_path, site.download_folder),
+                size,
+            )
+            job.image_finished(True)
+
+    def plan_gallery(self, job):
+        if not job.images_planned:
+            return  # Nothing missing: the executing run has nothing to do
+        site = job.crawl.site
+        self.plan.add_gallery(
+            site.name,
+            job.url,
+            job.name,
+            os.path.relpath(job.folder_path, site.download_folder),
+            job.expected_count,
+            job.pagination_complete,
+            job.images_planned,
+            {
+                img_url: os.path.relpath(path, site.download_folder)
+                for img_url, path in job.saved_images.items()
+            },
+        )
+
+    def execute_plan(self, plan_path):
+        """Downloads the images of a plan file written by a --plan run.
+
+        Nothing is discovered again; images that appeared on disk since
+        the plan was made are skipped. Galleries are finished (manifest,
+        crawl state) as in a normal run, and with a work queue the images
+        are published for the workers instead.
+        """
+        try:
+            galleries, summary = read_plan(plan_path)
+        except (OSError, ValueError) as e:
+            log.error(f"ERROR reading plan '{plan_path}': {e}")
+            return
+        log.info(
+            f"\n{'='*10} Executing plan '{plan_path}': {summary['galleries']} galleries, {summary['images']} images {'='*10}"
+        )
+        site_crawls = {site_crawl.site.name: site_crawl for site_crawl in self.site_crawls}
+        self._build_stages()
+        download_stages = [self.image_stage]
+        if self.postprocess_stage is not None:
+            download_stages.append(self.postprocess_stage)
+        for stage in download_stages:
+            stage.start()
+        for gallery in galleries:
+            site_crawl = site_crawls.get(gallery["site"])
+            if site_crawl is None:
+                log.warning(
+                    f"  Site '{gallery['site']}' of gallery {gallery['url']} is not configured here. Skipping it."
+                )
+                continue
+            site = site_crawl.site
+            job = GalleryJob(
+                gallery["url"],
+                site_crawl,
+                self.transport.new_session(),
+                self.record_finished_gallery,
+            )
+            job.name = gallery["name"]
+            job.folder_path = os.path.join(site.download_folder, gallery["folder"])
+            job.expected_count = gallery["expected_count"]
+            job.pagination_complete = gallery["pagination_complete"]
+            for img_url, path in gallery["existing"].items():
+                job.saved_images[img_url] = os.path.join(site.download_folder, path)
+            download_jobs = []
+            for image in gallery["downloads"]:
+                save_path = os.path.join(site.download_folder, image["path"])
+                existing_path = saved_image_path(save_path, image["url"])
+                if existing_path is not None:
+                    job.add_saved_image(image["url"], existing_path)
+                else:
+                    download_jobs.append((image["url"], save_path))
+            log.info(
+                f"\n    ---> Gallery '{job.name}': {len(download_jobs)} of {len(gallery['downloads'])} planned images still missing."
+            )
+            self.queue_downloads(job, download_jobs)
+            job.pagination_finished()
+        self.image_stage.close()
+        for stage in download_stages:
+            stage.join()
+        if self.work_queue is not None:
+            self.wait_for_workers()
+        self.retry_deferred_downloads()
+
+    # --- Distributed mode: publishing and waiting for the workers ---
+    def publish_downloads(self, job, page_download_jobs):
+        """Publishes the missing images of a gallery page as work queue jobs."""
+        site = job.crawl.site
+        group = gallery_group_key(site, job.url)
+        if not job.images_published:
+            self.work_queue.open_group(
+                "gallery",
+                group,
+                {
+                    "site": site.name,
+                    "url": job.url,
+                    "name": job.name,
+                    "expected_count": job.expected_count,
+                },
+            )
+            with self._published_lock:
+                self.published_galleries[group] = job
+        # Paths are relative to the site's download folder, which may be
+        # mounted somewhere else on the worker's host
+        jobs = []
+        for img_url, save_path in page_download_jobs:
+            job.published_paths[img_url] = save_path
+            path = os.path.relpath(save_path, site.download_folder)
+            jobs.append(
+                (f"image:{site.name}:{path}", {"site": site.name, "url": img_url, "path": path})
+            )
+        self.work_queue.publish("image", jobs, group)
+        job.images_published += len(jobs)
+        METRICS.count("images_published", len(jobs))
+
+    def wait_for_workers(self):
+        """Waits until the workers have finished every gallery published by this run.
+
+        Finished galleries are recorded in the crawl state as they come in.
+        Leases of crashed workers are requeued here too, so their jobs move
+        on even if every other worker is busy.
+        """
+        self.work_queue.set_publishing(False)
+        if not self.published_galleries:
+            return
+        log.info(
+            f"\n{'='*10} Waiting for workers to download {len(self.published_galleries)} published galleries {'='*10}"
+        )
+        last_progress_log = time.monotonic()
+        while True:
+            requeued = self.work_queue.requeue_expired()
+            if requeued:
+                log.warning(f"  Requeued {requeued} image jobs whose worker lease expired.")
+            for group in self.work_queue.take_finished_groups("gallery"):
+                job = self.published_galleries.pop(group.key, None)
+                if job is not None:
+                    self.record_worker_gallery(job, group)
+            if not self.published_galleries:
+                break
+            if time.monotonic() - last_progress_log >= 60:
+                counts = self.work_queue.counts()
+                log.info(
+                    f"  {len(self.published_galleries)} galleries left; image jobs: "
+                    + ", ".join(
+                        f"{counts.get(('image', status), 0)} {status}"
+                        for status in (JOB_PENDING, JOB_LEASED, JOB_DONE, JOB_FAILED)
+                    )
+                )
+                last_progress_log = time.monotonic()
+            time.sleep(WORK_POLL_INTERVAL)
+
+    def record_worker_gallery(self, job, group):
+        """Logs and records a gallery whose image jobs the workers have finished."""
+        site_crawl = job.crawl
+        folder_path = os.path.join(site_crawl.site.download_folder, group.payload["name"])
+        index = directory_index_for(folder_path)
+        if index is not None:
+            index.refresh_folder(folder_path)  # The files were written by other processes
+        final_local_count = count_image_files(folder_path)
+        expected_count = group.payload["expected_count"]
+        log.info(
+            f"\n    ---> Workers finished gallery '{group.payload['name']}': {group.done} images downloaded, {group.failed} failed; folder now contains {final_local_count} images."
+        )
+        saved_images = dict(job.saved_images)
+        for img_url, save_path in job.published_paths.items():
+            saved_path = saved_image_path(save_path, img_url)
+            if saved_path is not None:
+                saved_images[img_url] = saved_path
+        complete = not group.failed and group.payload.get("pagination_complete", True)
+        manifest = write_gallery_manifest(
+            folder_path,
+            group.payload["url"],
+            group.payload["name"],
+            expected_count,
+            saved_images,
+            complete,
+        )
+        if manifest is not None:
+            complete = manifest["complete"]
+        elif expected_count is not None and final_local_count < expected_count:
+            complete = False
+        if site_crawl.state is None or not complete:
+            return  # Leave it "discovered" so the next run tries again
+        site_crawl.state.record_gallery(
+            group.payload["url"],
+            STATUS_COMPLETE,
+            name=group.payload["name"],
+            folder=folder_path,
+            expected_count=expected_count,
+            image_count=final_local_count,
+        )
+
+    # --- Stage 4: Image Download ---
+    def download_stage(self, item):
+        job, img_url, save_path = item
+        saved_path = None
+        try:
+            # Pass the gallery-specific session to download_image
+            saved_path = self.download_and_record(job, img_url, save_path)
+        finally:
+            if saved_path and POSTPROCESSOR is not None:
+                self.postprocess_queue.put((item, saved_path))
+            else:
+                self.image_finished(item, saved_path)
+
+    def image_finished(self, item, saved_path):
+        """Counts an image as done; saved_path is None if it failed."""
+        job, img_url, _ = item
+        success = saved_path is not None
+        METRICS.count("images_downloaded" if success else "images_failed")
+        if success:
+            job.add_saved_image(img_url, saved_path)
+        else:
+            with self._deferred_lock:
+                # Beyond the limit failures wait for the next run, which finds the gallery unfinished
+                if not MAX_DEFERRED_DOWNLOADS or len(self.deferred_downloads) < MAX_DEFERRED_DOWNLOADS:
+                    self.deferred_downloads.append(item)
+                else:
+                    self.deferred_dropped += 1
+        job.image_finished(success)
+
+    def download_and_record(self, job, img_url, save_path):
+        """Downloads one image; returns the path it was saved under, or None."""
+        saved_path = download_image_limited(
+            img_url, save_path, job.session, job.crawl.site.host_limits
+        )
+        if saved_path is None:
+            return None
+        index = directory_index_for(saved_path)
+        if index is not None:
+            index.add_file(saved_path)
+        state = job.crawl.state
+        if state is not None:
+            state.record_image(job.url, img_url, os.path.basename(saved_path))
+        return saved_path
+
+    # --- Stage 5 (optional): Post-processing in the process pool ---
+    def postprocess_stage_handler(self, entry):
+        item, saved_path = entry
+        self.image_finished(item, postprocess_image(saved_path))
+
+    # --- After the pipeline: deferred retries ---
+    def retry_deferred_downloads(self):
+        """Retries every failed image once more, after the rest of the crawl is done.
+
+        By then a host that was throttling or down has had time to recover.
+        Galleries whose failures all succeed now are recorded as complete.
+        """
+        if self.deferred_dropped:
+            log.warning(
+                f"\n  {self.deferred_dropped} failed images exceeded MAX_DEFERRED_DOWNLOADS; the next run downloads them."
+            )
+        if not self.deferred_downloads:
+            return
+        items, self.deferred_downloads = self.deferred_downloads, []
+        log.info(f"\n{'='*10} Retrying {len(items)} failed image downloads {'='*10}")
+        recovered_by_job = {}
+        recovered_lock = threading.Lock()
+
+        def retry(item):
+            job, img_url, save_path = item
+            saved_path = self.download_and_record(job, img_url, save_path)
+            if saved_path and POSTPROCESSOR is not None:
+                saved_path = postprocess_image(saved_path)
+            if saved_path:
+                job.add_saved_image(img_url, saved_path)
+                with recovered_lock:
+                    recovered_by_job[job] = recovered_by_job.get(job, 0) + 1
+            else:
+                log.warning(f"          Giving up on {img_url}.")
+
+        retry_stage = PipelineStage(
+            "retry", retry, MAX_CONCURRENT_DOWNLOADS, queue.Queue()
+        )
+        retry_stage.start()
+        for item in items:
+            retry_stage.input_queue.put(item)
+        retry_stage.close()
+        retry_stage.join()
+
+        for job, recovered in recovered_by_job.items():
+            job.images_downloaded += recovered
+            job.images_failed -= recovered
+            job.final_local_count = count_image_files(job.folder_path)
+            self.record_finished_gallery(job)
+        recovered_total = sum(recovered_by_job.values())
+        log.info(
+            f"  Recovered {recovered_total} of {len(items)} images; {len(items) - recovered_total} still failed."
+        )
+
+
+class QueueWorker:
+    """Downloads image jobs claimed from the shared work queue (--worker).
+
+    Any number of worker processes can run next to a coordinator, on this
+    host or on others with the same download folders mounted. Each claimed
+    job is leased for WORK_LEASE_SECONDS; if a worker dies, its jobs are
+    handed to another worker once the lease expires. A worker exits when the
+    crawl it took part in is over: the coordinator has finished publishing
+    and no job is left. Started on an idle queue, it waits for a coordinator.
+    """
+
+    def __init__(self, work_queue, sites, transport, worker_id):
+        self.work_queue = work_queue
+        self.sites = {site.name: site for site in sites}
+        self.transport = transport
+        self.worker_id = worker_id
+        self.images_downloaded = 0
+        self.images_failed = 0
+        self.joined = False  # Seen a publishing coordinator or a job of the current crawl
+        self._lock = threading.Lock()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._run_thread, name=f"worker-{number}")
+            for number in range(max(1, MAX_CONCURRENT_DOWNLOADS))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _run_thread(self):
+        if PROFILER is not None:
+            PROFILER.run(self._work)
+        else:
+            self._work()
+
+    def _work(self):
+        session = self.transport.new_session()
+        try:
+            while True:
+                job = self.work_queue.claim(self.worker_id, "image", WORK_LEASE_SECONDS)
+                if job is None:
+                    # The done flag of an earlier crawl must not end the worker
+                    if self.joined and self.work_queue.is_drained("image"):
+                        return
+                    if self.work_queue.is_publishing():
+                        self.joined = True
+                    time.sleep(WORK_POLL_INTERVAL)
+                    continue
+                self.joined = True
+                try:
+                    success = self.download(job, session)
+                except Exception as e:
+                    log.error(f"          ERROR in image job {job.key}: {e}")
+                    success = False
+                with self._lock:
+                    if success:
+                        self.images_downloaded += 1
+                    else:
+                        self.images_failed += 1
+                METRICS.count("images_downloaded" if success else "images_failed")
+                if success:
+                    self.work_queue.complete(job, self.worker_id)
+                else:
+                    self.work_queue.fail(job, self.worker_id, "download failed")
+        finally:
+            session.close()
+
+    def download(self, job, session):
+        site = self.sites.get(job.payload["site"])
+        if site is None:
+            log.error(f"          ERROR: Site '{job.payload['site']}' of job {job.key} is not configured here.")
+            return False
+        save_path = os.path.join(site.download_folder, job.payload["path"])
+        folder_path = os.path.dirname(save_path)
+        if not folder_exists(folder_path):
+            os.makedirs(folder_path, exist_ok=True)
+            index = directory_index_for(folder_path)
+            if index is not None:
+                index.add_folder(folder_path)
+        if saved_image_path(save_path, job.payload["url"]) is not None:
+            return True  # Another worker finished it before its lease expired
+        saved_path = download_image_limited(
+            job.payload["url"], save_path, session, site.host_limits
+        )
+        if saved_path is None:
+            return False
+        index = directory_index_for(saved_path)
+        if index is not None:
+            index.add_file(saved_path)
+        if POSTPROCESSOR is not None:
+            # Corrupt files are deleted; failing the job queues it again
+            return postprocess_image(saved_path) is not None
+        return True
+
+
+class ManifestVerifier:
+    """Checks every gallery manifest against the files on disk (--verify).
+
+    VERIFY_WORKERS folders are checked at a time; hashing is I/O bound and
+    hashlib releases the GIL while it works, so threads keep the disks busy.
+    Images that are missing or differ from their entry and image files the
+    manifest does not list are reported. With repair, missing and damaged
+    images are downloaded again from their URL, absent hashes are filled in
+    and the manifest is rewritten; untracked files are only reported.
+    """
+
+    def __init__(self, sites, transport, repair=False):
+        self.sites = sites
+        self.transport = transport
+        self.repair = repair
+        self.folders = 0
+        self.without_manifest = 0
+        self.drifted = 0
+        self.missing = 0
+        self.mismatched = 0
+        self.untracked = 0
+        self.repaired = 0
+        self.repair_failed = 0
+        self._lock = threading.Lock()
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def run(self):
+        stage = PipelineStage(
+            "verify", self.verify_folder, VERIFY_WORKERS, queue.Queue(STAGE_QUEUE_SIZE)
+        )
+        stage.start()
+        seen_folders = set()
+        for site in self.sites:
+            folder_key = os.path.normcase(os.path.abspath(site.download_folder))
+            if folder_key in seen_folders:
+                continue  # Sites sharing a download folder
+            seen_folders.add(folder_key)
+            with os.scandir(site.download_folder) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        stage.input_queue.put((site, entry.path))
+        stage.close()
+        stage.join()
+
+    def verify_folder(self, item):
+        site, folder_path = item
+        drift = check_folder(folder_path, IMAGE_EXTENSIONS)
+        self._count(folders=1)
+        if drift is None:
+            self._count(without_manifest=1)
+            log.debug(f"  No manifest in '{folder_path}'.")
+            return
+        if drift.missing or drift.mismatched or drift.untracked:
+            self._count(
+                drifted=1,
+                missing=len(drift.missing),
+                mismatched=len(drift.mismatched),
+                untracked=len(drift.untracked),
+            )
+            log.warning(
+                f"  DRIFT in '{folder_path}': {len(drift.missing)} missing, {len(drift.mismatched)} changed, {len(drift.untracked)} untracked images."
+            )
+            for img_url in drift.missing:
+                log.info(f"      missing: {drift.manifest['images'][img_url]['file']} ({img_url})")
+            for img_url in drift.mismatched:
+                log.info(f"      changed: {drift.manifest['images'][img_url]['file']} ({img_url})")
+            for filename in drift.untracked:
+                log.info(f"      untracked: {filename}")
+        if self.repair and (drift.missing or drift.mismatched or drift.unhashed):
+            self.repair_folder(site, drift)
+
+    def repair_folder(self, site, drift):
+        manifest = drift.manifest
+        images = manifest["images"]
+        index = directory_index_for(drift.folder)
+        session = self.transport.new_session()
+        try:
+            for img_url in drift.missing + drift.mismatched:
+                listed_path = os.path.join(drift.folder, images[img_url]["file"])
+                if os.path.exists(listed_path):
+                    os.remove(listed_path)  # Damaged; a kept .part would be resumed wrongly
+                    if index is not None:
+                        index.remove_file(listed_path)
+                # A converted image is downloaded as served and converted again
+                extension = image_url_extension(img_url)
+                save_path = listed_path
+                if extension is not None and not listed_path.lower().endswith(extension):
+                    save_path = f"{os.path.splitext(listed_path)[0]}{extension}"
+                saved_path = download_image_limited(
+                    img_url, save_path, session, site.host_limits
+                )
+                if saved_path is not None and index is not None:
+                    index.add_file(saved_path)
+                if saved_path is not None and POSTPROCESSOR is not None:
+                    saved_path = postprocess_image(saved_path)
+                if saved_path is None:
+                    manifest["complete"] = False  # The next crawl tries again
+                    self._count(repair_failed=1)
+                    continue
+                images[img_url] = image_entry(saved_path, hash_file(saved_path))
+                self._count(repaired=1)
+            for img_url in drift.unhashed:
+                entry = images[img_url]
+                entry["sha256"] = hash_file(os.path.join(drift.folder, entry["file"]))
+            write_manifest(drift.folder, manifest)
+        finally:
+            session.close()
+
+    def summary(self):
+        summary = (
+            f"Verified {self.folders} gallery folders: {self.folders - self.without_manifest - self.drifted} match their manifest, "
+            f"{self.drifted} drifted ({self.missing} images missing, {self.mismatched} changed, {self.untracked} untracked), "
+            f"{self.without_manifest} without a manifest."
+        )
+        if self.repair:
+            summary += f" Repaired {self.repaired} images, {self.repair_failed} could not be downloaded."
+        return summary
+
+
+# --- Main Script Logic ---
+def configure(values):
+    """Replaces the configuration defaults with values from settings.resolve()."""
+    globals().update(values)
+
+
+def run(args, config, site_names=None):
+    """Runs what the command line asked for: a crawl, --plan, --verify or a --worker.
+
+    args are the parsed cli options, config the loaded config.yaml, which
+    configure() must have been called with. site_names limits the run to
+    those sites (--quick-check found nothing new on the others).
+    """
+    global METRICS, PROFILER, HTTP_CACHE, CONTENT_STORE, POSTPROCESSOR, SCHEDULER, BANDWIDTH
+
+    METRICS = Metrics(enabled=COLLECT_METRICS, jsonl_path=METRICS_JSONL or None)
+    if COLLECT_METRICS:
+        if METRICS_PORT:
+            METRICS.serve(METRICS_PORT)
+            log.info(f"Metrics: http://127.0.0.1:{METRICS_PORT}/metrics")
+        METRICS.start_reporter(METRICS_INTERVAL, METRICS_PROMETHEUS_FILE or None)
+    if args.profile:
+        PROFILER = ThreadProfiler()
+
+    # Site profiles: the SITES list, or the top-level settings as the only site
+    try:
+        sites = load_sites(
+            config, {key: globals()[key] for key in SITE_KEYS if key != "NAME"}
+        )
+    except ValueError as e:
+        log.error(f"ERROR in site configuration: {e}")
+        sys.exit(1)
+    if site_names is not None:
+        sites = [site for site in sites if site.name in site_names]
+
+    index_by_folder = {}
+    index_cache_paths = []  # (DirectoryIndex, cache file) pairs saved at the end
+    for site in sites:
+        if not args.plan:  # A plan run only writes the plan file
+            os.makedirs(site.download_folder, exist_ok=True)
+        folder_key = os.path.normcase(os.path.abspath(site.download_folder))
+        if DIRECTORY_INDEX and folder_key not in index_by_folder:
+            index = DirectoryIndex(site.download_folder, IMAGE_EXTENSIONS)
+            # Every further download folder keeps its own cache file
+            cache_path = DIRECTORY_INDEX_CACHE
+            if DIRECTORY_INDEX_CACHE and index_by_folder:
+                cache_base, cache_ext = os.path.splitext(DIRECTORY_INDEX_CACHE)
+                cache_path = f"{cache_base}.{sanitize_filename(site.name)}{cache_ext}"
+            folders_listed, folders_reused = index.scan(cache_path or None)
+            log.info(
+                f"Directory index of '{site.download_folder}': {folders_listed} gallery folders listed, {folders_reused} reused from '{cache_path}'."
+                if cache_path
+                else f"Directory index of '{site.download_folder}': {folders_listed} gallery folders listed."
+            )
+            index_by_folder[folder_key] = index
+            DIR_INDEXES.append(index)
+            if cache_path and not args.plan:
+                index_cache_paths.append((index, cache_path))
+        site.dir_index = index_by_folder.get(folder_key)
+
+        # Compile the site's selectors once for the chosen parser backend
+        try:
+            site.parser = create_parser(HTML_PARSER_BACKEND, site.page_selectors())
+        except Exception as e:
+            log.warning(f"Cannot use HTML parser backend '{HTML_PARSER_BACKEND}' for site '{site.name}': {e}. Using 'bs4'.")
+            site.parser = create_parser("bs4", site.page_selectors())
+        log.info(
+            f"Site '{site.name}': {site.base_overview_url} -> '{site.download_folder}' (parser {site.parser.name}, {site.max_downloads_per_host} downloads per host, {site.rate_limit_per_host or 'unlimited'} requests/s)."
+        )
+    log.info(
+        f"Pipeline workers (shared by {len(sites)} site(s)): {OVERVIEW_WORKERS} overview per site, {GALLERY_WORKERS} gallery, {GALLERY_PAGE_WORKERS} gallery-page, {MAX_CONCURRENT_DOWNLOADS} image."
+    )
+
+    if HTTP_CACHE_DIR:
+        HTTP_CACHE = HttpCache(
+            HTTP_CACHE_DIR,
+            HTTP_CACHE_MAX_MB * 1_048_576,
+            max_entries=BOUNDED_HTTP_CACHE_ENTRIES if BOUNDED_MEMORY else None,
+            read_only=bool(args.plan),
+        )
+        log.info(
+            f"HTTP cache: '{HTTP_CACHE_DIR}' (TTL overview {HTTP_CACHE_TTL_OVERVIEW}s, gallery {HTTP_CACHE_TTL_GALLERY}s, max {HTTP_CACHE_MAX_MB} MB{', read-only' if args.plan else ''})."
+        )
+
+    if DEDUPLICATE and not args.plan:
+        CONTENT_STORE = ContentStore(CONTENT_STORE_PATH, DEDUP_LINK_MODE)
+        log.info(
+            f"Deduplication: on ('{CONTENT_STORE_PATH}', duplicates become {CONTENT_STORE.link_mode}s)."
+        )
+
+    if POSTPROCESS_IMAGES and (VERIFY_IMAGES or THUMBNAIL_SIZE or CONVERT_IMAGES_TO):
+        try:
+            POSTPROCESSOR = PostProcessor(
+                POSTPROCESS_PROCESSES,
+                verify=VERIFY_IMAGES,
+                thumbnail_size=THUMBNAIL_SIZE,
+                thumbnail_subfolder=THUMBNAIL_SUBFOLDER,
+                convert_format=CONVERT_IMAGES_TO,
+                quality=CONVERT_QUALITY,
+                keep_original=CONVERT_KEEP_ORIGINAL,
+            )
+        except (ImportError, ValueError) as e:
+            log.warning(f"Cannot post-process images: {e}. Post-processing is off.")
+        else:
+            log.info(
+                f"Post-processing: {POSTPROCESSOR.processes} processes (verify {'on' if VERIFY_IMAGES else 'off'}, thumbnails {THUMBNAIL_SIZE or 'off'}, convert to {CONVERT_IMAGES_TO or 'off'})."
+            )
+
+    SCHEDULER = RequestScheduler(
+        rate_per_host=RATE_LIMIT_PER_HOST,
+        burst=RATE_LIMIT_BURST,
+        max_concurrency=MAX_DOWNLOADS_PER_HOST,
+        adaptive=ADAPTIVE_CONCURRENCY,
+        max_retries=MAX_RETRIES,
+        backoff_base=RETRY_BACKOFF_BASE,
+        backoff_max=RETRY_BACKOFF_MAX,
+        breaker_threshold=CIRCUIT_BREAKER_THRESHOLD,
+        breaker_cooldown=CIRCUIT_BREAKER_COOLDOWN,
+    )
+    log.info(
+        f"Request scheduler: {RATE_LIMIT_PER_HOST or 'unlimited'} requests/s per host, {MAX_RETRIES} retries, adaptive concurrency {'on' if ADAPTIVE_CONCURRENCY else 'off'}."
+    )
+
+    try:
+        bandwidth_schedule = parse_schedule(BANDWIDTH_SCHEDULE)
+    except ValueError as e:
+        log.error(f"ERROR in bandwidth configuration: {e}")
+        sys.exit(1)
+    if BANDWIDTH_LIMIT_KBPS or bandwidth_schedule:
+        BANDWIDTH = BandwidthLimiter(int(BANDWIDTH_LIMIT_KBPS * 1024), bandwidth_schedule)
+        log.info(
+            f"Bandwidth limit: {format_rate(BANDWIDTH.default_rate)} for all downloads together, {len(bandwidth_schedule)} schedule windows (now {format_rate(BANDWIDTH.rate_at(datetime.datetime.now()))})."
+        )
+
+    transport = HttpTransport(
+        headers={"User-Agent": USER_AGENT},
+        pool_hosts=HTTP_POOL_HOSTS,
+        max_connections_per_host=HTTP_MAX_CONNECTIONS_PER_HOST,
+        keep_alive=HTTP_KEEP_ALIVE,
+        http2=HTTP2,
+    )
+    log.info(
+        f"HTTP transport: {HTTP_MAX_CONNECTIONS_PER_HOST} connections per host, keep-alive {'on' if HTTP_KEEP_ALIVE else 'off'}, HTTP/2 {'on' if HTTP2 else 'off'}."
+    )
+
+    work_queue = None
+    if args.coordinator or args.worker:
+        try:
+            work_queue = open_work_queue(WORK_QUEUE, max_attempts=WORK_MAX_ATTEMPTS)
+        except (ValueError, OSError, sqlite3.Error) as e:
+            log.error(f"ERROR opening work queue '{WORK_QUEUE}': {e}")
+            sys.exit(1)
+        log.info(
+            f"Work queue: '{WORK_QUEUE}' ({'coordinator' if args.coordinator else 'worker'}, lease {WORK_LEASE_SECONDS}s, {WORK_MAX_ATTEMPTS} attempts per image)."
+        )
+
+    crawler = worker = verifier = plan_writer = None
+    crawl_states = []
+    if args.plan:
+        # Completeness comes from the files on disk; the crawl state is left alone
+        try:
+            plan_writer = PlanWriter(args.plan)
+        except OSError as e:
+            log.error(f"ERROR creating plan '{args.plan}': {e}")
+            sys.exit(1)
+        crawler = Crawler(transport, plan=plan_writer)
+        for site in sites:
+            crawler.add_site(site)
+        run = crawler.run
+    elif args.verify:
+        verifier = ManifestVerifier(sites, transport, repair=args.repair)
+        run = verifier.run
+    elif args.worker:
+        worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        worker = QueueWorker(work_queue, sites, transport, worker_id)
+        run = worker.run
+    else:
+        crawler = Crawler(transport, mode=CRAWL_MODE, work_queue=work_queue)
+        if work_queue is not None:
+            work_queue.set_publishing(True)
+        for site in sites:
+            crawl_state = None
+            start_page = 1
+            if STATE_DB_PATH:
+                crawl_state = CrawlState(STATE_DB_PATH)
+                # Without a SITES list, runs stay unnamed as in databases of earlier versions
+                start_page = crawl_state.start_run(
+                    "plan" if args.execute_plan else CRAWL_MODE,
+                    site.name if config.get("SITES") else "",
+                )
+                crawl_states.append(crawl_state)
+                log.info(
+                    f"Crawl state of '{site.name}': '{STATE_DB_PATH}' (mode: {CRAWL_MODE}, starting at overview page {start_page})."
+                )
+            crawler.add_site(site, state=crawl_state, start_page=start_page)
+        if args.execute_plan:
+            run = functools.partial(crawler.execute_plan, args.execute_plan)
+        else:
+            run = crawler.run
+
+    if PROFILER is not None:
+        PROFILER.run(run)
+    else:
+        run()
+    transport.close()
+    if plan_writer is not None:
+        plan_writer.close()
+    if work_queue is not None:
+        work_queue.close()
+    for index, cache_path in index_cache_paths:
+        try:
+            index.save(cache_path)
+        except OSError as e:
+            log.warning(f"Warning: Could not save directory index '{cache_path}': {e}")
+
+    for crawl_state in crawl_states:
+        crawl_state.finish_run()
+        crawl_state.close()
+
+    if worker is not None:
+        log.info(
+            f"\n--- Worker '{worker.worker_id}' Finished. Downloaded {worker.images_downloaded} images, {worker.images_failed} download attempts failed. ---"
+        )
+    elif verifier is not None:
+        log.info(f"\n--- {verifier.summary()} ---")
+    elif plan_writer is not None:
+        log.info(
+            f"\n--- Planning Finished. Attempted {sum(c.overview_pages_attempted for c in crawler.site_crawls)} overview pages. {plan_writer.summary()} ---"
+        )
+    else:
+        log.info(
+            f"\n--- Script Finished. Attempted {sum(c.overview_pages_attempted for c in crawler.site_crawls)} overview pages. Checked/Processed/Skipped {sum(len(c.processed_or_skipped_urls) for c in crawler.site_crawls)} unique gallery URLs. ---"
+        )
+        if len(crawler.site_crawls) > 1:
+            for site_crawl in crawler.site_crawls:
+                log.info(
+                    f"  {site_crawl.site.name}: {site_crawl.overview_pages_attempted} overview pages, {len(site_crawl.processed_or_skipped_urls)} gallery URLs."
+                )
+    log.info(transport.stats.summary())
+    log.info(SCHEDULER.summary())
+    if BANDWIDTH is not None:
+        log.info(BANDWIDTH.summary())
+    if HTTP_CACHE is not None:
+        log.info(HTTP_CACHE.summary())
+    if CONTENT_STORE is not None:
+        log.info(CONTENT_STORE.summary())
+        CONTENT_STORE.close()
+    if POSTPROCESSOR is not None:
+        log.info(POSTPROCESSOR.summary())
+        POSTPROCESSOR.close()
+    if COLLECT_METRICS:
+        log.info(METRICS.summary())
+        METRICS.write_snapshot()
+        if METRICS_PROMETHEUS_FILE:
+            METRICS.write_prometheus(METRICS_PROMETHEUS_FILE)
+        METRICS.close()
+    if PROFILER is not None and PROFILER.write_report(args.profile):
+        log.info(f"Profile report written to '{args.profile}' ('{args.profile}.prof' for pstats).")
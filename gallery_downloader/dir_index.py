@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class DirectoryIndex:
+    """In-memory index of the image files below the download folder.
+
+    The download folder is scanned once with os.scandir at startup, and the
+    index is updated as files are written, so existence checks and image
+    counts never touch the (possibly network-mounted) filesystem again.
+    Only direct subfolders of the root (one per gallery) are indexed.
+    """
+
+    def __init__(self, root, extensions):
+        self.root = os.path.normpath(root)
+        self.extensions = {ext.lower() for ext in extensions}
+        self._folders = {}  # folder name -> set of image filenames
+        self._folder_mtimes = {}  # folder name -> mtime when its listing was taken
+        self._dirty = set()  # Folders changed since the last scan/save
+        self._lock = threading.Lock()
+
+    def _is_image(self, filename):
+        return os.path.splitext(filename)[1].lower() in self.extensions
+
+    def _split(self, path):
+        """Returns (folder name, filename or None) if path lies in the index, else None."""
+        try:
+            relative = os.path.relpath(os.path.normpath(path), self.root)
+        except ValueError:  # Different drive on Windows
+            return None
+        if relative.startswith(os.pardir) or os.path.isabs(relative):
+            return None
+        parts = relative.split(os.sep)
+        if len(parts) == 1 and parts[0] != os.curdir:
+            return parts[0], None
+        if len(parts) == 2:
+            return parts[0], parts[1]
+        return None
+
+    def scan(self, cache_path=None):
+        """Builds the index; folders unchanged since cache_path was saved are not listed.
+
+        Returns (folders listed, folders reused from the cache).
+        """
+        cached = self._load_cache(cache_path) if cache_path else {}
+        listed = reused = 0
+        folders, mtimes = {}, {}
+        if os.path.isdir(self.root):
+            for entry in os.scandir(self.root):
+                if not entry.is_dir():
+                    continue
+                mtime = entry.stat().st_mtime
+                cached_folder = cached.get(entry.name)
+                if cached_folder and cached_folder["mtime"] == mtime:
+                    files = set(cached_folder["files"])
+                    reused += 1
+                else:
+                    files = self._list_images(entry.path)
+                    listed += 1
+                folders[entry.name] = files
+                mtimes[entry.name] = mtime
+        with self._lock:
+            self._folders, self._folder_mtimes = folders, mtimes
+            self._dirty = set()
+        return listed, reused
+
+    def _list_images(self, folder_path):
+        try:
+            return {
+                entry.name
+                for entry in os.scandir(folder_path)
+                if entry.is_file() and self._is_image(entry.name)
+            }
+        except OSError as e:
+            log.warning(f"      Warning: Could not index files in {folder_path}: {e}")
+            return set()
+
+    def _load_cache(self, cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as cache_file:
+                data = json.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log.warning(f"Warning: Ignoring directory index cache '{cache_path}': {e}")
+            return {}
+        if data.get("root") != self.root or set(data.get("extensions", [])) != (
+            self.extensions
+        ):
+            return {}  # Built for another folder or extension set
+        return data.get("folders", {})
+
+    def save(self, cache_path):
+        """Writes the index so the next run only lists folders that changed."""
+        with self._lock:
+            # Folders written to during the run have a new mtime; take it now
+            # so the next run does not list them again just because of us
+            for name in self._dirty:
+                try:
+                    self._folder_mtimes[name] = os.stat(
+                        os.path.join(self.root, name)
+                    ).st_mtime
+                except OSError:
+                    self._folder_mtimes.pop(name, None)
+            self._dirty = set()
+            data = {
+                "root": self.root,
+                "extensions": sorted(self.extensions),
+                "folders": {
+                    name: {"mtime": self._folder_mtimes[name], "files": sorted(files)}
+                    for name, files in self._folders.items()
+                    if name in self._folder_mtimes
+                },
+            }
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as cache_file:
+            json.dump(data, cache_file)
+        os.replace(tmp_path, cache_path)
+
+    def covers(self, path):
+        return self._split(path) is not None
+
+    def folder_exists(self, folder_path):
+        name, _ = self._split(folder_path)
+        with self._lock:
+            return name in self._folders
+
+    def file_exists(self, file_path):
+        name, filename = self._split(file_path)
+        with self._lock:
+            return filename in self._folders.get(name, ())
+
+    def count_images(self, folder_path):
+        name, _ = self._split(folder_path)
+        with self._lock:
+            return len(self._folders.get(name, ()))
+
+    def add_folder(self, folder_path):
+        name, _ = self._split(folder_path)
+        with self._lock:
+            self._folders.setdefault(name, set())
+            self._dirty.add(name)
+
+    def add_file(self, file_path):
+        name, filename = self._split(file_path)
+        if not self._is_image(filename):
+            return
+        with self._lock:
+            self._folders.setdefault(name, set()).add(filename)
+            self._dirty.add(name)
+
+    def refresh_folder(self, folder_path):
+        """Lists a folder again, e.g. after other processes wrote to it."""
+        name, _ = self._split(folder_path)
+        files = self._list_images(folder_path) if os.path.isdir(folder_path) else None
+        with self._lock:
+            if files is None:
+                self._folders.pop(name, None)
+                self._folder_mtimes.pop(name, None)
+                return
+            self._folders[name] = files
+            self._dirty.add(name)
+
+    def remove_file(self, file_path):
+        name, filename = self._split(file_path)
+        with self._lock:
+            self._folders.get(name, set()).discard(filename)
+            self._dirty.add(name)
@@ -0,0 +1,238 @@
+import re
+
+# Every backend imports its library when it is created, so only the chosen one is loaded
+PARSER_BACKENDS = ("bs4", "lxml", "selectolax")
+
+# First compound of a CSS selector when it is a plain tag/#id/.class combination
+_SIMPLE_COMPOUND = re.compile(r"^([a-zA-Z][\w-]*)?((?:[#.][\w-]+)*)$")
+# Sibling combinators; a "~" inside an attribute selector ([class~=x]) merely costs a full parse
+_SIBLING_COMBINATOR = re.compile(r"[+~]")
+
+
+class Page:
+    """Parsed HTML page exposing only the lookups the crawler needs.
+
+    Selectors are passed as the original CSS strings; each backend maps them
+    to the form it compiled at startup.
+    """
+
+    def attrs(self, selector, name):
+        """Returns the attribute of every matching element (None where missing)."""
+        raise NotImplementedError
+
+    def first_attr(self, selector, name):
+        """Returns the attribute of the first match, "" if it lacks it, None if nothing matches."""
+        raise NotImplementedError
+
+    def first_text(self, selector):
+        """Returns the text of the first matching element, or None."""
+        raise NotImplementedError
+
+    def links(self, selector):
+        """Returns (href, text) of every matching element (href None where missing)."""
+        raise NotImplementedError
+
+
+class _SoupPage(Page):
+    def __init__(self, soup):
+        self.soup = soup
+
+    def attrs(self, selector, name):
+        return [element.get(name) for element in self.soup.select(selector)]
+
+    def first_attr(self, selector, name):
+        element = self.soup.select_one(selector)
+        return None if element is None else element.get(name) or ""
+
+    def first_text(self, selector):
+        element = self.soup.select_one(selector)
+        return None if element is None else element.get_text()
+
+    def links(self, selector):
+        return [(element.get("href"), element.get_text()) for element in self.soup.select(selector)]
+
+
+class _LxmlPage(Page):
+    def __init__(self, root, xpaths):
+        self.root = root
+        self.xpaths = xpaths
+
+    def attrs(self, selector, name):
+        return [element.get(name) for element in self.xpaths[selector](self.root)]
+
+    def first_attr(self, selector, name):
+        elements = self.xpaths[selector](self.root)
+        return None if not elements else elements[0].get(name) or ""
+
+    def first_text(self, selector):
+        elements = self.xpaths[selector](self.root)
+        return None if not elements else elements[0].text_content()
+
+    def links(self, selector):
+        return [
+            (element.get("href"), element.text_content())
+            for element in self.xpaths[selector](self.root)
+        ]
+
+
+class _SelectolaxPage(Page):
+    def __init__(self, tree):
+        self.tree = tree
+
+    def attrs(self, selector, name):
+        return [node.attributes.get(name) for node in self.tree.css(selector)]
+
+    def first_attr(self, selector, name):
+        node = self.tree.css_first(selector)
+        return None if node is None else node.attributes.get(name) or ""
+
+    def first_text(self, selector):
+        node = self.tree.css_first(selector)
+        return None if node is None else node.text()
+
+    def links(self, selector):
+        return [(node.attributes.get("href"), node.text()) for node in self.tree.css(selector)]
+
+
+def _subtree_matcher(selectors):
+    """Returns match(name, attrs) for the top elements of the selectors, or None.
+
+    Only the subtrees rooted at those elements need to be parsed for the
+    selectors to find the same matches. None means a selector starts with
+    something more complex than tag/#id/.class, or uses a sibling combinator
+    (+ or ~) that leaves the subtree, so the whole page is needed.
+    """
+    roots = []
+    for selector in selectors:
+        if _SIBLING_COMBINATOR.search(selector):
+            return None
+        for alternative in selector.split(","):
+            first_compound = alternative.strip().split()[0] if alternative.strip() else ""
+            match = _SIMPLE_COMPOUND.match(first_compound)
+            if not first_compound or not match:
+                return None
+            tag = match.group(1)
+            parts = re.findall(r"([#.])([\w-]+)", match.group(2))
+            ids = {value for kind, value in parts if kind == "#"}
+            classes = {value for kind, value in parts if kind == "."}
+            roots.append((tag.lower() if tag else None, ids, classes))
+
+    def match(name, attrs):
+        attrs = attrs or {}
+        element_classes = attrs.get("class") or ""
+        if isinstance(element_classes, str):
+            element_classes = element_classes.split()
+        for tag, ids, classes in roots:
+            if tag and tag != name:
+                continue
+            if ids and attrs.get("id") not in ids:
+                continue
+            if classes and not classes.issubset(element_classes):
+                continue
+            return True
+        return False
+
+    return match
+
+
+def _make_strainer(match):
+    try:  # bs4 >= 4.13 filters tags during parsing through ElementFilter
+        from bs4.filter import ElementFilter
+    except ImportError:  # Older bs4: SoupStrainer calls a name function with (name, attrs)
+        from bs4 import SoupStrainer
+
+        return SoupStrainer(match)
+
+    class SubtreeFilter(ElementFilter):
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            return match(name, attrs)
+
+        def allow_string_creation(self, string):
+            return False  # Only strings inside an allowed tag are kept
+
+    return SubtreeFilter()
+
+
+class BeautifulSoupParser:
+    """The original backend: BeautifulSoup on lxml, restricted to the needed subtrees."""
+
+    name = "bs4"
+
+    def __init__(self, selectors_by_kind):
+        from bs4 import BeautifulSoup
+
+        self._soup_class = BeautifulSoup
+        self._strainers = {}
+        for kind, selectors in selectors_by_kind.items():
+            match = _subtree_matcher(selectors)
+            self._strainers[kind] = _make_strainer(match) if match else None
+
+    def parse(self, content, kind):
+        return _SoupPage(
+            self._soup_class(content, "lxml", parse_only=self._strainers.get(kind))
+        )
+
+
+class LxmlParser:
+    """Raw lxml tree with every selector compiled to an XPath object once."""
+
+    name = "lxml"
+
+    def __init__(self, selectors_by_kind):
+        import lxml.html
+        from lxml import etree
+
+        try:
+            from cssselect import HTMLTranslator
+        except ImportError as e:
+            raise ImportError(
+                "The 'lxml' parser backend needs the 'cssselect' package."
+            ) from e
+
+        self._html = lxml.html
+        translator = HTMLTranslator()
+        self._xpaths = {
+            selector: etree.XPath(translator.css_to_xpath(selector))
+            for selectors in selectors_by_kind.values()
+            for selector in selectors
+        }
+
+    def parse(self, content, kind):
+        return _LxmlPage(self._html.document_fromstring(content), self._xpaths)
+
+
+class SelectolaxParser:
+    """selectolax (lexbor engine); selectors are validated once at startup."""
+
+    name = "selectolax"
+
+    def __init__(self, selectors_by_kind):
+        try:
+            from selectolax.lexbor import LexborHTMLParser
+        except ImportError as e:
+            raise ImportError(
+                "The 'selectolax' parser backend needs the 'selectolax' package."
+            ) from e
+
+        self._parser_class = LexborHTMLParser
+        probe = LexborHTMLParser("<html></html>")
+        for selectors in selectors_by_kind.values():
+            for selector in selectors:
+                probe.css(selector)  # Raises on a selector lexbor cannot handle
+
+    def parse(self, content, kind):
+        return _SelectolaxPage(self._parser_class(content))
+
+
+def create_parser(backend, selectors_by_kind):
+    """Builds the parser backend for {page kind: [CSS selectors used on it]}."""
+    parser_classes = {
+        "bs4": BeautifulSoupParser,
+        "lxml": LxmlParser,
+        "selectolax": SelectolaxParser,
+    }
+    if backend not in parser_classes:
+        raise ValueError(
+            f"Unknown HTML parser backend '{backend}' (choose from {', '.join(PARSER_BACKENDS)})"
+        )
+    return parser_classes[backend](selectors_by_kind)
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+class HttpCache:
+    """Disk-backed cache for HTML responses with LRU eviction by total size.
+
+    Each entry is a body file plus a small JSON metadata file holding the
+    validators (ETag / Last-Modified) needed for conditional requests. The
+    in-memory index holds one item per entry; max_entries (None = no limit)
+    caps it, evicting like max_bytes does. A read_only cache serves the
+    entries it finds but never changes the cache directory (--plan).
+    """
+
+    def __init__(self, cache_dir, max_bytes, max_entries=None, read_only=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.read_only = read_only
+        self.hits = 0  # Fresh entries served without any request
+        self.misses = 0  # Full downloads (no entry, or the server sent a new body)
+        self.revalidations = 0  # 304 Not Modified answers to conditional requests
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> body size, least recently used first
+        self._total_bytes = 0
+        if not read_only:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+        self._evict()  # The limits may have shrunk since the last run
+
+    def _load_index(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        found = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".body"):
+                continue
+            key = entry.name[: -len(".body")]
+            if not os.path.exists(self._meta_path(key)):
+                continue
+            stat = entry.stat()
+            found.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _body_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.body")
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, url):
+        """Returns (metadata, body) for a cached URL, or (None, None)."""
+        key = self._key(url)
+        with self._lock:
+            if key not in self._entries:
+                return None, None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as meta_file:
+                metadata = json.load(meta_file)
+            with open(self._body_path(key), "rb") as body_file:
+                body = body_file.read()
+        except (OSError, ValueError):
+            self._remove(key)
+            return None, None
+        if not self.read_only:
+            try:
+                os.utime(self._body_path(key))  # Keeps the LRU order across runs
+            except OSError:
+                pass
+        return metadata, body
+
+    def count(self, outcome):
+        """Counts a lookup outcome: "hits", "misses" or "revalidations"."""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def is_fresh(self, metadata, ttl):
+        return ttl > 0 and time.time() - metadata.get("fetched_at", 0) < ttl
+
+    def conditional_headers(self, metadata):
+        """Returns the If-None-Match / If-Modified-Since headers for a cached entry."""
+        headers = {}
+        if metadata.get("etag"):
+            headers["If-None-Match"] = metadata["etag"]
+        if metadata.get("last_modified"):
+            headers["If-Modified-Since"] = metadata["last_modified"]
+        return headers
+
+    def store(self, url, response):
+        """Caches the body and validators of a 200 response."""
+        if self.read_only:
+            return
+        key = self._key(url)
+        metadata = {
+            "url": url,
+            "final_url": response.url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }
+        body = response.content
+        try:
+            self._write_atomic(self._body_path(key), body, "wb")
+            self._write_atomic(self._meta_path(key), json.dumps(metadata), "w")
+        except OSError as e:
+            log.warning(f"      Warning: Could not write HTTP cache entry for {url}: {e}")
+            return
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(body)
+            self._total_bytes += len(body)
+        self._evict()
+
+    def refresh(self, url, metadata):
+        """Restarts the TTL of an entry the server confirmed with a 304."""
+        if self.read_only:
+            return
+        metadata["fetched_at"] = time.time()
+        try:
+            self._write_atomic(
+                self._meta_path(self._key(url)), json.dumps(metadata), "w"
+            )
+        except OSError as e:
+            log.warning(f"      Warning: Could not refresh HTTP cache entry for {url}: {e}")
+
+    @staticmethod
+    def _write_atomic(path, data, mode):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, mode) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _remove(self, key):
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+        if self.read_only:
+            return
+        for path in (self._body_path(key), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Drops least recently used entries until the cache fits max_bytes and max_entries."""
+        if self.read_only:
+            return
+        while True:
+            with self._lock:
+                if not self._entries or (
+                    self._total_bytes <= self.max_bytes
+                    and (self.max_entries is None or len(self._entries) <= self.max_entries)
+                ):
+                    return
+                key = next(iter(self._entries))
+            self._remove(key)
+
+    def summary(self):
+        return (
+            f"HTTP cache: {self.hits} hits, {self.misses} misses, "
+            f"{self.revalidations} revalidations (304), "
+            f"{len(self._entries)} entries / {self._total_bytes / 1_048_576:.1f} MB on disk."
+        )
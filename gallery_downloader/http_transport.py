@@ -0,0 +1,221 @@
+import threading
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class TransportStats:
+    """Counts requests and newly opened connections to measure keep-alive reuse."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.connections_tracked = True  # False when the adapter cannot see connections
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def count_connection(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def summary(self):
+        if not self.connections_tracked:
+            return f"HTTP transport: {self.requests} requests (connection reuse is not measured over HTTP/2)."
+        reused = max(0, self.requests - self.connections_opened)
+        reuse_pct = 100.0 * reused / self.requests if self.requests else 0.0
+        return (
+            f"HTTP transport: {self.requests} requests over {self.connections_opened} "
+            f"new connections ({reused} reused, {reuse_pct:.1f}% of requests skipped a handshake)."
+        )
+
+
+class SharedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter shared by many sessions, counting requests and new connections.
+
+    close() is a no-op so closing a per-gallery session keeps the pool alive;
+    the owning HttpTransport calls close_pool() once at the end of the run.
+    """
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.stats
+
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            def _new_conn(self):
+                stats.count_connection()
+                return super()._new_conn()
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            def _new_conn(self):
+                stats.count_connection()
+                return super()._new_conn()
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        self.stats.count_request()
+        return super().send(request, **kwargs)
+
+    def close(self):
+        pass
+
+    def close_pool(self):
+        super().close()
+
+
+class _Http2RawStream:
+    """Minimal urllib3-like raw body so requests can stream an httpx response."""
+
+    def __init__(self, httpx_response):
+        self._response = httpx_response
+        self._iterator = None
+
+    def stream(self, chunk_size, decode_content=True):
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        finally:
+            self._response.close()
+
+    def read(self, amt=None):
+        if self._iterator is None:
+            self._iterator = self._response.iter_bytes(amt or 65536)
+        return next(self._iterator, b"")
+
+    def close(self):
+        self._response.close()
+
+    def release_conn(self):
+        self._response.close()
+
+
+class Http2Adapter(BaseAdapter):
+    """requests adapter sending over one shared httpx client with HTTP/2 enabled.
+
+    Requires the optional "httpx[http2]" package. Cookies set by HTTP/2
+    responses are exposed on response.cookies but not stored in the session.
+    """
+
+    def __init__(self, stats, max_connections, max_keepalive, keep_alive):
+        super().__init__()
+        import httpx  # Optional dependency, only needed when HTTP2 is enabled
+
+        self.stats = stats
+        self.stats.connections_tracked = False
+        self._httpx = httpx
+        self._client = httpx.Client(
+            http2=True,
+            follow_redirects=False,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive if keep_alive else 0,
+            ),
+        )
+
+    def send(
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        self.stats.count_request()
+        if isinstance(timeout, tuple):
+            timeout = self._httpx.Timeout(None, connect=timeout[0], read=timeout[1])
+        try:
+            httpx_request = self._client.build_request(
+                request.method,
+                request.url,
+                headers=dict(request.headers),
+                content=request.body,
+                timeout=timeout,
+            )
+            httpx_response = self._client.send(httpx_request, stream=True)
+        except self._httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(e, request=request)
+        # Failures a retry cannot fix keep their requests type (see is_retryable_error)
+        except self._httpx.UnsupportedProtocol as e:
+            raise requests.exceptions.InvalidSchema(e, request=request)
+        except self._httpx.InvalidURL as e:
+            raise requests.exceptions.InvalidURL(e, request=request)
+        except self._httpx.TooManyRedirects as e:
+            raise requests.exceptions.TooManyRedirects(e, request=request)
+        except self._httpx.DecodingError as e:
+            raise requests.exceptions.ContentDecodingError(e, request=request)
+        except self._httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+        response = requests.Response()
+        response.status_code = httpx_response.status_code
+        response.headers = CaseInsensitiveDict(httpx_response.headers.multi_items())
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.reason = httpx_response.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.raw = _Http2RawStream(httpx_response)
+        for name, value in httpx_response.cookies.items():
+            response.cookies.set(name, value)
+        if not stream:
+            response.content  # Reads and closes the httpx stream
+        return response
+
+    def close(self):
+        pass
+
+    def close_pool(self):
+        self._client.close()
+
+
+class HttpTransport:
+    """Long-lived connection pool shared by every request of a run.
+
+    Sessions handed out by new_session() all send through the same adapter, so
+    keep-alive connections survive from one gallery to the next; each session
+    only brings its own (empty) cookie jar, which keeps galleries isolated.
+    """
+
+    def __init__(
+        self,
+        headers=None,
+        pool_hosts=10,
+        max_connections_per_host=16,
+        keep_alive=True,
+        http2=False,
+    ):
+        self.headers = dict(headers or {})
+        self.stats = TransportStats()
+        if http2:
+            self.adapter = Http2Adapter(
+                self.stats,
+                max_connections=pool_hosts * max_connections_per_host,
+                max_keepalive=max_connections_per_host,
+                keep_alive=keep_alive,
+            )
+        else:
+            self.adapter = SharedHTTPAdapter(
+                self.stats,
+                pool_connections=max(1, pool_hosts),
+                pool_maxsize=max(1, max_connections_per_host),
+                pool_block=True,  # Wait for a free connection instead of exceeding the cap
+            )
+        if not keep_alive:
+            self.headers["Connection"] = "close"
+
+    def new_session(self):
+        """Returns a session with its own cookie jar on top of the shared pool."""
+        session = requests.Session()
+        session.mount("http://", self.adapter)
+        session.mount("https://", self.adapter)
+        session.headers.update(self.headers)
+        return session
+
+    def close(self):
+        self.adapter.close_pool()
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+
+MANIFEST_NAME = ".gallery.json"  # Not an image extension, so never counted as an image
+MANIFEST_VERSION = 1
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Differences between a manifest and its folder; lists of image URLs, untracked of filenames
+Drift = namedtuple("Drift", "folder manifest missing mismatched unhashed untracked")
+
+
+def manifest_path(folder_path):
+    return os.path.join(folder_path, MANIFEST_NAME)
+
+
+def read_manifest(folder_path):
+    """Returns the manifest of a gallery folder, or None if it has none (or a broken one)."""
+    try:
+        with open(manifest_path(folder_path), "r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("images"), dict):
+        return None
+    return manifest
+
+
+def write_manifest(folder_path, manifest):
+    """Writes the manifest atomically: readers see the old or the new file, never half."""
+    manifest["version"] = MANIFEST_VERSION
+    manifest["updated_at"] = time.time()
+    path = manifest_path(folder_path)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def new_manifest(url, name, expected_count, previous=None):
+    """Returns a manifest for a gallery, keeping the image entries of a previous one."""
+    now = time.time()
+    return {
+        "version": MANIFEST_VERSION,
+        "url": url,
+        "name": name,
+        "expected_count": expected_count,
+        "complete": False,
+        "created_at": (previous or {}).get("created_at", now),
+        "updated_at": now,
+        "images": dict((previous or {}).get("images", {})),
+    }
+
+
+def image_entry(file_path, sha256=None, downloaded_at=None):
+    """Manifest entry of an image file (sha256 None if it was not hashed)."""
+    return {
+        "file": os.path.basename(file_path),
+        "size": os.path.getsize(file_path),
+        "sha256": sha256,
+        "downloaded_at": downloaded_at or os.path.getmtime(file_path),
+    }
+
+
+def is_complete(manifest, expected_count):
+    """True if the manifest vouches for a finished gallery with expected_count images."""
+    if manifest is None or not manifest.get("complete"):
+        return False
+    if expected_count is not None and manifest.get("expected_count") not in (None, expected_count):
+        return False  # The gallery has grown (or its title changed) since
+    return len(manifest["images"]) >= (expected_count or 0)
+
+
+def hash_file(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def check_folder(folder_path, image_extensions, check_hashes=True):
+    """Compares a gallery folder with its manifest. Returns a Drift, or None without one.
+
+    Missing: files listed but gone. Mismatched: size (or hash) differs.
+    Unhashed: listed without a hash. Untracked: images on disk the manifest
+    does not list.
+    """
+    manifest = read_manifest(folder_path)
+    if manifest is None:
+        return None
+    missing, mismatched, unhashed = [], [], []
+    listed_files = set()
+    for image_url, entry in manifest["images"].items():
+        path = os.path.join(folder_path, entry["file"])
+        listed_files.add(entry["file"])
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            missing.append(image_url)
+            continue
+        if size != entry.get("size"):
+            mismatched.append(image_url)
+        elif not entry.get("sha256"):
+            unhashed.append(image_url)
+        elif check_hashes and hash_file(path) != entry["sha256"]:
+            mismatched.append(image_url)
+    untracked = sorted(
+        entry.name
+        for entry in os.scandir(folder_path)
+        if entry.is_file()
+        and os.path.splitext(entry.name)[1].lower() in image_extensions
+        and entry.name not in listed_files
+    )
+    return Drift(folder_path, manifest, missing, mismatched, unhashed, untracked)
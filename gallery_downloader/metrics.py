@@ -0,0 +1,260 @@
+import cProfile
+import http.server
+import io
+import json
+import logging
+import math
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, math.inf)
+
+# From Python 3.12 cProfile hooks into sys.monitoring: one enabled profile sees
+# every thread of the interpreter, and a second one cannot be enabled meanwhile
+INTERPRETER_WIDE_PROFILING = sys.version_info >= (3, 12)
+
+log = logging.getLogger(__name__)
+
+
+class _Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+
+class Metrics:
+    """Thread-safe counters and latency histograms of a crawl.
+
+    Timers are histograms of seconds (fetch, parse, select, fs_check,
+    download, write, ...). A snapshot can be appended to a JSON lines file,
+    written as a Prometheus text file or served on a local /metrics endpoint.
+    A disabled instance makes every call a no-op.
+    """
+
+    def __init__(self, enabled=True, prefix="gallery_downloader", jsonl_path=None):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.jsonl_path = jsonl_path  # Snapshots and events are appended here
+        self.started_at = time.time()
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._server = None
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = _Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "time": time.time(),
+                "uptime": time.time() - self.started_at,
+                "counters": dict(self._counters),
+                "timers": {
+                    name: {
+                        "count": histogram.count,
+                        "sum": round(histogram.total, 6),
+                        "max": round(histogram.max, 6),
+                        "buckets": {
+                            ("+Inf" if math.isinf(bound) else str(bound)): count
+                            for bound, count in zip(LATENCY_BUCKETS, histogram.buckets)
+                        },
+                    }
+                    for name, histogram in self._histograms.items()
+                },
+            }
+
+    def summary(self):
+        """One line with the total time per timer, largest first."""
+        with self._lock:
+            timers = sorted(
+                self._histograms.items(), key=lambda item: item[1].total, reverse=True
+            )
+        parts = [
+            f"{name} {histogram.total:.2f}s/{histogram.count} (max {histogram.max:.3f}s)"
+            for name, histogram in timers
+        ]
+        return f"Time per stage (summed over threads): {', '.join(parts) or 'nothing measured'}."
+
+    def _append_jsonl(self, record):
+        if not self.enabled or not self.jsonl_path:
+            return
+        line = json.dumps(record)
+        with self._file_lock:
+            with open(self.jsonl_path, "a", encoding="utf-8") as jsonl_file:
+                jsonl_file.write(line + "\n")
+
+    def event(self, kind, **fields):
+        """Appends one record (e.g. a finished gallery) to the JSON lines file."""
+        self._append_jsonl({"event": kind, "time": time.time(), **fields})
+
+    def write_snapshot(self):
+        self._append_jsonl({"event": "snapshot", **self.snapshot()})
+
+    def prometheus_text(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"{self.prefix}_{name}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, timer in sorted(snapshot["timers"].items()):
+            metric = f"{self.prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in timer["buckets"].items():
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f"{metric}_sum {timer['sum']}", f"{metric}_count {timer['count']}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes the Prometheus text format atomically (node_exporter textfile style)."""
+        if not self.enabled:
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as prom_file:
+            prom_file.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves the Prometheus text on http://host:port/metrics from a daemon thread."""
+        metrics = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name="metrics-http", daemon=True
+        ).start()
+
+    def start_reporter(self, interval, prometheus_path=None):
+        """Writes a snapshot every interval seconds while the crawl runs."""
+        if not self.enabled or interval <= 0:
+            return
+
+        def report():
+            while True:
+                time.sleep(interval)
+                self.write_snapshot()
+                if prometheus_path:
+                    self.write_prometheus(prometheus_path)
+
+        threading.Thread(target=report, name="metrics-reporter", daemon=True).start()
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class ThreadProfiler:
+    """cProfile for a multi-threaded run: one profile per thread, merged for the report.
+
+    Before Python 3.12 cProfile only sees the thread that enabled it, so every
+    pipeline worker runs its loop through run(). From 3.12 on, the outermost
+    run() (the main thread's) profiles all threads and the nested calls just
+    run their function; callers and callees of different threads may then be
+    mixed up in the call graph, but every function's own time is reported.
+    """
+
+    def __init__(self):
+        self._profiles = []
+        self._interpreter_profile_active = False
+        self._lock = threading.Lock()
+
+    def run(self, func, *args):
+        with self._lock:
+            covered = self._interpreter_profile_active
+        if covered:
+            return func(*args)  # Already profiled (Python 3.12+)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            log.warning(
+                f"WARNING: Thread '{threading.current_thread().name}' runs unprofiled: {e} "
+                "(a debugger, coverage tool or second profiler?). The --profile report misses it."
+            )
+            return func(*args)
+        with self._lock:
+            self._interpreter_profile_active = INTERPRETER_WIDE_PROFILING
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+                if INTERPRETER_WIDE_PROFILING:
+                    self._interpreter_profile_active = False
+
+    def write_report(self, path, limit=60):
+        """Writes the merged profile (path.prof for pstats/snakeviz, path as text)."""
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return False
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(f"{path}.prof")
+        text = io.StringIO()
+        stats.stream = text
+        stats.sort_stats("cumulative").print_stats(limit)
+        stats.sort_stats("tottime").print_stats(limit)
+        with open(path, "w", encoding="utf-8") as report_file:
+            report_file.write(text.getvalue())
+        return True
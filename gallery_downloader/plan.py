@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+
+PLAN_VERSION = 1
+
+# Record types of a plan file, one JSON object per line:
+#   {"type": "plan", "version", "created_at"}                      first line
+#   {"type": "image", "site", "gallery", "url", "path", "bytes"}   one per pending download
+#   {"type": "gallery", "site", "url", "name", "folder", "expected_count",
+#    "pagination_complete", "images", "existing"}                  after the gallery's images
+#   {"type": "summary", "galleries", "images", "known_bytes", "unknown_sizes",
+#    "estimated_bytes"}                                            last line
+# Paths are relative to the site's download folder, so a plan made on one
+# machine can be executed on another with the folders mounted elsewhere.
+
+
+class PlanWriter:
+    """Writes the pending downloads found by a --plan run to a JSONL file.
+
+    Records go to "<path>.tmp", which replaces path only when close() adds
+    the summary, so an interrupted planning run never leaves a plan that
+    looks complete. Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.galleries = 0
+        self.images = 0
+        self.known_bytes = 0
+        self.unknown_sizes = 0
+        self._lock = threading.Lock()
+        self._file = open(f"{path}.tmp", "w", encoding="utf-8")
+        self._write({"type": "plan", "version": PLAN_VERSION, "created_at": time.time()})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def add_image(self, site, gallery_url, url, path, size=None):
+        with self._lock:
+            self._write(
+                {
+                    "type": "image",
+                    "site": site,
+                    "gallery": gallery_url,
+                    "url": url,
+                    "path": path,
+                    "bytes": size,
+                }
+            )
+            self.images += 1
+            if size is None:
+                self.unknown_sizes += 1
+            else:
+                self.known_bytes += size
+
+    def add_gallery(self, site, url, name, folder, expected_count, pagination_complete, images, existing):
+        """Records a gallery once all its images are planned; existing maps URL -> path."""
+        with self._lock:
+            self._write(
+                {
+                    "type": "gallery",
+                    "site": site,
+                    "url": url,
+                    "name": name,
+                    "folder": folder,
+                    "expected_count": expected_count,
+                    "pagination_complete": pagination_complete,
+                    "images": images,
+                    "existing": existing,
+                }
+            )
+            self.galleries += 1
+
+    def estimated_bytes(self):
+        """Known sizes plus the average known size for each image without one."""
+        known = self.images - self.unknown_sizes
+        if not known:
+            return None
+        return self.known_bytes + self.unknown_sizes * self.known_bytes // known
+
+    def close(self):
+        with self._lock:
+            self._write(
+                {
+                    "type": "summary",
+                    "galleries": self.galleries,
+                    "images": self.images,
+                    "known_bytes": self.known_bytes,
+                    "unknown_sizes": self.unknown_sizes,
+                    "estimated_bytes": self.estimated_bytes(),
+                }
+            )
+            self._file.close()
+            os.replace(f"{self.path}.tmp", self.path)
+
+    def summary(self):
+        estimated = self.estimated_bytes()
+        return (
+            f"Plan '{self.path}': {self.galleries} galleries with {self.images} pending images, "
+            + (
+                f"about {estimated / 1_048_576:.1f} MB ({self.unknown_sizes} sizes unknown)."
+                if estimated is not None
+                else "sizes unknown."
+            )
+        )
+
+
+def read_plan(path):
+    """Returns (gallery records, summary record) of a plan file.
+
+    Each gallery record carries its image records under "downloads".
+    Raises ValueError for a file that is not a complete plan.
+    """
+    images_by_gallery = {}
+    galleries = []
+    header = summary = None
+    with open(path, "r", encoding="utf-8") as plan_file:
+        for line_number, line in enumerate(plan_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError(f"line {line_number} is not JSON") from None
+            kind = record.get("type")
+            if header is None:
+                if kind != "plan" or record.get("version") != PLAN_VERSION:
+                    raise ValueError(f"not a version {PLAN_VERSION} plan file")
+                header = record
+            elif kind == "image":
+                key = (record["site"], record["gallery"])
+                images_by_gallery.setdefault(key, []).append(record)
+            elif kind == "gallery":
+                record["downloads"] = images_by_gallery.pop((record["site"], record["url"]), [])
+                galleries.append(record)
+            elif kind == "summary":
+                summary = record
+    if summary is None:
+        raise ValueError("the plan has no summary line (planning was interrupted?)")
+    if images_by_gallery:
+        raise ValueError(f"{len(images_by_gallery)} galleries have images but no gallery record")
+    return galleries, summary
@@ -0,0 +1,155 @@
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+CONVERT_FORMATS = {"webp": ("WEBP", ".webp"), "avif": ("AVIF", ".avif")}
+THUMBNAIL_QUALITY = 85
+
+# Extensions of the image types recognised by their first bytes / Content-Type
+CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/bmp": ".bmp",
+    "image/tiff": ".tiff",
+    "image/avif": ".avif",
+}
+
+PostProcessOptions = namedtuple(
+    "PostProcessOptions",
+    "verify thumbnail_size thumbnail_subfolder convert_format quality keep_original",
+)
+# ok: False if the image does not decode; path: the file now holding the image
+PostProcessResult = namedtuple("PostProcessResult", "ok path error thumbnail_path")
+
+
+def sniff_image_extension(head):
+    """Returns the extension of the image type the first bytes of a file belong to, or None."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return ".tiff"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return ".avif"
+    if head.startswith(b"BM"):
+        return ".bmp"
+    return None
+
+
+def process_image(path, options):
+    """Verifies, thumbnails and converts one image file. Runs in a pool process.
+
+    Only the path crosses the process boundary; the worker reads the file
+    itself, so no image bytes are pickled.
+    """
+    from PIL import Image  # Optional dependency, only needed for post-processing
+
+    thumbnail_path = None
+    try:
+        if options.verify:
+            with Image.open(path) as image:
+                image.verify()  # Structure and checksums
+        with Image.open(path) as image:
+            image.load()  # A full decode also catches truncated pixel data
+            if options.thumbnail_size:
+                thumbnail_path = _write_thumbnail(image, path, options)
+            if options.convert_format:
+                path = _convert(image, path, options)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        return PostProcessResult(False, path, f"{type(e).__name__}: {e}", None)
+    return PostProcessResult(True, path, None, thumbnail_path)
+
+
+def _write_thumbnail(image, path, options):
+    folder, filename = os.path.split(path)
+    thumbnail_folder = os.path.join(folder, options.thumbnail_subfolder)
+    os.makedirs(thumbnail_folder, exist_ok=True)
+    thumbnail_path = os.path.join(thumbnail_folder, f"{os.path.splitext(filename)[0]}.jpg")
+    thumbnail = image.copy()
+    thumbnail.thumbnail((options.thumbnail_size, options.thumbnail_size))
+    if thumbnail.mode not in ("RGB", "L"):
+        thumbnail = thumbnail.convert("RGB")
+    tmp_path = f"{thumbnail_path}.tmp"
+    thumbnail.save(tmp_path, "JPEG", quality=THUMBNAIL_QUALITY)
+    os.replace(tmp_path, thumbnail_path)
+    return thumbnail_path
+
+
+def _convert(image, path, options):
+    """Re-encodes path in the configured format; returns the path of the new file."""
+    pil_format, extension = CONVERT_FORMATS[options.convert_format]
+    if os.path.splitext(path)[1].lower() == extension:
+        return path
+    target_path = f"{os.path.splitext(path)[0]}{extension}"
+    tmp_path = f"{target_path}.tmp"
+    image.save(
+        tmp_path,
+        pil_format,
+        quality=options.quality,
+        save_all=getattr(image, "is_animated", False),
+    )
+    os.replace(tmp_path, target_path)
+    if not options.keep_original:
+        os.remove(path)
+    return target_path
+
+
+class PostProcessor:
+    """Runs process_image() for downloaded files in a pool of worker processes.
+
+    Decoding and re-encoding are CPU bound; in separate processes they do
+    not hold the GIL the download threads need. process() blocks the
+    calling thread only, so callers run it from their own thread pool.
+    """
+
+    def __init__(self, processes=0, **options):
+        self.processes = processes or os.cpu_count() or 1
+        self.options = PostProcessOptions(**options)
+        if self.options.convert_format and self.options.convert_format not in CONVERT_FORMATS:
+            raise ValueError(
+                f"Unknown image format '{self.options.convert_format}' (available: {', '.join(CONVERT_FORMATS)})"
+            )
+        import PIL  # noqa: F401  Fail at startup, not in every pool process
+
+        # "spawn": forking a process full of threads may copy held locks
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+        )
+        self.verified = 0
+        self.corrupt = 0
+        self.thumbnails = 0
+        self.converted = 0
+        self._lock = threading.Lock()
+
+    def process(self, path):
+        result = self._executor.submit(process_image, path, self.options).result()
+        with self._lock:
+            if not result.ok:
+                self.corrupt += 1
+                return result
+            self.verified += 1
+            if result.thumbnail_path:
+                self.thumbnails += 1
+            if result.path != path:
+                self.converted += 1
+        return result
+
+    def summary(self):
+        return (
+            f"Post-processing: {self.verified} images decoded fine, {self.corrupt} corrupt, "
+            f"{self.thumbnails} thumbnails, {self.converted} converted"
+            + (f" to {self.options.convert_format}." if self.options.convert_format else ".")
+        )
+
+    def close(self):
+        self._executor.shutdown()
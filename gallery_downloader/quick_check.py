@@ -0,0 +1,92 @@
+"""--quick-check: looks for new galleries on overview page 1 before a crawl starts.
+
+Meant for runs from cron every few minutes. The first overview page of each
+site is fetched with the standard library (no requests session, scheduler,
+HTTP cache or directory index scan) and its gallery links are looked up in
+the crawl state; the crawler is only imported when a site links a gallery
+that is not finished yet. A page identical to the last one found to hold
+nothing new is not even parsed, which saves loading the parser library.
+"""
+
+import hashlib
+import http.client
+import logging
+import os
+import urllib.request
+from urllib.parse import urljoin
+
+from .crawl_state import CrawlState
+from .html_parsers import create_parser
+from .sites import SITE_KEYS, load_sites
+
+log = logging.getLogger("gallery_downloader")
+
+# What a failed fetch_page() raises: network errors and HTTP error statuses
+# (OSError), broken responses (http.client.HTTPException) and unusable URLs (ValueError)
+FETCH_ERRORS = (OSError, http.client.HTTPException, ValueError)
+
+
+def fetch_page(url, user_agent, timeout):
+    """Returns (body, final URL after redirects); raises one of FETCH_ERRORS on failure."""
+    request = urllib.request.Request(url, headers={"User-Agent": user_agent})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read(), response.geturl()
+
+
+def sites_with_new_galleries(config, values):
+    """Returns the names of the sites whose overview page 1 links an unfinished gallery.
+
+    values are the resolved settings (settings.resolve()). A page without
+    gallery links counts as new, so the crawl reports the problem, and so does
+    a page that cannot be fetched (logged; the other sites are still checked).
+    Returns None when there is no crawl state to compare with. Raises
+    ValueError for a malformed SITES list.
+    """
+    db_path = values["STATE_DB_PATH"]
+    if not db_path or not os.path.exists(db_path):
+        log.warning("Quick check: no crawl state (STATE_DB_PATH) to compare with. Crawling every site.")
+        return None
+    sites = load_sites(config, {key: values[key] for key in SITE_KEYS if key != "NAME"})
+    state = CrawlState(db_path)
+    new_sites = []
+    try:
+        for site in sites:
+            try:
+                body, final_url = fetch_page(
+                    site.overview_page_url(1), values["USER_AGENT"], values["REQUEST_TIMEOUT"]
+                )
+            except FETCH_ERRORS as e:
+                log.warning(f"Quick check of '{site.name}': overview page 1 failed ({e}). Crawling it.")
+                new_sites.append(site.name)
+                continue
+            page_hash = hashlib.sha256(
+                f"{site.gallery_link_selector}\n{final_url}\n".encode("utf-8") + body
+            ).hexdigest()
+            if page_hash == state.quick_check_hash(site.name):
+                log.info(f"Quick check of '{site.name}': overview page 1 is unchanged.")
+                continue
+            gallery_urls = {
+                urljoin(final_url, href.strip())
+                for href, _ in _overview_parser(site, values).parse(body, "overview").links(
+                    site.gallery_link_selector
+                )
+                if href and href.strip()
+            }
+            new_urls = gallery_urls - state.finished_gallery_urls(gallery_urls)
+            log.info(
+                f"Quick check of '{site.name}': {len(new_urls)} of {len(gallery_urls)} galleries on overview page 1 are new or unfinished."
+            )
+            if new_urls or not gallery_urls:
+                new_sites.append(site.name)
+            else:
+                state.record_quick_check(site.name, page_hash)
+    finally:
+        state.close()
+    return new_sites
+
+
+def _overview_parser(site, values):
+    try:
+        return create_parser(values["HTML_PARSER_BACKEND"], site.page_selectors())
+    except Exception:
+        return create_parser("bs4", site.page_selectors())
@@ -0,0 +1,294 @@
+import email.utils
+import random
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+THROTTLE_STATUS_CODES = {429, 503}  # Status codes that also shrink the host's concurrency
+
+# Per-host limits of one site; a host gets the limits of the first request naming it
+HostLimits = namedtuple("HostLimits", "rate burst max_concurrency")
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised for a request to a host whose circuit breaker is open."""
+
+
+class HostState:
+    """Token bucket, adaptive concurrency limit and circuit breaker of one host."""
+
+    def __init__(self, rate, burst, max_concurrency):
+        self.rate = rate  # Tokens (requests) added per second, 0 = unlimited
+        self.tokens = float(burst)
+        self.burst = burst
+        self.last_refill = time.monotonic()
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = max_concurrency
+        self.in_flight = 0
+        self.successes_since_increase = 0
+        self.last_decrease = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # Circuit is open until this monotonic time
+        self.breaker_trips = 0
+        self.probe_in_flight = False  # Half-open: one request tests the host
+        self.condition = threading.Condition()
+
+
+class RequestScheduler:
+    """Sends every HTTP request of the crawl through per-host rate limiting and retries.
+
+    - A token bucket per host caps the request rate (RATE_LIMIT_PER_HOST).
+    - Retryable failures (connection errors, timeouts, 429, 5xx) are retried
+      with jittered exponential backoff, waiting at least as long as the
+      server's Retry-After header asks. Errors a retry cannot fix (bad URL,
+      TLS failure, redirect loop, undecodable body) are raised at once and
+      do not count against the host's circuit breaker.
+    - Each host has an AIMD concurrency limit, held through slot(): it is
+      halved when the host answers 429/503 or times out and grows by one
+      after a full window of successes, back up to max_concurrency.
+    - After breaker_threshold consecutive failures the host's circuit opens
+      for breaker_cooldown seconds; then a single probe request decides
+      whether it closes again.
+    """
+
+    def __init__(
+        self,
+        rate_per_host=0.0,
+        burst=10,
+        max_concurrency=4,
+        adaptive=True,
+        max_retries=4,
+        backoff_base=1.0,
+        backoff_max=60.0,
+        retry_after_max=300.0,
+        breaker_threshold=10,
+        breaker_cooldown=30.0,
+    ):
+        self.rate_per_host = rate_per_host
+        self.burst = max(1, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.adaptive = adaptive
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0  # 429/503 answers
+        self.failures = 0  # Requests that failed after all retries
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url, limits=None):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                if limits is None:
+                    limits = HostLimits(self.rate_per_host, self.burst, self.max_concurrency)
+                state = HostState(
+                    limits.rate, max(1, limits.burst), max(1, limits.max_concurrency)
+                )
+                self._hosts[host] = state
+        return state
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @contextmanager
+    def slot(self, url, limits=None):
+        """Holds one of the host's adaptive concurrency slots (used around downloads)."""
+        state = self._host(url, limits)
+        with state.condition:
+            while state.in_flight >= state.concurrency_limit:
+                state.condition.wait()
+            state.in_flight += 1
+        try:
+            yield
+        finally:
+            with state.condition:
+                state.in_flight -= 1
+                state.condition.notify_all()
+
+    # --- Admission: circuit breaker and token bucket ---
+    def _admit(self, state):
+        with state.condition:
+            while True:
+                now = time.monotonic()
+                if state.open_until > now:
+                    raise CircuitOpenError(
+                        f"circuit open for another {state.open_until - now:.0f}s"
+                    )
+                half_open = state.consecutive_failures >= self.breaker_threshold
+                if half_open and state.probe_in_flight:
+                    state.condition.wait(1.0)
+                    continue
+                wait = self._take_token(state, now)
+                if wait > 0:
+                    state.condition.wait(wait)
+                    continue
+                if half_open:
+                    state.probe_in_flight = True
+                return
+
+    def _take_token(self, state, now):
+        """Takes a token and returns 0, or returns the seconds until one is available."""
+        if state.rate <= 0:
+            return 0
+        state.tokens = min(state.burst, state.tokens + (now - state.last_refill) * state.rate)
+        state.last_refill = now
+        if state.tokens >= 1:
+            state.tokens -= 1
+            return 0
+        return (1 - state.tokens) / state.rate
+
+    def _release_probe(self, state):
+        """Lets another request probe a half-open host (after an outcome that proves nothing)."""
+        with state.condition:
+            state.probe_in_flight = False
+            state.condition.notify_all()
+
+    def _record(self, state, ok, throttled):
+        """Feeds one request outcome into the host's breaker and concurrency limit."""
+        with state.condition:
+            state.probe_in_flight = False
+            now = time.monotonic()
+            if ok:
+                state.consecutive_failures = 0
+                state.breaker_trips = 0
+                if self.adaptive and state.concurrency_limit < state.max_concurrency:
+                    state.successes_since_increase += 1
+                    if state.successes_since_increase >= state.concurrency_limit:
+                        state.concurrency_limit += 1
+                        state.successes_since_increase = 0
+            else:
+                state.consecutive_failures += 1
+                if state.consecutive_failures >= self.breaker_threshold:
+                    state.breaker_trips += 1
+                    # Each failed probe doubles how long the circuit stays open
+                    cooldown = self.breaker_cooldown * 2 ** (state.breaker_trips - 1)
+                    state.open_until = now + min(
+                        cooldown, max(self.breaker_cooldown, self.backoff_max)
+                    )
+                if (
+                    throttled
+                    and self.adaptive
+                    and now - state.last_decrease > 1.0  # One cut per burst of errors
+                ):
+                    state.concurrency_limit = max(1, state.concurrency_limit // 2)
+                    state.successes_since_increase = 0
+                    state.last_decrease = now
+            state.condition.notify_all()
+
+    # --- Retries ---
+    def _backoff(self, attempt, response=None):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        retry_after = parse_retry_after(response) if response is not None else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.retry_after_max))
+        return delay
+
+    def get(self, session, url, limits=None, **kwargs):
+        return self.request(session, "GET", url, limits, **kwargs)
+
+    def request(self, session, method, url, limits=None, **kwargs):
+        """session.request() with rate limiting, retries and circuit breaking.
+
+        limits (HostLimits) override the defaults for a host seen for the first time.
+        Returns the last response (callers still check its status) or raises
+        the last requests exception once the retries are used up. A request
+        exception that is not retryable (see is_retryable_error) is raised
+        right away.
+        """
+        state = self._host(url, limits)
+        attempt = 0
+        while True:
+            response = error = None
+            try:
+                self._admit(state)
+            except CircuitOpenError as e:
+                error = e
+            else:
+                self._count("requests")
+                try:
+                    response = session.request(method, url, **kwargs)
+                except requests.exceptions.RequestException as e:
+                    if not is_retryable_error(e):
+                        self._release_probe(state)
+                        raise
+                    error = e
+                except BaseException:
+                    self._release_probe(state)  # A bug or interruption says nothing about the host
+                    raise
+                retryable = error is not None or (
+                    response.status_code in RETRYABLE_STATUS_CODES
+                )
+                throttled = isinstance(error, requests.exceptions.Timeout) or (
+                    response is not None
+                    and response.status_code in THROTTLE_STATUS_CODES
+                )
+                if throttled and response is not None:
+                    self._count("throttled")
+                self._record(state, ok=not retryable, throttled=throttled)
+                if not retryable:
+                    return response
+
+            if attempt >= self.max_retries:
+                self._count("failures")
+                if error is not None:
+                    raise error
+                return response
+            delay = self._backoff(attempt, response)
+            if isinstance(error, CircuitOpenError):
+                delay = max(delay, state.open_until - time.monotonic())
+            if response is not None:
+                response.close()  # Hand the connection back before sleeping
+            self._count("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def summary(self):
+        limits = ", ".join(
+            f"{host}: {state.concurrency_limit}/{state.max_concurrency}"
+            for host, state in sorted(self._hosts.items())
+        )
+        return (
+            f"Request scheduler: {self.requests} attempts, {self.retries} retries, "
+            f"{self.throttled} throttled (429/503), {self.failures} failed after retries. "
+            f"Concurrency limits at the end: {limits or 'none'}."
+        )
+
+
+def is_retryable_error(error):
+    """True for request exceptions a retry may fix: timeouts and connection errors.
+
+    A TLS failure is a ConnectionError too, but fails the same way every time.
+    """
+    if isinstance(error, requests.exceptions.SSLError):
+        return False
+    return isinstance(
+        error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+    )
+
+
+def parse_retry_after(response):
+    """Returns the Retry-After delay of a response in seconds, or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
@@ -0,0 +1,86 @@
+import hashlib
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+
+
+class BloomFilter:
+    """Fixed-size bit array answering "maybe seen" or "definitely not seen"."""
+
+    def __init__(self, expected_items, false_positive_rate=0.001):
+        expected_items = max(1, expected_items)
+        bits = -expected_items * math.log(false_positive_rate) / math.log(2) ** 2
+        self.size = max(8, int(bits))
+        self.hashes = max(1, round(self.size / expected_items * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class SeenUrlSet:
+    """Set of URLs whose memory use does not grow with the number of URLs.
+
+    A Bloom filter of fixed size answers most lookups of new URLs without
+    touching the disk; its "maybe" answers are settled by an exact set in a
+    temporary SQLite file, which also receives every added URL. Supports
+    the `in`, add() and len() operations of a set. Safe to share between
+    threads; close() deletes the file.
+    """
+
+    def __init__(self, expected_items=1_000_000, directory=None):
+        self._bloom = BloomFilter(expected_items)
+        handle, self.path = tempfile.mkstemp(
+            prefix="seen_urls-", suffix=".sqlite3", dir=directory or None
+        )
+        os.close(handle)
+        self._count = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        # A scratch file: durability does not matter, a small page cache does
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("PRAGMA cache_size=-2048")
+        self._conn.execute("CREATE TABLE urls (url TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    def __contains__(self, url):
+        with self._lock:
+            if url not in self._bloom:
+                return False
+            row = self._conn.execute("SELECT 1 FROM urls WHERE url = ?", (url,)).fetchone()
+            return row is not None
+
+    def add(self, url):
+        with self._lock:
+            added = self._conn.execute(
+                "INSERT OR IGNORE INTO urls (url) VALUES (?)", (url,)
+            ).rowcount
+            self._bloom.add(url)
+            self._count += added
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,135 @@
+"""Configuration defaults and the config.yaml keys that override them.
+
+Kept free of third-party imports, so the command line and --quick-check can
+resolve the configuration without loading the crawler.
+"""
+
+import logging
+
+log = logging.getLogger("gallery_downloader")
+
+
+# --- Configuration (Using values from user log/previous context) ---
+GALLERY_OVERVIEW_BASE_URL_INPUT = "https://izispicy.com/babes/"
+GALLERY_LINK_SELECTOR = "h1.zag_block > a"
+GALLERY_TITLE_SELECTOR = "h1.zag_block"
+IMAGE_SELECTOR = "div.imgbox img"
+GALLERY_NEXT_PAGE_SELECTOR = (
+    "#post-list > div:nth-child(6) > div > b:nth-child(3) > a"  # From user log
+)
+
+DOWNLOAD_FOLDER = "Z:/Samples/Izispicy"
+REQUEST_TIMEOUT = 30
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tiff", ".avif"}
+VIDEO_SKIP_PHRASE = "(VIDEO)"  # <<< Phrase to check for skipping
+MAX_CONCURRENT_DOWNLOADS = 8  # Image downloads running at the same time (all hosts)
+MAX_DOWNLOADS_PER_HOST = 4  # Image downloads running at the same time per host
+OVERVIEW_WORKERS = 1  # Overview pages fetched at the same time
+OVERVIEW_DISCOVERY = "sequential"  # sequential | probe (find the last page first, see Crawler)
+OVERVIEW_PAGINATION_SELECTOR = ""  # Overview page links whose hrefs reveal the last page number
+GALLERY_WORKERS = 4  # Gallery first pages fetched/checked at the same time
+GALLERY_PAGE_WORKERS = 2  # Galleries paginated at the same time
+PLAN_FROM_OVERVIEW = True  # Skip galleries complete on disk by their overview link title alone
+STAGE_QUEUE_SIZE = 100  # Max items waiting between two pipeline stages
+BOUNDED_MEMORY = False  # Flat memory: seen gallery URLs on disk, no directory index, capped HTTP cache index
+SEEN_URLS_EXPECTED = 1_000_000  # Gallery URLs per site the Bloom filter is sized for (BOUNDED_MEMORY)
+MAX_DEFERRED_DOWNLOADS = 10_000  # Failed images kept for the retry at the end of the run (0 = all)
+STATE_DB_PATH = "crawl_state.sqlite3"  # Persistent crawl state ("" disables it)
+CRAWL_MODE = "full"  # full | incremental | resume (see --mode)
+HTTP_CACHE_DIR = ".http_cache"  # On-disk cache for overview/gallery HTML ("" disables it)
+HTTP_CACHE_MAX_MB = 200  # Least recently used pages are evicted above this size
+HTTP_CACHE_TTL_OVERVIEW = 0  # Seconds an overview page is served without revalidation (0 = always ask)
+HTTP_CACHE_TTL_GALLERY = 7 * 24 * 3600  # Same for gallery pages (they rarely change)
+HTTP_POOL_HOSTS = 10  # Hosts whose connection pools are kept open at the same time
+HTTP_MAX_CONNECTIONS_PER_HOST = 16  # Open connections per host (HTML and images)
+HTTP_KEEP_ALIVE = True  # Reuse connections between requests
+HTTP2 = False  # Use HTTP/2 (needs the optional "httpx[http2]" package)
+HTML_PARSER_BACKEND = "bs4"  # bs4 | lxml (needs cssselect) | selectolax
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024  # Bytes read from the socket / written to disk at once
+RESUME_PARTIAL_DOWNLOADS = True  # Continue leftover .part files with HTTP Range requests
+DEDUPLICATE = False  # Link images already stored elsewhere instead of writing them again
+CONTENT_STORE_PATH = "content_store.sqlite3"  # Hash -> file index used for deduplication
+DEDUP_LINK_MODE = "hardlink"  # hardlink | reflink (copy-on-write clone, Linux btrfs/XFS)
+POSTPROCESS_IMAGES = False  # Run VERIFY_IMAGES/thumbnails/conversion on every downloaded image
+POSTPROCESS_PROCESSES = 0  # Processes of the post-processing pool (0 = one per CPU)
+VERIFY_IMAGES = True  # Decode every image; corrupt ones are deleted and downloaded again
+THUMBNAIL_SIZE = 0  # Longest side in pixels of thumbnails written to THUMBNAIL_SUBFOLDER (0 = none)
+THUMBNAIL_SUBFOLDER = "thumbs"  # Subfolder of each gallery folder holding its thumbnails
+CONVERT_IMAGES_TO = ""  # "" | webp | avif: re-encode downloaded images in this format
+CONVERT_QUALITY = 85  # Quality (0-100) of the re-encoded images
+CONVERT_KEEP_ORIGINAL = False  # Keep the downloaded file next to the re-encoded one
+GALLERY_MANIFESTS = True  # Write .gallery.json into finished galleries and trust it over file counts
+MANIFEST_HASHES = True  # Store the SHA-256 of every image in the manifest (read once more to hash)
+VERIFY_WORKERS = 8  # Gallery folders checked at the same time by --verify
+DIRECTORY_INDEX = True  # Scan DOWNLOAD_FOLDER once and answer file checks from memory
+DIRECTORY_INDEX_CACHE = "directory_index.json"  # Persisted index ("" = rescan every run)
+BANDWIDTH_LIMIT_KBPS = 0  # Image download bytes/s of all streams together, in KB/s (0 = unlimited)
+BANDWIDTH_SCHEDULE = []  # Time-of-day windows with their own limit (see config.yaml)
+DOWNLOAD_PRIORITY = "newest"  # newest: galleries with the latest URL date first | discovery: in the order found
+RATE_LIMIT_PER_HOST = 0  # Requests per second sent to one host (0 = unlimited)
+RATE_LIMIT_BURST = 10  # Requests a host may receive at once after being idle
+ADAPTIVE_CONCURRENCY = True  # Shrink per-host downloads on 429/503/timeouts, regrow on success
+MAX_RETRIES = 4  # Retries of a request failing with a timeout, connection error, 429 or 5xx
+RETRY_BACKOFF_BASE = 1.0  # Seconds; the n-th retry waits up to base * 2**n (jittered)
+RETRY_BACKOFF_MAX = 60  # Upper bound of one backoff wait (Retry-After may ask for more)
+CIRCUIT_BREAKER_THRESHOLD = 10  # Consecutive failures that pause all requests to a host
+CIRCUIT_BREAKER_COOLDOWN = 30  # Seconds the host is paused before a probe request
+OVERVIEW_MAX_FAILURES = 3  # Consecutive overview pages failing after retries before giving up
+LOG_LEVEL = "INFO"  # DEBUG | INFO | WARNING | ERROR | OFF (see --log-level)
+COLLECT_METRICS = True  # Stage timers, counters and latency histograms (summary at the end)
+METRICS_JSONL = ""  # Append metric snapshots and per-gallery timings here ("" = off)
+METRICS_PROMETHEUS_FILE = ""  # Prometheus text file, e.g. for node_exporter ("" = off)
+METRICS_PORT = 0  # Serve Prometheus metrics on http://127.0.0.1:PORT/metrics (0 = off)
+METRICS_INTERVAL = 60  # Seconds between snapshots while the crawl runs (0 = only at the end)
+PLAN_IMAGE_SIZES = False  # --plan also sends a HEAD request per pending image to learn its size
+WORK_QUEUE = "work_queue.sqlite3"  # Job queue of --coordinator/--worker (path or sqlite:///path)
+WORK_LEASE_SECONDS = 300  # A worker must finish a claimed image within this time
+WORK_MAX_ATTEMPTS = 3  # Claims of an image job before it is given up
+WORK_POLL_INTERVAL = 2.0  # Seconds an idle worker/the waiting coordinator sleeps
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+# --- End Configuration ---
+
+
+CONFIG_KEYS = tuple(name for name in dict(globals()) if name.isupper())  # Every key above
+
+OVERVIEW_DISCOVERY_MODES = ("sequential", "probe")
+CRAWL_MODES = ("full", "incremental", "resume")
+DOWNLOAD_PRIORITIES = ("newest", "discovery")
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "OFF")
+
+__all__ = [*CONFIG_KEYS, "OVERVIEW_DISCOVERY_MODES", "CRAWL_MODES", "DOWNLOAD_PRIORITIES", "LOG_LEVELS"]
+
+
+def resolve(config, mode=None, log_level=None):
+    """Returns {key: value} for every CONFIG_KEYS entry: config's value, else the default.
+
+    mode and log_level come from the command line and win over CRAWL_MODE
+    and LOG_LEVEL. Unknown choices are logged and replaced by a default.
+    """
+    values = {key: config.get(key, globals()[key]) for key in CONFIG_KEYS}
+    # Ensure IMAGE_EXTENSIONS remains a set after loading from yaml (list in yaml -> set in code)
+    extensions = values["IMAGE_EXTENSIONS"]
+    values["IMAGE_EXTENSIONS"] = (
+        set(extensions) if isinstance(extensions, (list, tuple, set)) else set()
+    )  # Convert to set, handle unexpected types
+    if values["OVERVIEW_DISCOVERY"] not in OVERVIEW_DISCOVERY_MODES:
+        log.warning(f"Unknown OVERVIEW_DISCOVERY '{values['OVERVIEW_DISCOVERY']}'. Using 'sequential'.")
+        values["OVERVIEW_DISCOVERY"] = "sequential"
+    if values["BOUNDED_MEMORY"] and values["STAGE_QUEUE_SIZE"] <= 0:
+        log.warning("BOUNDED_MEMORY needs bounded stage queues. Using STAGE_QUEUE_SIZE 100.")
+        values["STAGE_QUEUE_SIZE"] = 100
+    if values["BOUNDED_MEMORY"] and values["DIRECTORY_INDEX"]:
+        log.info("BOUNDED_MEMORY: no directory index (one entry per file in memory). DIRECTORY_INDEX is off.")
+        values["DIRECTORY_INDEX"] = False
+    values["CONVERT_IMAGES_TO"] = str(values["CONVERT_IMAGES_TO"] or "").lower()
+    if values["DOWNLOAD_PRIORITY"] not in DOWNLOAD_PRIORITIES:
+        log.warning(f"Unknown DOWNLOAD_PRIORITY '{values['DOWNLOAD_PRIORITY']}'. Using 'newest'.")
+        values["DOWNLOAD_PRIORITY"] = "newest"
+    if values["LOG_LEVEL"] is False:  # Unquoted OFF in YAML is a boolean
+        values["LOG_LEVEL"] = "OFF"
+    values["LOG_LEVEL"] = log_level or str(values["LOG_LEVEL"]).upper()
+    values["CRAWL_MODE"] = mode or values["CRAWL_MODE"]
+    if values["CRAWL_MODE"] not in CRAWL_MODES:
+        log.warning(f"Unknown CRAWL_MODE '{values['CRAWL_MODE']}'. Using 'full'.")
+        values["CRAWL_MODE"] = "full"
+    return values
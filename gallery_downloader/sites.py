@@ -0,0 +1,112 @@
+import functools
+import re
+
+# Config keys a site profile may override; everything else is shared by all sites
+SITE_KEYS = (
+    "NAME",
+    "GALLERY_OVERVIEW_BASE_URL_INPUT",
+    "DOWNLOAD_FOLDER",
+    "VIDEO_SKIP_PHRASE",
+    "GALLERY_LINK_SELECTOR",
+    "GALLERY_TITLE_SELECTOR",
+    "IMAGE_SELECTOR",
+    "GALLERY_NEXT_PAGE_SELECTOR",
+    "OVERVIEW_PAGINATION_SELECTOR",
+    "RATE_LIMIT_PER_HOST",
+    "RATE_LIMIT_BURST",
+    "MAX_DOWNLOADS_PER_HOST",
+)
+
+
+def get_base_overview_url(url_input):
+    """Determines the base URL for overview pagination."""
+    url_input = url_input.split("#")[0].split("?")[0]
+    url_input = re.sub(r"page/\d+/?$", "", url_input)
+    if not url_input.endswith("/"):
+        url_input += "/"
+    return url_input
+
+
+class Site:
+    """One gallery site to crawl: where it lives, how to read it, where to save it.
+
+    Built from an entry of the SITES list in config.yaml; keys an entry leaves
+    out fall back to the top-level value of the same name. The parser and
+    directory index are attached at startup.
+    """
+
+    def __init__(self, settings):
+        self.name = settings["NAME"]
+        self.base_url_input = settings["GALLERY_OVERVIEW_BASE_URL_INPUT"]
+        self.base_overview_url = get_base_overview_url(self.base_url_input)
+        self.download_folder = settings["DOWNLOAD_FOLDER"]
+        self.skip_phrase = settings["VIDEO_SKIP_PHRASE"]
+        self.gallery_link_selector = settings["GALLERY_LINK_SELECTOR"]
+        self.gallery_title_selector = settings["GALLERY_TITLE_SELECTOR"]
+        self.image_selector = settings["IMAGE_SELECTOR"]
+        self.gallery_next_page_selector = settings["GALLERY_NEXT_PAGE_SELECTOR"]
+        self.overview_pagination_selector = settings["OVERVIEW_PAGINATION_SELECTOR"]
+        self.rate_limit_per_host = settings["RATE_LIMIT_PER_HOST"]
+        self.rate_limit_burst = settings["RATE_LIMIT_BURST"]
+        self.max_downloads_per_host = settings["MAX_DOWNLOADS_PER_HOST"]
+        self.parser = None  # HTML parser backend compiled for this site's selectors
+        self.dir_index = None  # DirectoryIndex of download_folder, if enabled
+
+    @functools.cached_property
+    def host_limits(self):
+        # Imported here so --quick-check does not load requests with the scheduler
+        from .request_scheduler import HostLimits
+
+        return HostLimits(
+            self.rate_limit_per_host, self.rate_limit_burst, self.max_downloads_per_host
+        )
+
+    def overview_page_url(self, page_num):
+        return f"{self.base_overview_url}page/{page_num}/"
+
+    def page_selectors(self):
+        """Returns {page kind: [CSS selectors used on it]} for the parser backend."""
+        overview = [self.gallery_link_selector]
+        if self.overview_pagination_selector:
+            overview.append(self.overview_pagination_selector)
+        return {
+            "overview": overview,
+            "gallery": [
+                self.gallery_title_selector,
+                self.image_selector,
+                self.gallery_next_page_selector,
+            ],
+        }
+
+    def __repr__(self):
+        return f"Site({self.name!r})"
+
+
+def load_sites(config, defaults):
+    """Returns the Site list described by config.
+
+    defaults maps every SITE_KEYS entry (except NAME) to its top-level value.
+    Without a SITES list, the top-level settings describe the only site.
+    Raises ValueError for malformed entries.
+    """
+    entries = config.get("SITES") or [{}]
+    if not isinstance(entries, list):
+        raise ValueError("SITES must be a list of site profiles")
+    sites, names = [], set()
+    for number, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"SITES entry {number} is not a mapping")
+        unknown = set(entry) - set(SITE_KEYS)
+        if unknown:
+            raise ValueError(
+                f"SITES entry {number} has unknown keys: {', '.join(sorted(unknown))}"
+            )
+        settings = {**defaults, **entry}
+        if not settings.get("NAME"):
+            host = re.sub(r"^\w+://", "", settings["GALLERY_OVERVIEW_BASE_URL_INPUT"])
+            settings["NAME"] = host.split("/")[0] or f"site{number}"
+        if settings["NAME"] in names:
+            raise ValueError(f"Duplicate site NAME '{settings['NAME']}' in SITES")
+        names.add(settings["NAME"])
+        sites.append(Site(settings))
+    return sites
@@ -0,0 +1,329 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+# Statuses of a job; groups (e.g. a gallery) additionally go open -> sealed -> done -> reported
+JOB_PENDING = "pending"  # Waiting to be claimed
+JOB_LEASED = "leased"  # Claimed by a worker until lease_expires
+JOB_DONE = "done"
+JOB_FAILED = "failed"  # Gave up after max_attempts
+GROUP_OPEN = "open"  # The coordinator may still add jobs to the group
+GROUP_SEALED = "sealed"  # Complete as soon as its last job is done or failed
+GROUP_REPORTED = "reported"  # Its completion was handed to the coordinator
+
+Job = namedtuple("Job", "id key kind payload attempts")
+FinishedGroup = namedtuple("FinishedGroup", "key payload done failed")
+
+
+class WorkQueue:
+    """Job queue shared by a coordinator and any number of worker processes.
+
+    The coordinator publishes jobs (optionally grouped, e.g. the images of one
+    gallery) and workers claim them with a lease. A job whose lease runs out
+    because its worker died is handed out again, up to max_attempts times.
+    A group is finished once it is sealed and none of its jobs is still
+    pending or leased.
+
+    Backends implement this interface; see BACKENDS and open_work_queue().
+    """
+
+    def open_group(self, kind, key, payload):
+        """Creates the group key (or reopens it for a new crawl)."""
+        raise NotImplementedError
+
+    def seal_group(self, key, **fields):
+        """Marks the group complete once its jobs are; fields update its payload."""
+        raise NotImplementedError
+
+    def publish(self, kind, jobs, group=None):
+        """Adds (key, payload) jobs; finished jobs with the same key are queued again."""
+        raise NotImplementedError
+
+    def claim(self, worker_id, kind, lease_seconds):
+        """Leases the oldest pending job of kind to worker_id. Returns a Job or None."""
+        raise NotImplementedError
+
+    def complete(self, job, worker_id):
+        """Marks a leased job done. False if the lease had expired and moved on."""
+        raise NotImplementedError
+
+    def fail(self, job, worker_id, error):
+        """Queues a leased job again, or marks it failed after max_attempts."""
+        raise NotImplementedError
+
+    def requeue_expired(self):
+        """Queues the jobs of workers whose lease ran out again. Returns their number."""
+        raise NotImplementedError
+
+    def take_finished_groups(self, kind):
+        """Returns the FinishedGroups of kind not returned before."""
+        raise NotImplementedError
+
+    def set_publishing(self, publishing):
+        """Tells the workers whether the coordinator may still publish jobs."""
+        raise NotImplementedError
+
+    def is_publishing(self):
+        """True while a coordinator is publishing jobs."""
+        raise NotImplementedError
+
+    def is_drained(self, kind):
+        """True once the coordinator is done and no job of kind is pending or leased."""
+        raise NotImplementedError
+
+    def counts(self):
+        """Returns {(kind, status): number of jobs}."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    grp TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (kind, status, id);
+CREATE INDEX IF NOT EXISTS jobs_group ON jobs (grp, status);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """WorkQueue in a SQLite database (WAL mode) shared by processes on one host.
+
+    Claims run in IMMEDIATE transactions, so two processes never lease the
+    same job. SQLite locking is not reliable on network filesystems; workers
+    on other hosts need a networked backend.
+    """
+
+    def __init__(self, db_path, max_attempts=3, requeue_interval=10.0):
+        self.db_path = db_path
+        self.max_attempts = max(1, max_attempts)
+        self.requeue_interval = requeue_interval  # Seconds between expired-lease sweeps
+        self._last_requeue = 0.0
+        self._lock = threading.Lock()
+        # Autocommit mode; transactions are opened explicitly in _transaction()
+        self._conn = sqlite3.connect(
+            db_path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction() as conn:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # --- Coordinator side ---
+    def open_group(self, kind, key, payload):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (key, kind, payload, status, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET payload = excluded.payload, "
+                "status = excluded.status, updated_at = excluded.updated_at",
+                (key, kind, json.dumps(payload), GROUP_OPEN, time.time()),
+            )
+
+    def seal_group(self, key, **fields):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT payload FROM jobs WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return
+            payload = {**json.loads(row[0]), **fields}
+            conn.execute(
+                "UPDATE jobs SET payload = ?, status = ?, updated_at = ? WHERE key = ?",
+                (json.dumps(payload), GROUP_SEALED, time.time(), key),
+            )
+            self._settle_group(conn, key)
+
+    def publish(self, kind, jobs, group=None):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO jobs (key, kind, grp, payload, status, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET grp = excluded.grp, payload = excluded.payload, "
+                "status = excluded.status, attempts = 0, error = NULL, updated_at = excluded.updated_at "
+                f"WHERE jobs.status IN ('{JOB_DONE}', '{JOB_FAILED}')",
+                [
+                    (key, kind, group, json.dumps(payload), JOB_PENDING, now)
+                    for key, payload in jobs
+                ],
+            )
+
+    def take_finished_groups(self, kind):
+        finished = []
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT key, payload FROM jobs WHERE kind = ? AND status = ?",
+                (kind, JOB_DONE),
+            ).fetchall()
+            for key, payload in rows:
+                counts = dict(
+                    conn.execute(
+                        "SELECT status, COUNT(*) FROM jobs WHERE grp = ? GROUP BY status",
+                        (key,),
+                    ).fetchall()
+                )
+                finished.append(
+                    FinishedGroup(
+                        key,
+                        json.loads(payload),
+                        counts.get(JOB_DONE, 0),
+                        counts.get(JOB_FAILED, 0),
+                    )
+                )
+                conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ? WHERE key = ?",
+                    (GROUP_REPORTED, time.time(), key),
+                )
+        return finished
+
+    def set_publishing(self, publishing):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('publishing', ?)",
+                ("1" if publishing else "0",),
+            )
+
+    # --- Worker side ---
+    def claim(self, worker_id, kind, lease_seconds):
+        now = time.time()
+        if now - self._last_requeue >= self.requeue_interval:
+            self.requeue_expired()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id, key, payload, attempts FROM jobs "
+                "WHERE kind = ? AND status = ? ORDER BY id LIMIT 1",
+                (kind, JOB_PENDING),
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, key, payload, attempts = row
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (JOB_LEASED, worker_id, now + lease_seconds, now, job_id),
+            )
+        return Job(job_id, key, kind, json.loads(payload), attempts + 1)
+
+    def _finish(self, job, worker_id, status, error=None):
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, "
+                "error = ?, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                (status, error, time.time(), job.id, JOB_LEASED, worker_id),
+            ).rowcount
+            if updated and status in (JOB_DONE, JOB_FAILED):
+                row = conn.execute("SELECT grp FROM jobs WHERE id = ?", (job.id,)).fetchone()
+                if row[0] is not None:
+                    self._settle_group(conn, row[0])
+        return bool(updated)
+
+    def complete(self, job, worker_id):
+        return self._finish(job, worker_id, JOB_DONE)
+
+    def fail(self, job, worker_id, error):
+        status = JOB_FAILED if job.attempts >= self.max_attempts else JOB_PENDING
+        return self._finish(job, worker_id, status, str(error))
+
+    def requeue_expired(self):
+        now = self._last_requeue = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, grp, attempts FROM jobs WHERE status = ? AND lease_expires < ?",
+                (JOB_LEASED, now),
+            ).fetchall()
+            for job_id, group, attempts in rows:
+                status = JOB_FAILED if attempts >= self.max_attempts else JOB_PENDING
+                conn.execute(
+                    "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, "
+                    "error = 'lease expired', updated_at = ? WHERE id = ?",
+                    (status, now, job_id),
+                )
+                if status == JOB_FAILED and group is not None:
+                    self._settle_group(conn, group)
+        return len(rows)
+
+    def _settle_group(self, conn, key):
+        """Marks a sealed group done once none of its jobs is pending or leased."""
+        active = conn.execute(
+            "SELECT 1 FROM jobs WHERE grp = ? AND status IN (?, ?) LIMIT 1",
+            (key, JOB_PENDING, JOB_LEASED),
+        ).fetchone()
+        if active is None:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE key = ? AND status = ?",
+                (JOB_DONE, time.time(), key, GROUP_SEALED),
+            )
+
+    def _publishing_flag(self):
+        rows = self._query("SELECT value FROM meta WHERE name = 'publishing'")
+        return rows[0][0] if rows else None
+
+    def is_publishing(self):
+        return self._publishing_flag() == "1"
+
+    def is_drained(self, kind):
+        if self._publishing_flag() != "0":
+            return False  # No coordinator has finished publishing yet
+        active = self._query(
+            "SELECT 1 FROM jobs WHERE kind = ? AND status IN (?, ?) LIMIT 1",
+            (kind, JOB_PENDING, JOB_LEASED),
+        )
+        return not active
+
+    def counts(self):
+        rows = self._query("SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status")
+        return {(kind, status): count for kind, status, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Work queue backends by URL scheme; a networked queue (e.g. Redis) registers here
+BACKENDS = {"sqlite": SQLiteWorkQueue}
+
+
+def open_work_queue(url, **options):
+    """Opens the work queue at url ("sqlite:///path", or a plain file path for SQLite)."""
+    scheme, separator, location = url.partition("://")
+    if not separator:
+        scheme, location = "sqlite", url
+    backend = BACKENDS.get(scheme)
+    if backend is None:
+        raise ValueError(
+            f"Unknown work queue backend '{scheme}' (available: {', '.join(sorted(BACKENDS))})"
+        )
+    return backend(location, **options)
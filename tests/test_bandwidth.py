@@ -0,0 +1,72 @@
+import datetime
+
+import pytest
+
+from gallery_downloader.bandwidth import BandwidthLimiter, BandwidthWindow, parse_schedule
+
+MONDAY = datetime.datetime(2024, 1, 1)
+
+
+def test_parse_schedule():
+    [window] = parse_schedule(
+        [{"DAYS": ["Mon", "friday"], "FROM": "18:00", "TO": "23:30", "LIMIT_KBPS": 512}]
+    )
+    assert window == BandwidthWindow(frozenset({0, 4}), 18 * 60, 23 * 60 + 30, 512 * 1024)
+
+
+def test_yaml_base60_time_and_every_day():
+    [window] = parse_schedule([{"FROM": 1080, "TO": "6", "LIMIT_KBPS": 0}])
+    assert (window.days, window.start, window.end, window.rate) == (
+        frozenset(range(7)),
+        18 * 60,
+        6 * 60,
+        0,
+    )
+
+
+def test_empty_schedule():
+    assert parse_schedule(None) == []
+
+
+@pytest.mark.parametrize(
+    "entries, error",
+    [
+        ({"FROM": "1:00"}, "must be a list"),
+        (["18:00"], "not a mapping"),
+        ([{"FROM": "1:00", "TO": "2:00"}], "needs FROM, TO and LIMIT_KBPS"),
+        ([{"FROM": "1:00", "TO": "2:00", "LIMIT_KBPS": 1, "WHEN": 1}], "unknown keys"),
+        ([{"FROM": "1:00", "TO": "2:00", "LIMIT_KBPS": 1, "DAYS": ["someday"]}], "unknown day"),
+        ([{"FROM": "evening", "TO": "2:00", "LIMIT_KBPS": 1}], "not a HH:MM time"),
+        ([{"FROM": "25:00", "TO": "2:00", "LIMIT_KBPS": 1}], "out of range"),
+        ([{"FROM": "1:00", "TO": "2:00", "LIMIT_KBPS": "fast"}], "not a number"),
+    ],
+)
+def test_malformed_schedules_are_rejected(entries, error):
+    with pytest.raises(ValueError, match=error):
+        parse_schedule(entries)
+
+
+def test_rate_of_the_matching_window():
+    limiter = BandwidthLimiter(
+        default_rate=100,
+        schedule=parse_schedule([{"DAYS": ["mon"], "FROM": "09:00", "TO": "17:00", "LIMIT_KBPS": 1}]),
+    )
+    assert limiter.rate_at(MONDAY.replace(hour=9)) == 1024
+    assert limiter.rate_at(MONDAY.replace(hour=17)) == 100
+    assert limiter.rate_at(MONDAY.replace(hour=12) + datetime.timedelta(days=1)) == 100
+
+
+def test_window_past_midnight_belongs_to_its_start_day():
+    limiter = BandwidthLimiter(
+        schedule=parse_schedule([{"DAYS": ["mon"], "FROM": "22:00", "TO": "06:00", "LIMIT_KBPS": 1}]),
+    )
+    assert limiter.rate_at(MONDAY.replace(hour=23)) == 1024
+    assert limiter.rate_at(MONDAY.replace(hour=5) + datetime.timedelta(days=1)) == 1024
+    assert limiter.rate_at(MONDAY.replace(hour=5)) == 0  # Sunday night's part
+
+
+def test_unlimited_rate_never_waits():
+    limiter = BandwidthLimiter()
+    limiter.consume(10_000_000)
+    assert limiter.bytes == 10_000_000
+    assert limiter.waited_seconds == 0
@@ -0,0 +1,113 @@
+import hashlib
+import os
+
+import pytest
+
+from gallery_downloader.content_store import ContentStore
+
+BODY = b"image bytes" * 100
+SHA256 = hashlib.sha256(BODY).hexdigest()
+ETAG = ContentStore.etag_source("img.example.com", '"abc"')
+
+
+@pytest.fixture
+def store(tmp_path):
+    stored = tmp_path / "a" / "1.jpg"
+    stored.parent.mkdir()
+    stored.write_bytes(BODY)
+    store = ContentStore(str(tmp_path / "content.sqlite"))
+    store.add(str(stored), SHA256, len(BODY), (ContentStore.url_source("http://img/1.jpg"), ETAG))
+    yield store
+    store.close()
+
+
+def test_weak_or_missing_etag_has_no_source():
+    assert ContentStore.etag_source("host", 'W/"abc"') is None
+    assert ContentStore.etag_source("host", None) is None
+
+
+def test_known_etag_with_matching_size_is_linked(store, tmp_path):
+    target = tmp_path / "2.jpg"
+    assert store.link_known_source(ETAG, str(target), size=len(BODY), verify=True) == str(target)
+    assert target.read_bytes() == BODY
+    assert store.transfers_skipped == 1
+
+
+def test_known_etag_with_other_size_is_not_linked(store, tmp_path):
+    target = tmp_path / "2.jpg"
+    assert store.link_known_source(ETAG, str(target), size=len(BODY) + 1, verify=True) is None
+    assert not target.exists()
+
+
+def test_changed_stored_file_is_not_linked(store, tmp_path):
+    (tmp_path / "a" / "1.jpg").write_bytes(b"x" * len(BODY))
+    target = tmp_path / "2.jpg"
+    assert store.link_known_source(ETAG, str(target), size=len(BODY), verify=True) is None
+    assert not target.exists()
+    assert store.links_created == 0
+
+
+def test_duplicate_content_is_replaced_by_a_link(store, tmp_path):
+    duplicate = tmp_path / "b.jpg"
+    duplicate.write_bytes(BODY)
+    assert store.add(str(duplicate), SHA256, len(BODY)) == str(duplicate)
+    assert os.path.samefile(tmp_path / "a" / "1.jpg", duplicate)
+
+
+def convert(store, tmp_path):
+    """Replaces the stored a/1.jpg by a "converted" a/1.webp, as postprocess_image does."""
+    original = tmp_path / "a" / "1.jpg"
+    converted = tmp_path / "a" / "1.webp"
+    converted.write_bytes(b"webp bytes")
+    original.unlink()
+    store.moved(str(original), str(converted))
+    return converted
+
+
+def test_known_url_links_the_converted_file_under_its_extension(store, tmp_path):
+    converted = convert(store, tmp_path)
+    target = tmp_path / "b" / "1.jpg"
+    target.parent.mkdir()
+    linked_path = store.link_known_source(
+        ContentStore.url_source("http://img/1.jpg"), str(target), adopt_extensions={".webp"}
+    )
+    assert linked_path == str(tmp_path / "b" / "1.webp")
+    assert os.path.samefile(linked_path, converted)
+    assert not target.exists()
+
+
+def test_known_etag_verifies_the_converted_file(store, tmp_path):
+    convert(store, tmp_path)
+    target = tmp_path / "2.jpg"
+    linked_path = store.link_known_source(
+        ETAG, str(target), size=len(BODY), verify=True, adopt_extensions={".webp"}
+    )
+    assert linked_path == str(tmp_path / "2.webp")
+    assert store.transfers_skipped == 1
+
+
+def test_converted_file_is_not_linked_under_the_original_extension(store, tmp_path):
+    convert(store, tmp_path)
+    target = tmp_path / "2.jpg"
+    assert store.link_known_source(ETAG, str(target), size=len(BODY)) is None
+    assert not target.exists()
+
+
+def test_duplicate_of_a_converted_file_is_linked_under_its_extension(store, tmp_path):
+    converted = convert(store, tmp_path)
+    duplicate = tmp_path / "b.jpg"
+    duplicate.write_bytes(BODY)
+    final_path = store.add(str(duplicate), SHA256, len(BODY), adopt_extensions={".webp"})
+    assert final_path == str(tmp_path / "b.webp")
+    assert os.path.samefile(final_path, converted)
+    assert not duplicate.exists()
+
+
+def test_discarded_file_is_downloaded_again(store, tmp_path):
+    store.discard(str(tmp_path / "a" / "1.jpg"))
+    target = tmp_path / "2.jpg"
+    assert store.link_known_source(ContentStore.url_source("http://img/1.jpg"), str(target)) is None
+    duplicate = tmp_path / "b.jpg"
+    duplicate.write_bytes(BODY)
+    assert store.add(str(duplicate), SHA256, len(BODY)) == str(duplicate)
+    assert not os.path.samefile(tmp_path / "a" / "1.jpg", duplicate)
@@ -0,0 +1,69 @@
+import threading
+
+from gallery_downloader.crawler import STAGE_DONE, FairQueue
+
+
+def lane_of(item):
+    return item[0]
+
+
+def test_lanes_are_served_round_robin():
+    queue = FairQueue(lane_of, 0, consumers=4)
+    for item in ("a1", "a2", "a3", "b1", "c1"):
+        queue.put(item)
+    got = []
+    for _ in range(5):
+        got.append(queue.get())
+        queue.task_done()
+    assert got == ["a1", "b1", "c1", "a2", "a3"]
+
+
+def test_items_of_a_lane_come_by_priority_then_arrival():
+    queue = FairQueue(lane_of, 0, consumers=1, priority_of=lambda item: -int(item[1]))
+    for item in ("a1", "a3", "a2", "a3"):
+        queue.put(item)
+    got = []
+    for _ in range(4):
+        got.append(queue.get())
+        queue.task_done()
+    assert got == ["a3", "a3", "a2", "a1"]
+
+
+def test_busy_lane_is_held_to_its_fair_share():
+    queue = FairQueue(lane_of, 0, consumers=2)
+    for item in ("a1", "a2", "b1", "b2"):
+        queue.put(item)
+    assert queue.get() == "a1"
+    assert queue.get() == "b1"
+    assert queue._pick_lane() is None  # Both sites hold their one consumer
+    queue.task_done()  # This thread last took b1
+    assert queue.get() == "b2"
+
+
+def test_lone_site_may_use_every_consumer():
+    queue = FairQueue(lane_of, 0, consumers=3)
+    for item in ("a1", "a2", "a3"):
+        queue.put(item)
+    assert [queue.get() for _ in range(3)] == ["a1", "a2", "a3"]
+
+
+def test_stage_done_only_after_every_lane_is_empty():
+    queue = FairQueue(lane_of, 0, consumers=1)
+    queue.put("a1")
+    queue.put(STAGE_DONE)
+    assert queue.get() == "a1"
+    queue.task_done()
+    assert queue.get() is STAGE_DONE
+
+
+def test_full_lane_blocks_only_its_own_producer():
+    queue = FairQueue(lane_of, 1, consumers=1)
+    queue.put("a1")
+    blocked = threading.Thread(target=queue.put, args=("a2",), daemon=True)
+    blocked.start()
+    blocked.join(0.1)
+    assert blocked.is_alive()
+    queue.put("b1")  # Another site's lane still has room
+    assert queue.get() == "a1"
+    blocked.join(1)
+    assert not blocked.is_alive()
@@ -0,0 +1,78 @@
+import pytest
+
+from gallery_downloader.html_parsers import PARSER_BACKENDS, _subtree_matcher, create_parser
+
+PAGE = b"""<html><body>
+<h1 class="t">Title <a href="/g/1/">Gallery 1</a></h1>
+<div class="x"><img src="a.jpg"></div>
+<p>between</p>
+<div class="imgbox"><img src="b.jpg"><img src="c.jpg"></div>
+<div id="nav"><b><a href="/page/2/">Next</a></b></div>
+</body></html>"""
+
+SELECTORS = [
+    "div.imgbox img",  # descendant
+    "#nav b > a",  # child
+    "h1.t + div img",  # adjacent sibling
+    "h1.t ~ div img",  # general sibling
+    "h1.t + div.x img, div.imgbox img",  # sibling in a selector list
+    "p ~ div.imgbox img",
+]
+
+
+def available_backends():
+    backends = []
+    for backend in PARSER_BACKENDS:
+        try:
+            create_parser(backend, {"gallery": ["img"]})
+        except ImportError:
+            continue
+        backends.append(backend)
+    return backends
+
+
+@pytest.mark.parametrize("selector", SELECTORS)
+def test_backends_agree(selector):
+    backends = available_backends()
+    if len(backends) < 2:
+        pytest.skip("needs at least two parser backends")
+    results = {}
+    for backend in backends:
+        page = create_parser(backend, {"gallery": [selector]}).parse(PAGE, "gallery")
+        attribute = "href" if selector.endswith("a") else "src"
+        results[backend] = sorted(page.attrs(selector, attribute))
+    assert len({tuple(found) for found in results.values()}) == 1, results
+    assert results["bs4"]
+
+
+def test_bs4_finds_sibling_matches():
+    page = create_parser("bs4", {"gallery": ["h1.t ~ div img"]}).parse(PAGE, "gallery")
+    assert sorted(page.attrs("h1.t ~ div img", "src")) == ["a.jpg", "b.jpg", "c.jpg"]
+
+
+def test_subtree_matcher_needs_full_parse_for_siblings():
+    assert _subtree_matcher(["h1.t + div img"]) is None
+    assert _subtree_matcher(["div.a img", "h1 ~ div"]) is None
+    assert _subtree_matcher(["div.imgbox img", "#nav b > a"]) is not None
+
+
+def test_subtree_matcher_roots():
+    match = _subtree_matcher(["div.imgbox img", "#nav a"])
+    assert match("div", {"class": "imgbox other"})
+    assert match("div", {"id": "nav"})
+    assert not match("div", {"class": "x"})
+    assert not match("span", {"class": "imgbox"})
+
+
+def test_first_text_and_links():
+    selectors = {"overview": ["h1.t", "h1.t > a", "div.missing"]}
+    for backend in available_backends():
+        page = create_parser(backend, selectors).parse(PAGE, "overview")
+        assert page.first_text("h1.t").startswith("Title"), backend
+        assert page.links("h1.t > a") == [("/g/1/", "Gallery 1")], backend
+        assert page.first_attr("div.missing", "href") is None, backend
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_parser("regex", {})
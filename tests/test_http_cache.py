@@ -0,0 +1,64 @@
+import os
+from types import SimpleNamespace
+
+from gallery_downloader.http_cache import HttpCache
+
+
+def response(url, body, etag=None):
+    return SimpleNamespace(url=url, headers={"ETag": etag} if etag else {}, content=body)
+
+
+def test_store_and_get(tmp_path):
+    cache = HttpCache(str(tmp_path), 1_000_000)
+    cache.store("http://a/1", response("http://a/1", b"<html>", '"v1"'))
+    metadata, body = cache.get("http://a/1")
+    assert body == b"<html>"
+    assert cache.conditional_headers(metadata) == {"If-None-Match": '"v1"'}
+    assert cache.get("http://a/2") == (None, None)
+
+
+def test_ttl_zero_is_never_fresh(tmp_path):
+    cache = HttpCache(str(tmp_path), 1_000_000)
+    cache.store("http://a/1", response("http://a/1", b"x"))
+    metadata, _ = cache.get("http://a/1")
+    assert not cache.is_fresh(metadata, 0)
+    assert cache.is_fresh(metadata, 3600)
+
+
+def test_least_recently_used_entries_are_evicted_by_size(tmp_path):
+    cache = HttpCache(str(tmp_path), 25)
+    for number in range(3):
+        cache.store(f"http://a/{number}", response(f"http://a/{number}", b"x" * 10))
+    assert cache.get("http://a/0") == (None, None)
+    assert cache.get("http://a/2")[1] == b"x" * 10
+
+
+def test_entry_limit_keeps_the_index_bounded(tmp_path):
+    cache = HttpCache(str(tmp_path), 1_000_000, max_entries=10)
+    for number in range(100):
+        cache.store(f"http://a/{number}", response(f"http://a/{number}", b"page"))
+    assert len(cache._entries) == 10
+    assert len(os.listdir(tmp_path)) == 20  # Body and metadata file of each entry
+    assert cache.get("http://a/99")[1] == b"page"
+
+
+def test_entry_limit_applies_to_an_existing_cache(tmp_path):
+    cache = HttpCache(str(tmp_path), 1_000_000)
+    for number in range(20):
+        cache.store(f"http://a/{number}", response(f"http://a/{number}", b"page"))
+    assert len(HttpCache(str(tmp_path), 1_000_000, max_entries=5)._entries) == 5
+
+
+def test_read_only_cache_serves_but_never_writes(tmp_path):
+    HttpCache(str(tmp_path), 1_000_000).store("http://a/1", response("http://a/1", b"page"))
+    before = sorted((entry.name, entry.stat().st_mtime_ns) for entry in os.scandir(tmp_path))
+    cache = HttpCache(str(tmp_path), 1, read_only=True)  # Over its size limit, too
+    assert cache.get("http://a/1")[1] == b"page"
+    cache.store("http://a/2", response("http://a/2", b"other"))
+    assert sorted((entry.name, entry.stat().st_mtime_ns) for entry in os.scandir(tmp_path)) == before
+
+
+def test_read_only_cache_does_not_create_its_folder(tmp_path):
+    cache = HttpCache(str(tmp_path / "missing"), 1_000_000, read_only=True)
+    assert cache.get("http://a/1") == (None, None)
+    assert not (tmp_path / "missing").exists()
@@ -0,0 +1,78 @@
+import hashlib
+
+import pytest
+
+from gallery_downloader.manifest import (
+    check_folder,
+    image_entry,
+    is_complete,
+    new_manifest,
+    read_manifest,
+    write_manifest,
+)
+
+EXTENSIONS = {".jpg", ".png"}
+
+
+@pytest.fixture
+def gallery(tmp_path):
+    """A folder with three images listed in a complete manifest."""
+    manifest = new_manifest("http://g/1/", "G1", 3)
+    for number in range(3):
+        path = tmp_path / f"{number}.jpg"
+        path.write_bytes(b"image %d" % number)
+        sha256 = hashlib.sha256(path.read_bytes()).hexdigest()
+        manifest["images"][f"http://i/{number}.jpg"] = image_entry(str(path), sha256)
+    manifest["complete"] = True
+    write_manifest(str(tmp_path), manifest)
+    return tmp_path
+
+
+def test_manifest_round_trip(gallery):
+    manifest = read_manifest(str(gallery))
+    assert manifest["name"] == "G1"
+    assert len(manifest["images"]) == 3
+    assert is_complete(manifest, 3)
+    assert not is_complete(manifest, 4)  # The gallery has grown since
+
+
+def test_new_manifest_keeps_previous_images(gallery):
+    previous = read_manifest(str(gallery))
+    manifest = new_manifest("http://g/1/", "G1", 4, previous)
+    assert manifest["images"] == previous["images"]
+    assert manifest["created_at"] == previous["created_at"]
+    assert not manifest["complete"]
+
+
+def test_folder_without_manifest(tmp_path):
+    assert read_manifest(str(tmp_path)) is None
+    assert check_folder(str(tmp_path), EXTENSIONS) is None
+
+
+def test_broken_manifest_is_ignored(tmp_path):
+    (tmp_path / ".gallery.json").write_text('{"images": []}')
+    assert read_manifest(str(tmp_path)) is None
+
+
+def test_unchanged_folder_has_no_drift(gallery):
+    drift = check_folder(str(gallery), EXTENSIONS)
+    assert (drift.missing, drift.mismatched, drift.unhashed, drift.untracked) == ([], [], [], [])
+
+
+def test_drift_is_reported(gallery):
+    (gallery / "0.jpg").unlink()
+    (gallery / "1.jpg").write_bytes(b"image 9")  # Same size, other content
+    (gallery / "extra.png").write_bytes(b"x")
+    (gallery / "notes.txt").write_bytes(b"x")
+    drift = check_folder(str(gallery), EXTENSIONS)
+    assert drift.missing == ["http://i/0.jpg"]
+    assert drift.mismatched == ["http://i/1.jpg"]
+    assert drift.untracked == ["extra.png"]
+    assert check_folder(str(gallery), EXTENSIONS, check_hashes=False).mismatched == []
+
+
+def test_images_without_hash_are_reported(gallery):
+    manifest = read_manifest(str(gallery))
+    manifest["images"]["http://i/2.jpg"]["sha256"] = None
+    write_manifest(str(gallery), manifest)
+    assert check_folder(str(gallery), EXTENSIONS).unhashed == ["http://i/2.jpg"]
@@ -0,0 +1,30 @@
+import threading
+
+from gallery_downloader.metrics import ThreadProfiler
+
+
+def _busy_worker_loop():
+    return sum(i * i for i in range(20_000))
+
+
+def test_profile_report_covers_worker_threads(tmp_path):
+    profiler = ThreadProfiler()
+
+    def main():
+        workers = [
+            threading.Thread(target=profiler.run, args=(_busy_worker_loop,)) for _ in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    profiler.run(main)
+    report = tmp_path / "profile.txt"
+    assert profiler.write_report(str(report))
+    assert "_busy_worker_loop" in report.read_text()
+    assert (tmp_path / "profile.txt.prof").exists()
+
+
+def test_no_report_without_profiles(tmp_path):
+    assert not ThreadProfiler().write_report(str(tmp_path / "profile.txt"))
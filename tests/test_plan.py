@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from gallery_downloader.plan import PlanWriter, read_plan
+
+
+def test_plan_round_trip(tmp_path):
+    path = str(tmp_path / "plan.jsonl")
+    writer = PlanWriter(path)
+    writer.add_image("site", "http://g/1/", "http://i/1.jpg", "G1/1.jpg", 100)
+    writer.add_image("site", "http://g/1/", "http://i/2.jpg", "G1/2.jpg", None)
+    writer.add_gallery("site", "http://g/1/", "G1", "G1", 3, True, 2, {"http://i/0.jpg": "G1/0.jpg"})
+    writer.add_gallery("site", "http://g/2/", "G2", "G2", 0, True, 0, {})
+    writer.close()
+
+    galleries, summary = read_plan(path)
+    assert [gallery["name"] for gallery in galleries] == ["G1", "G2"]
+    assert [image["path"] for image in galleries[0]["downloads"]] == ["G1/1.jpg", "G1/2.jpg"]
+    assert galleries[0]["existing"] == {"http://i/0.jpg": "G1/0.jpg"}
+    assert galleries[1]["downloads"] == []
+    assert summary["images"] == 2
+    assert summary["known_bytes"] == 100
+    assert summary["estimated_bytes"] == 200  # The unknown size counts as the average
+
+
+def test_unfinished_plan_is_not_published(tmp_path):
+    path = tmp_path / "plan.jsonl"
+    writer = PlanWriter(str(path))
+    writer.add_image("site", "http://g/1/", "http://i/1.jpg", "G1/1.jpg")
+    assert not path.exists()
+    writer.close()
+    assert path.exists()
+
+
+def test_estimate_without_known_sizes(tmp_path):
+    writer = PlanWriter(str(tmp_path / "plan.jsonl"))
+    writer.add_image("site", "http://g/1/", "http://i/1.jpg", "G1/1.jpg")
+    assert writer.estimated_bytes() is None
+    writer.close()
+
+
+@pytest.mark.parametrize(
+    "records, error",
+    [
+        ([{"type": "summary"}], "not a version"),
+        ([{"type": "plan", "version": 1}], "no summary"),
+        (
+            [
+                {"type": "plan", "version": 1},
+                {"type": "image", "site": "s", "gallery": "g", "url": "u", "path": "p"},
+                {"type": "summary"},
+            ],
+            "no gallery record",
+        ),
+    ],
+)
+def test_incomplete_plans_are_rejected(tmp_path, records, error):
+    path = tmp_path / "plan.jsonl"
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    with pytest.raises(ValueError, match=error):
+        read_plan(str(path))
+
+
+def test_line_that_is_not_json_is_rejected(tmp_path):
+    path = tmp_path / "plan.jsonl"
+    path.write_text('{"type": "plan", "version": 1}\nnot json\n')
+    with pytest.raises(ValueError, match="line 2"):
+        read_plan(str(path))
@@ -0,0 +1,76 @@
+import http.client
+import urllib.error
+
+import pytest
+
+from gallery_downloader import quick_check, settings
+from gallery_downloader.crawl_state import STATUS_COMPLETE, CrawlState
+
+SITES = [
+    {"NAME": "down", "GALLERY_OVERVIEW_BASE_URL_INPUT": "http://down.example/babes/"},
+    {"NAME": "done", "GALLERY_OVERVIEW_BASE_URL_INPUT": "http://done.example/babes/"},
+    {"NAME": "new", "GALLERY_OVERVIEW_BASE_URL_INPUT": "http://new.example/babes/"},
+]
+
+
+def overview(*hrefs):
+    links = "".join(f'<h1 class="zag_block"><a href="{href}">Gallery</a></h1>' for href in hrefs)
+    return f"<html><body>{links}</body></html>".encode("utf-8")
+
+
+@pytest.fixture(
+    params=[
+        urllib.error.URLError("connection refused"),
+        http.client.RemoteDisconnected("closed"),
+        http.client.IncompleteRead(b"<html>"),
+        ValueError("unknown url type"),
+    ]
+)
+def checked(request, tmp_path, monkeypatch):
+    """Runs a quick check over SITES and returns (site names, fetched URLs)."""
+    db_path = str(tmp_path / "state.sqlite")
+    state = CrawlState(db_path)
+    state.record_gallery("http://done.example/g/1/", STATUS_COMPLETE)
+    state.record_gallery("http://new.example/g/1/", STATUS_COMPLETE)
+    state.close()
+    pages = {
+        "http://done.example/babes/page/1/": overview("/g/1/"),
+        "http://new.example/babes/page/1/": overview("/g/1/", "/g/2/"),
+    }
+    fetched = []
+
+    def fetch_page(url, user_agent, timeout):
+        fetched.append(url)
+        if url not in pages:
+            raise request.param
+        return pages[url], url
+
+    monkeypatch.setattr(quick_check, "fetch_page", fetch_page)
+    config = {"SITES": SITES, "STATE_DB_PATH": db_path}
+
+    def run():
+        return quick_check.sites_with_new_galleries(config, settings.resolve(config)), fetched
+
+    return run
+
+
+def test_failed_site_is_crawled_and_others_still_checked(checked):
+    site_names, fetched = checked()
+    assert site_names == ["down", "new"]
+    assert len(fetched) == 3
+
+
+def test_page_with_nothing_new_is_remembered(checked, tmp_path):
+    checked()
+    state = CrawlState(str(tmp_path / "state.sqlite"))
+    try:
+        assert state.quick_check_hash("done") is not None
+        assert state.quick_check_hash("new") is None
+        assert state.quick_check_hash("down") is None
+    finally:
+        state.close()
+
+
+def test_without_state_every_site_is_crawled(tmp_path):
+    config = {"SITES": SITES, "STATE_DB_PATH": str(tmp_path / "missing.sqlite")}
+    assert quick_check.sites_with_new_galleries(config, settings.resolve(config)) is None
@@ -0,0 +1,174 @@
+import io
+import time
+
+import pytest
+import requests
+
+from gallery_downloader.request_scheduler import (
+    CircuitOpenError,
+    HostState,
+    RequestScheduler,
+    is_retryable_error,
+    parse_retry_after,
+)
+
+URL = "http://example.com/page"
+
+
+class FakeSession:
+    """Answers each request with the next scripted status code or exception."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, BaseException):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        response.raw = io.BytesIO(b"")
+        return response
+
+
+def scheduler(**kwargs):
+    kwargs.setdefault("backoff_base", 0)
+    return RequestScheduler(**kwargs)
+
+
+def test_token_bucket_waits_for_refill():
+    state = HostState(rate=2.0, burst=1, max_concurrency=1)
+    now = time.monotonic()
+    assert scheduler()._take_token(state, now) == 0
+    assert scheduler()._take_token(state, now) == pytest.approx(0.5)
+    assert scheduler()._take_token(state, now + 0.5) == 0
+
+
+def test_unlimited_rate_never_waits():
+    state = HostState(rate=0, burst=1, max_concurrency=1)
+    assert all(scheduler()._take_token(state, time.monotonic()) == 0 for _ in range(100))
+
+
+def test_retries_until_success():
+    session = FakeSession(503, 500, 200)
+    s = scheduler(max_retries=4)
+    assert s.get(session, URL).status_code == 200
+    assert session.calls == 3
+    assert s.retries == 2
+    assert s.throttled == 1
+
+
+def test_returns_last_response_when_retries_run_out():
+    session = FakeSession(502)
+    s = scheduler(max_retries=2)
+    assert s.get(session, URL).status_code == 502
+    assert session.calls == 3
+    assert s.failures == 1
+
+
+def test_other_status_codes_are_not_retried():
+    session = FakeSession(404)
+    assert scheduler().get(session, URL).status_code == 404
+    assert session.calls == 1
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        requests.exceptions.ConnectTimeout(),
+        requests.exceptions.ReadTimeout(),
+        requests.exceptions.ConnectionError(),
+    ],
+)
+def test_network_errors_are_retried(error):
+    session = FakeSession(error)
+    s = scheduler(max_retries=2, breaker_threshold=100)
+    with pytest.raises(type(error)):
+        s.get(session, URL)
+    assert session.calls == 3
+    assert s._host(URL).consecutive_failures == 3
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        requests.exceptions.SSLError(),
+        requests.exceptions.InvalidURL(),
+        requests.exceptions.InvalidSchema(),
+        requests.exceptions.MissingSchema(),
+        requests.exceptions.TooManyRedirects(),
+        requests.exceptions.ContentDecodingError(),
+    ],
+)
+def test_permanent_errors_are_raised_at_once(error):
+    assert not is_retryable_error(error)
+    session = FakeSession(error)
+    s = scheduler(max_retries=4)
+    with pytest.raises(type(error)):
+        s.get(session, URL)
+    assert session.calls == 1
+    assert s.retries == 0
+    assert s._host(URL).consecutive_failures == 0
+
+
+def test_throttling_halves_concurrency_and_successes_grow_it():
+    s = scheduler(max_concurrency=8, max_retries=0)
+    s.get(FakeSession(429), URL)
+    state = s._host(URL)
+    assert state.concurrency_limit == 4
+    for _ in range(4):
+        s.get(FakeSession(200), URL)
+    assert state.concurrency_limit == 5
+
+
+def test_fixed_concurrency_ignores_throttling():
+    s = scheduler(max_concurrency=8, max_retries=0, adaptive=False)
+    s.get(FakeSession(429), URL)
+    assert s._host(URL).concurrency_limit == 8
+
+
+def test_breaker_opens_after_consecutive_failures():
+    s = scheduler(max_retries=0, breaker_threshold=2, breaker_cooldown=30)
+    session = FakeSession(500)
+    s.get(session, URL)
+    s.get(session, URL)
+    with pytest.raises(CircuitOpenError):
+        s.get(session, URL)
+    assert session.calls == 2
+
+
+def test_half_open_probe_closes_the_breaker():
+    s = scheduler(max_retries=0, breaker_threshold=1, breaker_cooldown=30)
+    s.get(FakeSession(500), URL)
+    state = s._host(URL)
+    state.open_until = 0  # Cooldown over
+    assert s.get(FakeSession(200), URL).status_code == 200
+    assert state.consecutive_failures == 0
+    assert not state.probe_in_flight
+
+
+@pytest.mark.parametrize(
+    "error", [requests.exceptions.InvalidURL(), ValueError("bad header"), KeyboardInterrupt()]
+)
+def test_permanent_error_frees_the_probe(error):
+    s = scheduler(max_retries=0, breaker_threshold=1)
+    s.get(FakeSession(500), URL)
+    state = s._host(URL)
+    state.open_until = 0
+    with pytest.raises(type(error)):
+        s.get(FakeSession(error), URL)
+    assert not state.probe_in_flight
+    assert state.consecutive_failures == 1  # Not counted as another failure
+
+
+def test_parse_retry_after():
+    response = requests.Response()
+    assert parse_retry_after(response) is None
+    response.headers["Retry-After"] = "120"
+    assert parse_retry_after(response) == 120
+    response.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert parse_retry_after(response) == 0
+    response.headers["Retry-After"] = "soon"
+    assert parse_retry_after(response) is None
@@ -0,0 +1,33 @@
+import os
+
+from gallery_downloader.seen_urls import BloomFilter, SeenUrlSet
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    urls = [f"http://example.com/{number}.jpg" for number in range(1000)]
+    for url in urls:
+        bloom.add(url)
+    assert all(url in bloom for url in urls)
+    false_positives = sum(f"http://example.com/new/{number}.jpg" in bloom for number in range(10_000))
+    assert false_positives < 100  # 0.1% configured; generous bound
+
+
+def test_seen_url_set_behaves_like_a_set(tmp_path):
+    seen = SeenUrlSet(expected_items=100, directory=str(tmp_path))
+    try:
+        seen.add("http://a/1")
+        seen.add("http://a/1")
+        seen.add("http://a/2")
+        assert "http://a/1" in seen
+        assert "http://a/3" not in seen
+        assert len(seen) == 2
+    finally:
+        seen.close()
+
+
+def test_close_removes_the_scratch_file(tmp_path):
+    seen = SeenUrlSet(expected_items=10, directory=str(tmp_path))
+    assert os.path.exists(seen.path)
+    seen.close()
+    assert not os.path.exists(seen.path)
@@ -0,0 +1,24 @@
+from gallery_downloader import settings
+
+
+def test_defaults():
+    values = settings.resolve({})
+    assert values["DIRECTORY_INDEX"]
+    assert values["HTTP_CACHE_TTL_OVERVIEW"] == 0
+    assert isinstance(values["IMAGE_EXTENSIONS"], set)
+
+
+def test_command_line_wins_and_unknown_choices_fall_back():
+    values = settings.resolve(
+        {"CRAWL_MODE": "incremental", "DOWNLOAD_PRIORITY": "random"}, mode="resume"
+    )
+    assert values["CRAWL_MODE"] == "resume"
+    assert values["DOWNLOAD_PRIORITY"] == "newest"
+
+
+def test_bounded_memory_turns_off_unbounded_structures():
+    values = settings.resolve(
+        {"BOUNDED_MEMORY": True, "STAGE_QUEUE_SIZE": 0, "DIRECTORY_INDEX": True}
+    )
+    assert values["STAGE_QUEUE_SIZE"] == 100
+    assert not values["DIRECTORY_INDEX"]
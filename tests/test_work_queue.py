@@ -0,0 +1,112 @@
+import pytest
+
+from gallery_downloader.work_queue import (
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_LEASED,
+    JOB_PENDING,
+    SQLiteWorkQueue,
+    open_work_queue,
+)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = SQLiteWorkQueue(str(tmp_path / "queue.sqlite"), max_attempts=2, requeue_interval=3600)
+    yield queue
+    queue.close()
+
+
+def test_jobs_are_claimed_once_in_order(queue):
+    queue.publish("image", [("a", {"n": 1}), ("b", {"n": 2})])
+    first = queue.claim("w1", "image", 60)
+    second = queue.claim("w2", "image", 60)
+    assert (first.key, first.payload, first.attempts) == ("a", {"n": 1}, 1)
+    assert second.key == "b"
+    assert queue.claim("w3", "image", 60) is None
+    assert queue.counts() == {("image", JOB_LEASED): 2}
+
+
+def test_only_the_lease_owner_completes_a_job(queue):
+    queue.publish("image", [("a", {})])
+    job = queue.claim("w1", "image", 60)
+    assert not queue.complete(job, "w2")
+    assert queue.complete(job, "w1")
+    assert queue.counts() == {("image", JOB_DONE): 1}
+
+
+def test_expired_lease_is_handed_out_again(queue):
+    queue.publish("image", [("a", {})])
+    job = queue.claim("w1", "image", -1)
+    assert queue.requeue_expired() == 1
+    retry = queue.claim("w2", "image", 60)
+    assert (retry.key, retry.attempts) == ("a", 2)
+    assert not queue.complete(job, "w1")  # The dead worker's lease moved on
+    assert queue.complete(retry, "w2")
+
+
+def test_live_lease_is_not_requeued(queue):
+    queue.publish("image", [("a", {})])
+    queue.claim("w1", "image", 60)
+    assert queue.requeue_expired() == 0
+
+
+def test_job_fails_after_max_attempts(queue):
+    queue.publish("image", [("a", {})])
+    queue.fail(queue.claim("w1", "image", 60), "w1", "boom")
+    assert queue.counts() == {("image", JOB_PENDING): 1}
+    queue.fail(queue.claim("w1", "image", 60), "w1", "boom")
+    assert queue.counts() == {("image", JOB_FAILED): 1}
+
+
+def test_expired_lease_fails_after_max_attempts(queue):
+    queue.publish("image", [("a", {})])
+    queue.claim("w1", "image", -1)
+    queue.requeue_expired()
+    queue.claim("w2", "image", -1)
+    queue.requeue_expired()
+    assert queue.counts() == {("image", JOB_FAILED): 1}
+
+
+def test_finished_jobs_are_queued_again_on_publish(queue):
+    queue.publish("image", [("a", {})])
+    queue.complete(queue.claim("w1", "image", 60), "w1")
+    queue.publish("image", [("a", {"again": True})])
+    job = queue.claim("w1", "image", 60)
+    assert (job.payload, job.attempts) == ({"again": True}, 1)
+
+
+def test_sealed_group_finishes_with_its_last_job(queue):
+    queue.open_group("gallery", "g1", {"name": "G"})
+    queue.publish("image", [("a", {}), ("b", {})], group="g1")
+    queue.seal_group("g1", expected=2)
+    queue.complete(queue.claim("w1", "image", 60), "w1")
+    assert queue.take_finished_groups("gallery") == []
+    queue.fail(queue.claim("w1", "image", 60), "w1", "boom")
+    queue.fail(queue.claim("w1", "image", 60), "w1", "boom")
+    [group] = queue.take_finished_groups("gallery")
+    assert (group.key, group.payload, group.done, group.failed) == (
+        "g1",
+        {"name": "G", "expected": 2},
+        1,
+        1,
+    )
+    assert queue.take_finished_groups("gallery") == []
+
+
+def test_drained_once_publishing_stopped_and_no_job_is_left(queue):
+    queue.publish("image", [("a", {})])
+    assert not queue.is_drained("image")  # No coordinator has finished yet
+    queue.set_publishing(True)
+    assert queue.is_publishing()
+    queue.set_publishing(False)
+    assert not queue.is_drained("image")
+    queue.complete(queue.claim("w1", "image", 60), "w1")
+    assert queue.is_drained("image")
+
+
+def test_open_work_queue_backends(tmp_path):
+    open_work_queue(f"sqlite://{tmp_path / 'a.sqlite'}").close()
+    open_work_queue(str(tmp_path / "b.sqlite")).close()
+    with pytest.raises(ValueError):
+        open_work_queue("redis://localhost")